@@ -1,6 +1,7 @@
 import * as THREE from 'three';
 import { GLTFLoader } from 'three/examples/jsm/loaders/GLTFLoader.js';
 import { DRACOLoader } from 'three/examples/jsm/loaders/DRACOLoader.js';
+import { MeshoptDecoder } from 'three/examples/jsm/libs/meshopt_decoder.module.js';
 import { scene } from './scene.js';
 import { FLOOR_HEIGHT } from './floor-manager.js';
 
@@ -14,6 +15,8 @@ dracoLoader.setDecoderPath('https://www.gstatic.com/draco/versioned/decoders/1.5
 dracoLoader.setDecoderConfig({ type: 'js' });
 const loader = new GLTFLoader();
 loader.setDRACOLoader(dracoLoader);
+// Models from the optimize stage (public/models-opt) are meshopt-compressed
+loader.setMeshoptDecoder(MeshoptDecoder);
 const modelCache = new Map(); // path -> Promise<THREE.Group>
 
 function loadGLTF(path) {
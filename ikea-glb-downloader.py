@@ -1,21 +1,19 @@
 import os
 import sys
-import requests
 from bs4 import BeautifulSoup
 import json
 import sqlite3
 import re
-from tqdm import tqdm
-import time
 from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from courtyard_assets import browser, crawldb, download, ikea, tiers
+
 # Suppress unnecessary logging
 logging.getLogger('WDM').setLevel(logging.NOTSET)
 os.environ['WDM_LOG_LEVEL'] = '0'
@@ -24,13 +22,40 @@ os.environ['WDM_LOG_LEVEL'] = '0'
 download_dir = 'downloaded-files'
 os.makedirs(download_dir, exist_ok=True)
 
-# Set up SQLite database
-conn = sqlite3.connect('ikea_products.db')
-c = conn.cursor()
-c.execute('''CREATE TABLE IF NOT EXISTS products
-             (url TEXT PRIMARY KEY, name TEXT, color TEXT, glb_url TEXT, downloaded INTEGER)''')
+# Resource blocking (courtyard_assets.browser.BLOCK_PROFILES); category pages
+# need CSS for scroll-to-load, so images/fonts/media/trackers only
+BLOCK_PROFILE = 'light'
+
+# Pages one browser serves before it is relaunched
+MAX_PAGES_PER_DRIVER = 100
+
+# Best quality tier under the default per-model byte budget, probed with HEAD requests
+resolver = tiers.TierResolver()
+
+# Crawl state lives in the frontier shared with the scripts/ scrapers
+db = crawldb.CrawlDB()
+
+def import_legacy_db(path='ikea_products.db'):
+    """One-time import of the products table this script used to keep on its own."""
+    if not os.path.exists(path):
+        return
+    legacy = sqlite3.connect(path)
+    rows = legacy.execute('SELECT url, name, color, glb_url, downloaded FROM products').fetchall()
+    legacy.close()
+    for url, name, color, glb_url, downloaded in rows:
+        if db.state(url) is None:
+            # A row with a model URL but no download was a failed download
+            if downloaded:
+                state = crawldb.DONE
+            else:
+                state = crawldb.FAILED if glb_url else crawldb.NO3D
+            db.finish(url, state, glb_url=glb_url, name=name, color=color,
+                      source='ikea-glb-downloader')
+    db.flush()
+    os.replace(path, path + '.imported')
+    print(f"Imported {len(rows)} rows from {path}")
 
-def get_chrome_driver():
+def get_chrome_driver(block=BLOCK_PROFILE):
     options = webdriver.ChromeOptions()
     options.add_argument('--headless')
     options.add_argument('--disable-gpu')
@@ -38,44 +63,45 @@ def get_chrome_driver():
     options.add_argument('--disable-dev-shm-usage')
     options.add_argument('--log-level=3')  # Only show fatal errors
     options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    
-    try:
-        # Try with log_level argument
-        service = Service(ChromeDriverManager(log_level=0).install())
-    except TypeError:
-        # If log_level is not supported, use without it
-        service = Service(ChromeDriverManager().install())
+    options.page_load_strategy = 'eager'
+    browser.configure_options(options, block)
     
     # Redirect stderr to devnull to suppress remaining messages
     original_stderr = sys.stderr
     sys.stderr = open(os.devnull, 'w')
     
-    driver = webdriver.Chrome(service=service, options=options)
+    # Reuses the chromedriver path resolved on an earlier run
+    driver = browser.launch_chrome(options)
     
     # Restore stderr
     sys.stderr = original_stderr
     
+    browser.apply_blocking(driver, block)
+    browser.install_glb_watch(driver)
     return driver
 
+# One browser shared by every page this script visits; relaunched after
+# MAX_PAGES_PER_DRIVER pages or if it crashes
+session = browser.DriverSession(get_chrome_driver, max_pages=MAX_PAGES_PER_DRIVER)
+
 def get_product_links(url):
-    driver = get_chrome_driver()
     try:
-        driver.get(url)
+        driver = session.open(url)
         
         # Wait for the product grid to load
         WebDriverWait(driver, 30).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, '.plp-fragment-wrapper'))
         )
         
-        # Scroll to load all products
-        last_height = driver.execute_script("return document.body.scrollHeight")
+        # Scroll to load all products; each wait ends as soon as new tiles arrive
+        link_selector = '.plp-fragment-wrapper a.plp-product__image-link'
+        count = browser.wait_for_count(driver, link_selector, 1, timeout=10)
         while True:
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)  # Wait for page to load
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
+            new_count = browser.wait_for_count(driver, link_selector, count + 1, timeout=3)
+            if new_count <= count:
                 break
-            last_height = new_height
+            count = new_count
         
         # Wait for all product links to be present
         WebDriverWait(driver, 30).until(
@@ -92,35 +118,58 @@ def get_product_links(url):
     except Exception as e:
         print(f"Error while getting product links from {url}: {str(e)}")
         return []
-    finally:
-        driver.quit()
+
+def iter_product_links(start_url):
+    """
+    Stream every product URL in a category from IKEA's paginated listing
+    data; only scroll rendered ?page=N pages in the browser if that fails.
+    """
+    found = False
+    for link in ikea.iter_category_products(start_url, variants=False):
+        found = True
+        yield link
+    if found:
+        return
+    
+    page = 1
+    while True:
+        print(f"\nFetching product links from page {page}")
+        current_url = f"{start_url}{'&' if '?' in start_url else '?'}page={page}"
+        product_links = get_product_links(current_url)
+        if not product_links:
+            print(f"No products found on page {page}. Finishing process.")
+            return
+        yield from product_links
+        page += 1
 
 def get_color_variant_links(url, download_all_colors):
     if not download_all_colors:
         return [url]
     
-    driver = get_chrome_driver()
-    try:
-        driver.get(url)
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, '.js-product-style-picker'))
-        )
-        
-        variants = [url]  # Include the original URL
-        style_picker = driver.find_element(By.CSS_SELECTOR, '.js-product-style-picker')
-        if style_picker:
-            variant_links = style_picker.find_elements(By.CSS_SELECTOR, '.pip-product-styles__link')
-            for link in variant_links:
-                variants.append(link.get_attribute('href'))
-        
-        return variants
-    finally:
-        driver.quit()
+    driver = session.open(url)
+    WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, '.js-product-style-picker'))
+    )
+    
+    variants = [url]  # Include the original URL
+    style_picker = driver.find_element(By.CSS_SELECTOR, '.js-product-style-picker')
+    if style_picker:
+        variant_links = style_picker.find_elements(By.CSS_SELECTOR, '.pip-product-styles__link')
+        for link in variant_links:
+            variants.append(link.get_attribute('href'))
+    
+    return variants
 
 def get_product_details(url):
-    driver = get_chrome_driver()
+    """
+    (name, color, glb_url, error) for a product page. glb_url is None for a
+    page that loaded without a model; error is set instead when the page
+    couldn't be loaded or read, so it isn't taken for one without a model.
+    """
+    name, color = "Unknown", "Unknown"
     try:
-        driver.get(url)
+        driver = session.open(url)
+        browser.raise_for_status(session.status)
         
         WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.TAG_NAME, 'title'))
@@ -148,42 +197,34 @@ def get_product_details(url):
                 try:
                     data = json.loads(script.get_attribute('innerHTML'))
                     glb_url = data.get('url')
-                    return name, color, glb_url
+                    return name, color, glb_url, None
                 except json.JSONDecodeError:
                     print(f"Error decoding JSON for {url}")
+                    return name, color, None, 'bad model JSON'
         except TimeoutException:
             print(f"GLB model script not found for {url}")
         
     except TimeoutException:
         print(f"Timeout while loading page: {url}")
+        return name, color, None, 'page load timeout'
     except Exception as e:
         print(f"Error processing {url}: {str(e)}")
-    finally:
-        driver.quit()
+        return name, color, None, f'page load failed: {e}'.splitlines()[0]
     
-    return name, color, None
+    return name, color, None, None
 
 def download_glb(url, filename):
-    response = requests.get(url, stream=True)
-    total_size = int(response.headers.get('content-length', 0))
-    
-    with open(filename, 'wb') as f, tqdm(
-        desc=filename,
-        total=total_size,
-        unit='iB',
-        unit_scale=True,
-        unit_divisor=1024,
-    ) as progress_bar:
-        for data in response.iter_content(chunk_size=1024):
-            size = f.write(data)
-            progress_bar.update(size)
+    url = resolver.resolve(url).url
+    result = download.fetch(url, filename, progress=True)
+    if not result.ok:
+        print(f"Download failed for {filename}: {result.error}")
+    return result.ok
 
 def process_product(url, download_all_colors):
     print(f"\nProcessing product: {url}")
     
     # Check if the main URL has been processed
-    c.execute("SELECT * FROM products WHERE url=?", (url,))
-    if c.fetchone():
+    if db.is_processed(url):
         print(f"Skipping already processed product: {url}")
         return
 
@@ -192,56 +233,52 @@ def process_product(url, download_all_colors):
         print(f"Found {len(variant_urls)} color variants")
         
         for variant_url in variant_urls:
-            c.execute("SELECT * FROM products WHERE url=?", (variant_url,))
-            if c.fetchone():
+            if db.is_processed(variant_url):
                 print(f"Skipping already processed variant: {variant_url}")
                 continue
 
-            name, color, glb_url = get_product_details(variant_url)
+            name, color, glb_url, error = get_product_details(variant_url)
             print(f"Processing variant: {name} - {color}")
             
             if glb_url:
                 filename = f"{name} - {color}.glb"
                 filename = re.sub(r'[<>:"/\\|?*]', '', filename)  # Remove invalid characters
                 full_path = os.path.join(download_dir, filename)
-                download_glb(glb_url, full_path)
-                downloaded = 1
+                if download_glb(glb_url, full_path):
+                    state = crawldb.DONE
+                else:
+                    state, error = crawldb.FAILED, 'download failed'
+            elif error:
+                state = crawldb.FAILED
             else:
-                downloaded = 0
+                state = crawldb.NO3D
                 print(f"No GLB file found for {name} - {color}")
 
-            c.execute("INSERT INTO products VALUES (?, ?, ?, ?, ?)",
-                      (variant_url, name, color, glb_url, downloaded))
-            conn.commit()
+            # Batched: committed every few rows rather than per product
+            db.finish(variant_url, state, glb_url=glb_url, error=error, name=name, color=color,
+                      source='ikea-glb-downloader')
     except Exception as e:
         print(f"Error processing product {url}: {str(e)}")
 
 def main():
+    import_legacy_db()
     start_url = input("Enter the IKEA category URL to download products from: ")
     download_all_colors = input("Do you want to download all color variants? (y/n): ").lower() == 'y'
     
-    page = 1
     total_processed = 0
     
-    while True:
-        print(f"\nFetching product links from page {page}")
-        current_url = f"{start_url}{'&' if '?' in start_url else '?'}page={page}"
-        product_links = get_product_links(current_url)
-        
-        if not product_links:
-            print(f"No products found on page {page}. Finishing process.")
-            break
-
-        for i, link in enumerate(product_links, 1):
-            print(f"\nProcessing item {i} of {len(product_links)} on page {page}")
-            process_product(link, download_all_colors)
+    try:
+        for link in iter_product_links(start_url):
             total_processed += 1
+            print(f"\nProcessing item {total_processed}")
+            process_product(link, download_all_colors)
+    finally:
+        session.close()
+        resolver.close()
 
-        print(f"Completed page {page}. Total products processed so far: {total_processed}")
-        page += 1
-
-    conn.close()
-    print(f"Finished processing all pages. Total products processed: {total_processed}")
+    db.close()
+    print(f"Finished processing the category. Total products processed: {total_processed}")
+    print(f"Browser launches: {session.launches}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for GLB URL extraction (courtyard_assets/extract.py).
+
+Runs the extractor over the saved product pages in
+scripts/fixtures/product-pages and reports throughput (pages/sec, MB/sec) and
+accuracy against expected.json. The fixtures cover XR viewer JSON, escaped
+and double-escaped script data, HTML entities in queries, <model-viewer>,
+non-dimma hosts, pages with every quality tier, and decoys (".gl",
+".glb.png", ".glbx") that must not match. --legacy runs the multi-findall
+scanner the scrapers used before, for comparison.
+
+Usage: python scripts/bench-extract.py [--seconds S] [--legacy] [--fixtures DIR]
+"""
+
+import argparse, json, os, re, time
+
+from courtyard_assets import extract
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'product-pages')
+
+
+def legacy_best(src):
+    """The previous approach: several full-page findall passes, split() cleanup, nested quality loops."""
+    matches = re.findall(r'https://web-api\.ikea\.com/dimma/assets/[^"\'\s<>]+\.glb[^"\'\s<>]*', src)
+    if not matches:
+        matches = re.findall(r'https://[^"\'\s<>]*\.glb(?:\?[^"\'\s<>]*)?', src)
+    clean = []
+    for m in matches:
+        m = m.split('"')[0].split("'")[0].split('<')[0].split(' ')[0]
+        if '.glb' in m.lower() and m not in clean:
+            clean.append(m)
+    for q in ['iqp3', 'rqp3', 'iqp2', 'rqp2', 'iqp1']:
+        for u in clean:
+            if q in u:
+                return u
+    return clean[0] if clean else None
+
+
+def load_fixtures(directory):
+    with open(os.path.join(directory, 'expected.json')) as f:
+        expected = json.load(f)
+    pages = []
+    for name, want in sorted(expected.items()):
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            pages.append((name, f.read(), want))
+    return pages
+
+
+def run(fn, pages, seconds):
+    """Call fn over every page repeatedly for ~seconds. Returns (pages/sec, MB/sec)."""
+    size = sum(len(src) for _, src, _ in pages)
+    rounds = 0
+    start = time.perf_counter()
+    while True:
+        for _, src, _ in pages:
+            fn(src)
+        rounds += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            break
+    return rounds * len(pages) / elapsed, rounds * size / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark GLB URL extraction on saved product pages')
+    parser.add_argument('--seconds', type=float, default=3.0, help='time budget per extractor')
+    parser.add_argument('--legacy', action='store_true', help='also benchmark the old multi-pass scanner')
+    parser.add_argument('--fixtures', default=FIXTURES, help='fixture directory with expected.json')
+    args = parser.parse_args()
+
+    pages = load_fixtures(args.fixtures)
+    size = sum(len(src) for _, src, _ in pages)
+    print(f"Fixtures: {len(pages)} pages, {size / 1e6:.2f} MB\n")
+
+    extractors = [('extract', extract.best_glb_url)]
+    if args.legacy:
+        extractors.append(('legacy', legacy_best))
+
+    for label, fn in extractors:
+        correct = 0
+        for name, src, want in pages:
+            got = fn(src)
+            if got == want:
+                correct += 1
+            else:
+                print(f"  [{label}] MISS {name}: got {got!r}, want {want!r}")
+        pps, mbps = run(fn, pages, args.seconds)
+        print(f"{label:>8}: {pps:8.1f} pages/sec  {mbps:7.1f} MB/sec  "
+              f"accuracy {correct}/{len(pages)} ({100 * correct / len(pages):.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the asset pipeline against the replay server.
+
+Runs the same code paths the scrapers use, offline, from a recorded archive
+(see scripts/replay-server.py), with a fresh HTTP cache and crawl state:
+
+  discovery    product URLs from the sitemap (or --category listings)
+  extraction   product pages fetched and GLB URLs extracted, with the
+               bulk scanner's browser fallback if --browser
+  download     quality tier resolved and GLBs downloaded
+  ph-download  Poly Haven /assets + /files JSON and the glTF files they list
+  conversion   glTF -> GLB via the polyhaven source (skipped without npx)
+
+Each stage reports throughput (items/s, MB/s) and p50/p95/p99 latency per
+item; the run reports peak RSS (this process and its children) and browser
+launches. Results are written as JSON. With a baseline (--baseline, default
+scripts/bench-baseline.json if present), throughput, p95 and peak RSS are
+compared against it and the exit status is 1 if any got worse by more than
+--threshold. --save-baseline stores this run as the new baseline.
+
+Usage: python scripts/bench-pipeline.py [--archive DIR] [--base-url URL]
+                                        [--max-products N] [--max-models N]
+                                        [--workers N] [--browser]
+                                        [--sitemap SOURCE | --category URL ...]
+                                        [--latency MS] [--jitter MS]
+                                        [--error-rate P] [--throttle RPS] [--seed N]
+                                        [--out FILE] [--baseline FILE]
+                                        [--threshold F] [--save-baseline]
+"""
+
+import argparse, contextlib, importlib, io, json, os, resource, shutil, subprocess
+import sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SCRIPTS)
+ARCHIVE = os.path.join(ROOT, '.asset-cache', 'replay')
+BASELINE = os.path.join(SCRIPTS, 'bench-baseline.json')
+THRESHOLD = 0.10
+
+
+class Stage:
+    """Wall time, per-item latencies, bytes and errors for one pipeline stage."""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.latencies = []
+        self.bytes = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.skipped = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def run(self):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def add(self, latency, nbytes=0, ok=True):
+        with self._lock:
+            self.latencies.append(latency)
+            self.bytes += nbytes
+            self.errors += not ok
+
+    def timed(self, fn, *args, check=False):
+        """
+        Call fn(*args), recording its latency; returns its result (None if it
+        raised). With check, a falsy result also counts as an error.
+        """
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            self.add(time.perf_counter() - start, ok=False)
+            return None
+        self.add(time.perf_counter() - start, ok=bool(result) or not check)
+        return result
+
+    def report(self):
+        if self.skipped:
+            return {'unit': self.unit, 'skipped': self.skipped}
+        lat = sorted(self.latencies)
+        seconds = self.seconds or 1e-9
+        return {'unit': self.unit, 'items': len(lat), 'errors': self.errors,
+                'seconds': round(self.seconds, 3),
+                'per_sec': round(len(lat) / seconds, 2),
+                'mb_per_sec': round(self.bytes / seconds / 1e6, 3),
+                'p50_ms': percentile(lat, 50), 'p95_ms': percentile(lat, 95),
+                'p99_ms': percentile(lat, 99)}
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of sorted latencies, in ms."""
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 1)
+
+
+def peak_rss_mb(who):
+    rss = resource.getrusage(who).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_rev():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_ikea(args, stages, workers, server):
+    from courtyard_assets import browser, download, ikea, tiers
+    # Page and sitemap bytes aren't visible to the callers; take them from the server
+    served = lambda: server.stats['bytes'] if server else 0
+
+    discovery = stages['discovery']
+    before = served()
+    with discovery.run():
+        sources = ([(url, lambda url=url: ikea.iter_category_products(url)) for url in args.category]
+                   or [(args.sitemap, lambda: ikea.iter_sitemap_products(args.locale, None, args.sitemap))])
+        products = []
+        for _, iterate in sources:
+            start = time.perf_counter()
+            try:
+                for url in iterate():
+                    products.append(url)
+                    discovery.add(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    if len(products) >= args.max_products:
+                        break
+            except Exception:
+                discovery.add(time.perf_counter() - start, ok=False)
+            if len(products) >= args.max_products:
+                break
+    discovery.bytes = served() - before
+
+    extraction = stages['extraction']
+    local = threading.local()
+    sessions = []
+    scan = importlib.import_module('ikea-bulk-scan') if args.browser else None
+
+    def extract_one(url):
+        glb_url = ikea.find_glb_url(url)
+        if glb_url is None and scan is not None:
+            if getattr(local, 'session', None) is None:
+                local.session = browser.DriverSession(scan.get_driver)
+                sessions.append(local.session)
+            glb_url = scan.check_for_3d_model(local.session, url)
+        return glb_url
+
+    before = served()
+    with extraction.run():
+        with ThreadPoolExecutor(workers) as pool:
+            glb_urls = [u for u in pool.map(lambda u: extraction.timed(extract_one, u), products) if u]
+    extraction.bytes = served() - before
+    for session in sessions:
+        session.close()
+
+    dl = stages['download']
+    dest = tempfile.mkdtemp(prefix='bench-glb-')
+    with dl.run(), tiers.TierResolver() as resolver:
+        def fetch_one(i, url):
+            start = time.perf_counter()
+            r = download.fetch(resolver.resolve(url).url, os.path.join(dest, f'{i}.glb'), min_size=1000)
+            dl.add(time.perf_counter() - start, r.size, r.ok)
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(fetch_one, range(len(glb_urls)), glb_urls))
+    shutil.rmtree(dest, ignore_errors=True)
+    return len(drivers)
+
+
+def bench_polyhaven(args, stages, workers):
+    from courtyard_assets import polyhaven
+    work = tempfile.mkdtemp(prefix='bench-ph-')
+    source = polyhaven.PolyHavenSource(root=os.path.join(work, 'out'),
+                                       tmp_dir=os.path.join(work, 'tmp'))
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    def fetch_one(item):
+        scratch = os.path.join(source.work_dir, item.id)
+        os.makedirs(scratch, exist_ok=True)
+        return source.fetch(item, source.resolve(item), scratch)
+
+    fetched = stages['ph-download']
+    with fetched.run(), quiet:
+        try:
+            items = list(source.enumerate())[:args.max_models]
+        except Exception:
+            items = []
+            fetched.errors += 1
+        with ThreadPoolExecutor(workers) as pool:
+            gltfs = list(pool.map(lambda item: fetched.timed(fetch_one, item), items))
+    fetched.bytes = sum(os.path.getsize(os.path.join(d, f))
+                        for d, _, files in os.walk(source.tmp_dir) for f in files)
+    ready = [(item, gltf) for item, gltf in zip(items, gltfs) if gltf]
+
+    conversion = stages['conversion']
+    if shutil.which('npx') is None:
+        conversion.skipped = 'npx not found'
+    else:
+        with conversion.run(), quiet:
+            with ThreadPoolExecutor(workers) as pool:
+                glbs = list(pool.map(lambda r: conversion.timed(source.normalize, *r), ready))
+        conversion.bytes = sum(os.path.getsize(glb) for glb, _ in filter(None, glbs))
+    shutil.rmtree(work, ignore_errors=True)
+
+
+def compare(results, baseline, threshold):
+    """Print the comparison with a baseline; returns the list of regressions."""
+    regressions = []
+    print(f"\nBaseline: {baseline.get('git') or '?'} ({baseline.get('timestamp', '?')}), "
+          f"threshold {threshold:.0%}")
+    for name, now in results['stages'].items():
+        then = baseline.get('stages', {}).get(name)
+        if not then or 'skipped' in now or 'skipped' in then:
+            continue
+        for key, higher_is_better in (('per_sec', True), ('p95_ms', False)):
+            a, b = then.get(key), now.get(key)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = -change if higher_is_better else change
+            flag = 'REGRESSION' if worse > threshold else ''
+            print(f"  {name:>12} {key:>8}: {a:>10} -> {b:>10} ({change:+.1%}) {flag}")
+            if flag:
+                regressions.append(f'{name}.{key}')
+    a, b = baseline.get('peak_rss_mb', {}).get('self'), results['peak_rss_mb']['self']
+    if a:
+        change = (b - a) / a
+        flag = 'REGRESSION' if change > threshold else ''
+        print(f"  {'peak RSS':>12} {'MB':>8}: {a:>10} -> {b:>10} ({change:+.1%}) {flag}")
+        if flag:
+            regressions.append('peak_rss_mb')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the asset pipeline against the replay server')
+    parser.add_argument('--archive', default=ARCHIVE, help='replay archive to serve')
+    parser.add_argument('--base-url', help='use an already running replay server instead of starting one')
+    parser.add_argument('--max-products', type=int, default=200)
+    parser.add_argument('--max-models', type=int, default=20, help='Poly Haven models (0: skip)')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--browser', action='store_true',
+                        help='fall back to headless Chrome for pages without a model in their HTML')
+    parser.add_argument('--sitemap', help='sitemap source for discovery (default: IKEA\'s index)')
+    parser.add_argument('--locale', default='us/en')
+    parser.add_argument('--category', action='append', default=[], metavar='URL',
+                        help='discover from category listings instead of the sitemap')
+    parser.add_argument('--latency', type=float, default=0, metavar='MS')
+    parser.add_argument('--jitter', type=float, default=0, metavar='MS')
+    parser.add_argument('--error-rate', type=float, default=0, metavar='P')
+    parser.add_argument('--throttle', type=float, default=0, metavar='RPS')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='results file (default: .asset-cache/bench/pipeline-<time>.json)')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='fractional slowdown counted as a regression (default: 0.10)')
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    # Clean caches and crawl state; must be set before courtyard_assets is imported
+    state = tempfile.mkdtemp(prefix='bench-state-')
+    os.environ['COURTYARD_CACHE_DIR'] = state
+    from courtyard_assets import ikea, metrics, ratelimit, replay
+    args.sitemap = args.sitemap or ikea.SITEMAP_INDEX
+
+    server = None
+    if args.base_url:
+        base_url = args.base_url.rstrip('/')
+    else:
+        faults = replay.Faults(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                               error_rate=args.error_rate, throttle=args.throttle, seed=args.seed)
+        server = replay.start(args.archive, port=0, faults=faults)
+        base_url = server.base_url
+    replay.BASE_URL = os.environ['COURTYARD_BASE_URL'] = base_url
+
+    stages = {name: Stage(name, unit) for name, unit in (
+        ('discovery', 'products'), ('extraction', 'pages'), ('download', 'files'),
+        ('ph-download', 'models'), ('conversion', 'models'))}
+    workers = max(1, args.workers)
+    print(f"Benchmarking against {base_url} ({workers} workers)")
+    try:
+        launches = bench_ikea(args, stages, workers, server)
+        if args.max_models:
+            bench_polyhaven(args, stages, workers)
+        else:
+            stages['ph-download'].skipped = stages['conversion'].skipped = '--max-models 0'
+    finally:
+        if server:
+            server.shutdown()
+        shutil.rmtree(state, ignore_errors=True)
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git': git_rev(),
+        'args': {k: v for k, v in vars(args).items() if k not in ('out', 'baseline', 'save_baseline')},
+        'stages': {name: stage.report() for name, stage in stages.items()},
+        'peak_rss_mb': {'self': peak_rss_mb(resource.RUSAGE_SELF),
+                        'children': peak_rss_mb(resource.RUSAGE_CHILDREN)},
+        'browser_launches': launches,
+        'hosts': ratelimit.snapshot(),
+        'metrics': metrics.snapshot(),
+        'replay': server.stats if server else None,
+    }
+
+    for name, r in results['stages'].items():
+        if 'skipped' in r:
+            print(f"  {name:>12}: skipped ({r['skipped']})")
+        else:
+            print(f"  {name:>12}: {r['items']:5d} {r['unit']:<8} {r['per_sec']:8.2f}/s "
+                  f"{r['mb_per_sec']:7.2f} MB/s  p50 {r['p50_ms']} p95 {r['p95_ms']} "
+                  f"p99 {r['p99_ms']} ms  errors {r['errors']}")
+    print(f"  peak RSS: {results['peak_rss_mb']['self']} MB (children "
+          f"{results['peak_rss_mb']['children']} MB), browser launches: {launches}")
+
+    out = args.out or os.path.join(ROOT, '.asset-cache', 'bench',
+                                   f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results: {out}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved: {args.baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
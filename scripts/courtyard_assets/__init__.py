@@ -0,0 +1,23 @@
+"""
+Shared core for the asset scripts in scripts/ (IKEA scrapers, Poly Haven
+downloader). The scripts are run directly (python scripts/<name>.py), which
+puts scripts/ on sys.path so they can `import courtyard_assets`.
+
+The package is also a command line tool (cli.py):
+
+    cd scripts && python -m courtyard_assets {discover,fetch,verify,manifest,stats}
+
+Keep this module import-free beyond the standard library: the CLI's manifest
+and verify commands rely on it staying cheap to import.
+"""
+
+import os
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# One directory per asset source (ikea, polyhaven, ...), served to the client
+MODELS_DIR = os.path.join(ROOT, 'public', 'models')
+
+# Local state shared by the scripts (HTTP validators, crawl frontier); gitignored.
+# COURTYARD_CACHE_DIR moves it, e.g. to give a benchmark run clean state.
+CACHE_DIR = os.environ.get('COURTYARD_CACHE_DIR') or os.path.join(ROOT, '.asset-cache')
@@ -0,0 +1,371 @@
+"""
+Event-driven page readiness for the Selenium paths.
+
+Instead of fixed time.sleep() calls and polling the ever-growing
+get_log('performance') buffer, a small watcher script is registered through
+CDP (Page.addScriptToEvaluateOnNewDocument) so it runs before any page JS.
+It records GLB requests as they are issued (fetch / XHR / resource timing)
+and the #pip-xr-viewer-model / <model-viewer> sources as they appear in the
+DOM. The wait_* helpers then block on a promise that resolves on the first
+matching event, with a hard timeout as the fallback.
+
+Selenium's synchronous API can't subscribe to CDP events directly (that
+needs the async bidi connection), so the events are observed in-page and
+delivered through execute_async_script.
+
+Blocking profiles cut what the headless browser downloads and decodes: we
+only ever want the product JSON or one GLB request, not the images, video,
+fonts and analytics a product page pulls in. configure_options() sets the
+Chrome flags before launch; apply_blocking() installs the URL patterns with
+CDP Network.setBlockedURLs once the driver is up.
+
+Launching Chrome is the largest fixed cost of a scrape. launch_chrome()
+reuses the chromedriver path webdriver-manager resolved on an earlier run
+(.asset-cache/chromedriver.json) instead of re-checking it on every launch,
+and DriverSession keeps one browser alive across pages, relaunching it after
+max_pages navigations or when it crashes.
+
+Page loads go through navigate(), which waits for the host's adaptive rate
+limiter (ratelimit.py) like the HTTP fetchers do and reports the document's
+HTTP status back to it, retrying a 429/503 page once the host has cooled down.
+"""
+
+import json
+import os
+import time
+
+from . import CACHE_DIR, metrics, ratelimit, replay
+
+CHROMEDRIVER_CACHE = os.path.join(CACHE_DIR, 'chromedriver.json')
+CHROMEDRIVER_TTL = 7 * 24 * 3600  # seconds before webdriver-manager is asked again
+
+MAX_PAGES_PER_DRIVER = 100  # navigations before a browser is recycled
+NAVIGATE_RETRIES = 3         # loads of a page the host keeps throttling
+
+# URL patterns per resource group (Network.setBlockedURLs wildcard syntax)
+BLOCK_PATTERNS = {
+    'images': ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*'],
+    'media': ['*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*', '*.m4s*'],
+    'fonts': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*'],
+    'styles': ['*.css*'],
+    'trackers': [
+        '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+        '*facebook.net*', '*connect.facebook.com*', '*hotjar.com*', '*clarity.ms*',
+        '*bat.bing.com*', '*pinterest.com/ct*', '*tiktok.com*', '*snapchat.com*',
+        '*cookielaw.org*', '*onetrust.com*', '*optimizely.com*', '*kameleoon*',
+        '*newrelic.com*', '*nr-data.net*', '*sentry.io*',
+    ],
+}
+
+# 'light' keeps CSS so layout-dependent steps (scroll-to-load, clicking the
+# 3D button) still work; 'full' also drops stylesheets for pages that are
+# only read from page_source / the XR viewer JSON.
+BLOCK_PROFILES = {
+    'none': (),
+    'light': ('images', 'media', 'fonts', 'trackers'),
+    'full': ('images', 'media', 'fonts', 'trackers', 'styles'),
+}
+DEFAULT_BLOCK_PROFILE = 'light'
+
+GLB_WATCH_JS = r'''
+(() => {
+  if (window.__glbWatch) return;
+  const w = window.__glbWatch = { urls: [], waiters: [] };
+  const isGlb = (u) => /\.glb(?:[?#]|$)|glb_draco/i.test(u);
+  const note = (u) => {
+    if (!u) return;
+    try { u = new URL(String(u), location.href).href; } catch (e) { return; }
+    if (!isGlb(u) || w.urls.includes(u)) return;
+    w.urls.push(u);
+    w.waiters.splice(0).forEach((fn) => fn());
+  };
+
+  const origFetch = window.fetch;
+  if (origFetch) {
+    window.fetch = function (input) {
+      note(typeof input === 'string' ? input : input && input.url);
+      return origFetch.apply(this, arguments);
+    };
+  }
+  const origOpen = XMLHttpRequest.prototype.open;
+  XMLHttpRequest.prototype.open = function (method, url) {
+    note(url);
+    return origOpen.apply(this, arguments);
+  };
+  try {
+    new PerformanceObserver((list) => list.getEntries().forEach((e) => note(e.name)))
+      .observe({ type: 'resource', buffered: true });
+  } catch (e) {}
+
+  let queued = false;
+  const scan = () => {
+    queued = false;
+    const xr = document.getElementById('pip-xr-viewer-model');
+    if (xr) {
+      try { note(JSON.parse(xr.textContent).url); } catch (e) {}
+    }
+    document.querySelectorAll('model-viewer[src]').forEach((mv) => note(mv.getAttribute('src')));
+  };
+  new MutationObserver(() => {
+    if (!queued) { queued = true; queueMicrotask(scan); }
+  }).observe(document, { childList: true, subtree: true, attributes: true, attributeFilter: ['src'] });
+  document.addEventListener('DOMContentLoaded', scan);
+})();
+'''
+
+# HTTP status of the current document (Chrome 109+), or null
+NAV_STATUS_JS = r'''
+const nav = performance.getEntriesByType('navigation')[0];
+return nav && nav.responseStatus ? nav.responseStatus : null;
+'''
+
+WAIT_GLB_JS = r'''
+const timeoutMs = arguments[0], untilLoad = arguments[1], done = arguments[arguments.length - 1];
+const w = window.__glbWatch;
+if (!w || w.urls.length) return done(w ? w.urls : []);
+let finished = false, t = null;
+const finish = () => {
+  if (finished) return;
+  finished = true;
+  clearTimeout(t);
+  done(w.urls);
+};
+t = setTimeout(finish, timeoutMs);
+w.waiters.push(finish);
+if (untilLoad) {
+  if (document.readyState === 'complete') finish();
+  else window.addEventListener('load', finish, { once: true });
+}
+'''
+
+WAIT_SELECTOR_JS = r'''
+const [selector, minCount, timeoutMs] = arguments, done = arguments[arguments.length - 1];
+const count = () => document.querySelectorAll(selector).length;
+if (count() >= minCount) return done(count());
+const obs = new MutationObserver(() => {
+  const n = count();
+  if (n >= minCount) { obs.disconnect(); clearTimeout(t); done(n); }
+});
+const t = setTimeout(() => { obs.disconnect(); done(count()); }, timeoutMs);
+obs.observe(document, { childList: true, subtree: true });
+'''
+
+
+def configure_options(options, profile=DEFAULT_BLOCK_PROFILE):
+    """Add the launch-time Chrome flags for a blocking profile to ChromeOptions."""
+    groups = BLOCK_PROFILES[profile]
+    if 'images' in groups:
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_experimental_option(
+            'prefs', {'profile.managed_default_content_settings.images': 2})
+    if 'fonts' in groups:
+        options.add_argument('--disable-remote-fonts')
+    if 'media' in groups:
+        options.add_argument('--autoplay-policy=user-gesture-required')
+        options.add_argument('--mute-audio')
+    return options
+
+
+def apply_blocking(driver, profile=DEFAULT_BLOCK_PROFILE):
+    """Block the profile's URL patterns for every request this driver makes."""
+    patterns = [p for group in BLOCK_PROFILES[profile] for p in BLOCK_PATTERNS[group]]
+    if patterns:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+
+def install_glb_watch(driver):
+    """Register the GLB watcher on every document this driver loads from now on."""
+    driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': GLB_WATCH_JS})
+
+
+def _async(driver, script, timeout, *args):
+    driver.set_script_timeout(timeout + 5)
+    return driver.execute_async_script(script, *args)
+
+
+class PageLoadError(Exception):
+    """A page that was still throttled, or failing server-side, after navigate()."""
+
+
+def raise_for_status(status):
+    """Raise PageLoadError for a navigate() status that means the page didn't load."""
+    if status in ratelimit.THROTTLE_STATUS or (status or 0) >= 500:
+        raise PageLoadError(f'HTTP {status}')
+
+
+def navigate(driver, url):
+    """
+    driver.get(url) under the host's rate limiter (and against the replay
+    server, when COURTYARD_BASE_URL is set). Returns the document's HTTP
+    status (None if the browser doesn't report it).
+    """
+    limiter = ratelimit.limiter_for(url)
+    target = replay.rewrite(url)
+    for attempt in range(NAVIGATE_RETRIES):
+        if attempt:
+            metrics.count('navigate_retries', host=limiter.host)
+        with metrics.span('navigate', host=limiter.host) as s:
+            queued = time.monotonic()
+            started = limiter.acquire()
+            s['wait_ms'] = round((started - queued) * 1000, 1)  # held back by the rate limiter
+            metrics.count('ratelimit_wait_seconds', started - queued, host=limiter.host)
+            try:
+                driver.get(target)
+            except Exception:
+                limiter.release(started)
+                raise
+            try:
+                status = driver.execute_script(NAV_STATUS_JS)
+            except Exception:
+                status = None
+            s['status'] = status
+        # Headers aren't visible to the page; a throttled load gets the default pause
+        limiter.release(started, status or 200)
+        if status not in ratelimit.THROTTLE_STATUS:
+            return status
+    return status
+
+
+def wait_for_glb(driver, timeout=8, until_load=False):
+    """
+    Block until the current page requests or declares a GLB, or timeout
+    seconds pass. With until_load, also stop at the window load event (the
+    XR viewer JSON is server-rendered, so a loaded page without it has no
+    model). Returns the GLB URLs seen so far (possibly empty).
+    """
+    with metrics.span('wait_glb') as s:
+        try:
+            urls = list(_async(driver, WAIT_GLB_JS, timeout, int(timeout * 1000), until_load) or [])
+        except Exception:
+            urls = []
+        s['found'] = len(urls)
+    return urls
+
+
+def wait_for_count(driver, selector, min_count=1, timeout=10):
+    """
+    Block until at least min_count elements match selector (resolved by a
+    MutationObserver, not by polling), or timeout. Returns the match count.
+    """
+    with metrics.span('wait_selector') as s:
+        try:
+            n = int(_async(driver, WAIT_SELECTOR_JS, timeout, selector, min_count,
+                           int(timeout * 1000)) or 0)
+        except Exception:
+            n = 0
+        s['count'] = n
+    return n
+
+
+def chromedriver_path(refresh=False):
+    """
+    Path to a chromedriver binary. Resolved through webdriver-manager (which
+    checks the installed Chrome version, often over the network) at most once
+    per CHROMEDRIVER_TTL; later runs reuse the cached path.
+    """
+    if not refresh:
+        try:
+            with open(CHROMEDRIVER_CACHE) as f:
+                cached = json.load(f)
+            if time.time() - cached['resolved_at'] < CHROMEDRIVER_TTL and \
+                    os.access(cached['path'], os.X_OK):
+                return cached['path']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    from webdriver_manager.chrome import ChromeDriverManager
+    try:
+        path = ChromeDriverManager(log_level=0).install()
+    except TypeError:
+        path = ChromeDriverManager().install()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = CHROMEDRIVER_CACHE + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'path': path, 'resolved_at': time.time()}, f)
+    os.replace(tmp, CHROMEDRIVER_CACHE)
+    return path
+
+
+def launch_chrome(options):
+    """Start Chrome with the cached chromedriver, re-resolving it if Chrome has moved on."""
+    from selenium import webdriver
+    from selenium.common.exceptions import SessionNotCreatedException
+    from selenium.webdriver.chrome.service import Service
+
+    try:
+        return webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+    except SessionNotCreatedException:
+        # Typically Chrome auto-updated past the cached driver's version
+        return webdriver.Chrome(service=Service(chromedriver_path(refresh=True)), options=options)
+
+
+class DriverSession:
+    """
+    One browser shared by every page a script visits, instead of a launch
+    (and quit) per page:
+
+        session = DriverSession(get_driver)
+        driver = session.open(url)   # launches on first use
+        ...
+        session.close()
+
+    The driver is relaunched after max_pages navigations (long-lived Chrome
+    processes grow) and, once, when a navigation fails because the browser
+    has died.
+    """
+
+    def __init__(self, factory, max_pages=MAX_PAGES_PER_DRIVER):
+        self.factory = factory
+        self.max_pages = max_pages
+        self.driver = None
+        self.pages = 0
+        self.launches = 0
+        self.status = None  # HTTP status of the last page opened
+
+    def _alive(self):
+        try:
+            self.driver.execute_script('return 1')
+            return True
+        except Exception:
+            return False
+
+    def recycle(self):
+        """Quit the current browser; the next open() launches a fresh one."""
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+        self.driver = None
+        self.pages = 0
+
+    def open(self, url):
+        """Navigate to url and return the driver (the page's HTTP status is in .status)."""
+        if self.driver is not None and self.pages >= self.max_pages:
+            metrics.count('browser_restarts', reason='max_pages')
+            self.recycle()
+        for attempt in range(2):
+            if self.driver is None:
+                with metrics.span('browser_launch'):
+                    self.driver = self.factory()
+                self.launches += 1
+                metrics.count('browser_launches')
+            try:
+                self.status = navigate(self.driver, url)
+                self.pages += 1
+                return self.driver
+            except Exception:
+                if attempt or self._alive():
+                    raise
+                metrics.count('browser_restarts', reason='crash')
+                self.recycle()  # browser crashed: retry once in a fresh one
+
+    def close(self):
+        self.recycle()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,864 @@
+"""
+courtyard_assets command line: one entry point over the shared core.
+
+    cd scripts && python -m courtyard_assets <command> [options]
+
+    discover   feed the IKEA crawl frontier from category listings or a sitemap
+    fetch      run an asset source (sources.py): ikea, polyhaven, kenney, ...
+    verify     check every manifest entry against the file on disk
+    manifest   list a source's manifest, or --rebuild it from the files on disk
+    inspect    record each model's bounds, triangles and textures (glb.py) in
+               its manifest entry, and check CATALOG's w/h/d against them
+    lod        write decimated levels of detail (lod.py) to each source's lod/
+               directory and list them in its manifest
+    optimize   quantize and meshopt-compress models and their levels of detail
+               (optimize.py) into public/models-opt/<source>, with a size and
+               error report
+    variants   merge models that differ only in materials into one GLB per family
+               with KHR_materials_variants (variants.py), under each source's
+               families/ directory, and map catalog ids to them in its manifest
+    textures   downscale and recompress the images embedded in those optimised
+               models (textures.py), in place
+    stats      entries, bytes and dedup per source, plus crawl frontier counts
+
+Sources are the directories under public/models (ikea, polyhaven, ...).
+
+Only the standard library is imported at startup; each command imports the
+modules it needs when it runs. verify, manifest, inspect and stats never load
+requests, selenium, tqdm or numpy, so they start in a few tens of milliseconds and
+are cheap enough for pre-commit and container start hooks:
+
+    python -m courtyard_assets verify --quick    # sizes and GLB headers only
+
+fetch ikea stays browser-free: products whose static HTML has no model are
+left pending for ikea-bulk-scan.py, which falls back to Selenium.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+from . import CACHE_DIR, MODELS_DIR, ROOT
+from .sources import GLB_MAGIC
+
+HASH_WORKERS = 8
+
+
+def source_names():
+    """Asset sources: the directories under public/models."""
+    if not os.path.isdir(MODELS_DIR):
+        return []
+    return sorted(e.name for e in os.scandir(MODELS_DIR) if e.is_dir())
+
+
+def _sources(names):
+    """(name, directory) for the requested sources, or all of them."""
+    known = source_names()
+    for name in names or []:
+        if name not in known:
+            sys.exit(f"Unknown source {name!r} (have: {', '.join(known) or 'none'})")
+    return [(name, os.path.join(MODELS_DIR, name)) for name in names or known]
+
+
+def _load(root):
+    """A source's manifest, or None if it has none."""
+    from .manifest import load_manifest
+    path = os.path.join(root, 'manifest.json')
+    return load_manifest(path) if os.path.exists(path) else None
+
+
+def _glb_files(root):
+    return sorted(e.name for e in os.scandir(root) if e.is_file() and e.name.endswith('.glb'))
+
+
+def _derived_files(root):
+    """GLBs made from a source's models, relative to it: lod/<stem>.lod1.glb, families/<family>.glb."""
+    found = []
+    for dirname in ('lod', 'families'):
+        path = os.path.join(root, dirname)
+        if os.path.isdir(path):
+            found += [f'{dirname}/{f}' for f in _glb_files(path)]
+    return found
+
+
+# ── discover ──
+
+def cmd_discover(args):
+    from . import crawldb, ikea, metrics
+    metrics.setup(args, 'courtyard-discover')
+    root = os.path.join(MODELS_DIR, 'ikea')
+    manifest = _load(root) or {}
+    if args.sitemap:
+        streams = [('sitemap', ikea.iter_sitemap_products(args.locale, args.types, args.sitemap))]
+    else:
+        streams = [(url.rstrip('/').split('/')[-1],
+                    ikea.iter_category_products(url)) for url in args.category or ikea.CATEGORY_URLS]
+
+    total = 0
+    with crawldb.CrawlDB() as db:
+        for name, links in streams:
+            found = queued = 0
+            batch = {}
+            for purl in metrics.timed_iter(links, 'discover', source=name):
+                found += 1
+                if args.max_per_category and found > args.max_per_category:
+                    break
+                cid = ikea.catalog_id(ikea.product_slug(purl))
+                entry = manifest.get(cid)
+                if entry and os.path.exists(os.path.join(root, entry['file'])):
+                    metrics.count('skipped', reason='stored')
+                    continue
+                if db.known_no3d(purl):
+                    metrics.count('skipped', reason='no3d_cached')
+                    continue
+                batch[purl] = cid
+                if len(batch) >= ikea.PAGE_SIZE:
+                    queued += db.add(batch, source=name, catalog_ids=batch)
+                    db.revisit(batch)
+                    batch = {}
+            queued += db.add(batch, source=name, catalog_ids=batch)
+            db.revisit(batch)
+            total += queued
+            note = '' if found else ' (listing unavailable; ikea-bulk-scan.py can scroll it)'
+            print(f"{name}: {found} products, {queued} new{note}")
+        counts = db.counts()
+    print(f"Queued {total}; frontier: {_format_counts(counts)}")
+
+
+# ── fetch ──
+
+def cmd_fetch(args):
+    from . import metrics, sources
+    metrics.setup(args, f'courtyard-fetch-{args.source}')
+    sources.load_plugins()
+    try:
+        source = sources.get(args.source).from_args(args)
+    except sources.SourceError as e:
+        sys.exit(str(e))
+    print(f"Fetching {args.source} into {source.root}")
+    counts = sources.run(source, workers=args.workers, refresh=args.refresh, limit=args.limit)
+    print(', '.join(f'{n} {status}' for status, n in sorted(counts.items())) or 'Nothing to do')
+    if counts.get('deferred') and args.source == 'ikea':
+        print("Deferred products need a browser: run ikea-bulk-scan.py")
+    return 1 if counts.get('failed') else 0
+
+
+# ── verify ──
+
+def _check(root, cid, entry, full):
+    """Problems with one manifest entry, as (cid, severity, message) tuples."""
+    path = os.path.join(root, entry['file'])
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            magic = f.read(4)
+    except OSError:
+        return [(cid, 'error', f"missing {entry['file']}")]
+    problems = []
+    if magic != GLB_MAGIC and entry['file'].endswith('.glb'):
+        problems.append((cid, 'error', f"{entry['file']} is not a GLB"))
+    if 'size' in entry and entry['size'] != size:
+        problems.append((cid, 'error', f"size {size} != manifest {entry['size']}"))
+    if 'sha256' not in entry:
+        problems.append((cid, 'warning', 'no sha256 (manifest --rebuild records it)'))
+    elif full and not problems:
+        from .store import sha256_file
+        if sha256_file(path) != entry['sha256']:
+            problems.append((cid, 'error', 'sha256 mismatch'))
+    for derived in entry.get('lods', []) + ([entry['family']] if 'family' in entry else []):
+        derived_path = os.path.join(root, derived['file'])
+        if not os.path.exists(derived_path):
+            problems.append((cid, 'error', f"missing {derived['file']}"))
+        elif os.path.getsize(derived_path) != derived['size']:
+            problems.append((cid, 'error', f"{derived['file']} size != manifest {derived['size']}"))
+    return problems
+
+
+def cmd_verify(args):
+    errors = 0
+    for name, root in _sources(args.source):
+        manifest = _load(root)
+        if manifest is None:
+            print(f"{name}: no manifest, skipped")
+            continue
+        items = sorted(manifest.items())
+        if args.quick:
+            problems = [p for cid, entry in items for p in _check(root, cid, entry, False)]
+        else:
+            # Hashing is I/O and hashlib releases the GIL: a thread pool keeps the disk busy
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(HASH_WORKERS) as pool:
+                problems = [p for found in pool.map(lambda kv: _check(root, *kv, True), items)
+                            for p in found]
+        listed = {entry['file'] for entry in manifest.values()}
+        problems += [(f, 'warning', 'not in manifest') for f in _glb_files(root) if f not in listed]
+
+        n_errors = sum(1 for p in problems if p[1] == 'error')
+        n_warnings = len(problems) - n_errors
+        errors += n_errors
+        if args.strict:
+            errors += n_warnings
+        print(f"{name}: {len(manifest)} entries, {n_errors} errors, {n_warnings} warnings")
+        for cid, severity, message in problems:
+            if severity == 'error' or args.verbose:
+                print(f"  {severity}: {cid}: {message}")
+    return 1 if errors else 0
+
+
+# ── manifest ──
+
+def _rebuild(root, manifest):
+    """
+    Reconcile a manifest with the files on disk: drop entries whose file is
+    gone, hash entries that have no sha256 or whose file no longer is their
+    blob, forget levels of detail and families whose files are missing (the
+    lod and variants commands make them again) and add untracked GLBs keyed
+    by file stem. Returns change counts.
+    """
+    from .store import BlobStore
+    store = BlobStore(root)
+    changes = {'dropped': 0, 'hashed': 0, 'added': 0}
+    for cid, entry in list(manifest.items()):
+        path = os.path.join(root, entry['file'])
+        if not os.path.exists(path):
+            del manifest[cid]
+            changes['dropped'] += 1
+        elif not (entry.get('sha256') in store and
+                  os.path.samefile(path, store.blob_path(entry['sha256']))):
+            entry.update(store.adopt(entry['file']))
+            changes['hashed'] += 1
+        if not all(os.path.exists(os.path.join(root, level['file']))
+                   for level in entry.get('lods', [])):
+            del entry['lods']
+        if 'family' in entry and not os.path.exists(os.path.join(root, entry['family']['file'])):
+            del entry['family']
+    listed = {entry['file'] for entry in manifest.values()}
+    for filename in _glb_files(root):
+        cid = filename[:-len('.glb')]
+        if filename not in listed and cid not in manifest:
+            manifest[cid] = store.adopt(filename)
+            changes['added'] += 1
+    return changes
+
+
+def cmd_manifest(args):
+    from .manifest import save_manifest
+    root = os.path.join(MODELS_DIR, args.source)
+    _sources([args.source])
+    manifest = _load(root)
+    if args.rebuild:
+        manifest = manifest or {}
+        changes = _rebuild(root, manifest)
+        save_manifest(manifest, os.path.join(root, 'manifest.json'))
+        print(f"{args.source}: {len(manifest)} entries "
+              f"({', '.join(f'{n} {k}' for k, n in changes.items())})")
+        return 0
+    if manifest is None:
+        print(f"{args.source}: no manifest (manifest --rebuild creates one)", file=sys.stderr)
+        return 1
+    if args.json:
+        json.dump(manifest, sys.stdout, indent=2)
+        print()
+        return 0
+    for cid, entry in sorted(manifest.items()):
+        size = f"{entry['size'] // 1024}KB" if 'size' in entry else '?'
+        extra = entry.get('tier') or ''
+        print(f"{cid:<42} {entry['file']:<46} {size:>8} {extra}")
+    return 0
+
+
+# ── inspect ──
+
+CATALOG_JS = os.path.join(ROOT, 'app', 'modules', 'furniture.js')
+CATALOG_RE = re.compile(r"id:\s*'([^']+)'.*?\bw:\s*([\d.]+),\s*h:\s*([\d.]+),\s*d:\s*([\d.]+)"
+                        r".*?model:\s*'([^'/]+)/([^']+)'")
+CATALOG_TOLERANCE = 0.25  # relative size difference reported by --catalog
+
+
+def _inspect_one(path):
+    """Process pool worker: (model info, None) or (None, error)."""
+    from . import glb
+    try:
+        return glb.inspect(path), None
+    except (OSError, ValueError, KeyError, IndexError, glb.GLBError) as e:
+        return None, str(e) or type(e).__name__
+
+
+def _check_catalog():
+    """Compare CATALOG's hardcoded w/h/d with the inspected model bounds."""
+    with open(CATALOG_JS) as f:
+        rows = CATALOG_RE.findall(f.read())
+    manifests = {}
+    mismatched = 0
+    for cid, w, h, d, source, filename in rows:
+        if source not in manifests:
+            manifests[source] = {e['file']: e for e in (_load(os.path.join(MODELS_DIR, source)) or {}).values()}
+        dims = (manifests[source].get(filename) or {}).get('model', {}).get('dims')
+        if not dims:
+            continue
+        box = [float(w), float(h), float(d)]
+        # Models are often authored rotated a quarter turn, so compare footprints either way
+        off = min(max(abs(a - b) / max(b, 1e-3) for a, b in zip(box, m))
+                  for m in (dims, [dims[2], dims[1], dims[0]]))
+        if off > CATALOG_TOLERANCE:
+            mismatched += 1
+            print(f"  {cid:<18} catalog {'x'.join(f'{v:.2f}' for v in box):<16} "
+                  f"model {'x'.join(f'{v:.2f}' for v in dims):<16} {source}/{filename}")
+    print(f"{len(rows)} catalog entries, {mismatched} off by more than {CATALOG_TOLERANCE:.0%}")
+
+
+def cmd_inspect(args):
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from .manifest import save_manifest
+    for name, root in _sources(args.source):
+        manifest = _load(root)
+        if manifest is None:
+            print(f"{name}: no manifest, skipped (fetch {name} creates one)")
+            continue
+        todo = [(cid, os.path.join(root, entry['file'])) for cid, entry in sorted(manifest.items())
+                if args.force or 'model' not in entry]
+        missing = sum(1 for _, path in todo if not os.path.exists(path))
+        todo = [(cid, path) for cid, path in todo if os.path.exists(path)]
+        start = time.perf_counter()
+        errors = 0
+        if todo:
+            with ProcessPoolExecutor(args.workers) as pool:
+                found = pool.map(_inspect_one, [path for _, path in todo], chunksize=16)
+                for (cid, _), (info, error) in zip(todo, found):
+                    if error:
+                        errors += 1
+                        print(f"  {cid}: {error}")
+                    else:
+                        manifest[cid]['model'] = info
+            save_manifest(manifest, os.path.join(root, 'manifest.json'))
+        print(f"{name}: {len(todo) - errors} inspected, {errors} errors, {missing} missing, "
+              f"{len(manifest) - len(todo) - missing} already done ({time.perf_counter() - start:.2f}s)")
+    if args.catalog:
+        _check_catalog()
+    return 0
+
+
+# ── lod ──
+
+def _category(name, cid, entry, known):
+    """The manifest category that picks a model's budgets from `known`, or None."""
+    if entry.get('category'):
+        return entry['category']
+    for category in entry.get('categories', []):
+        if category in known:
+            return category
+    if name == 'ikea':
+        # IKEA entries carry no category; the product slug has one
+        from . import ikea
+        return ikea.category_of(cid.replace('_', '-'))
+    return None
+
+
+def _lod_one(job):
+    """Process pool worker: (manifest lods, source triangles, None) or (None, None, error)."""
+    from . import glb, lod
+    root, filename, budgets, max_errors = job
+    try:
+        total, levels = lod.build_levels(os.path.join(root, filename), budgets, max_errors)
+        lods = []
+        for level, (triangles, error, gltf, bin_chunk) in enumerate(levels, 1):
+            path = os.path.join(root, lod.lod_file(filename, level))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            glb.write(path, gltf, bin_chunk)
+            lods.append({'file': lod.lod_file(filename, level), 'triangles': triangles,
+                         'error': round(error, 6), 'size': os.path.getsize(path)})
+        # Levels a previous run made that this one didn't
+        for level in range(len(levels) + 1, len(budgets) + 1):
+            stale = os.path.join(root, lod.lod_file(filename, level))
+            if os.path.exists(stale):
+                os.remove(stale)
+        return lods, total, None
+    except (OSError, ValueError, KeyError, IndexError, glb.GLBError, lod.LODError) as e:
+        return None, None, str(e) or type(e).__name__
+
+
+def cmd_lod(args):
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from .lod import DEFAULT_MAX_ERRORS, LOD_BUDGETS, budget_for
+    from .manifest import save_manifest
+    try:
+        import DracoPy  # noqa: F401  (decodes Draco-compressed models, most IKEA ones)
+    except ImportError:
+        print("lod needs DracoPy to decode Draco-compressed models: pip install DracoPy",
+              file=sys.stderr)
+        return 1
+    max_errors = tuple(args.max_error) if args.max_error else DEFAULT_MAX_ERRORS
+    failed = 0
+    for name, root in _sources(args.source):
+        manifest = _load(root)
+        if manifest is None:
+            print(f"{name}: no manifest, skipped (fetch {name} creates one)")
+            continue
+        todo = [(cid, entry) for cid, entry in sorted(manifest.items())
+                if args.force or 'lods' not in entry]
+        missing = sum(1 for _, entry in todo if not os.path.exists(os.path.join(root, entry['file'])))
+        todo = [(cid, entry) for cid, entry in todo if os.path.exists(os.path.join(root, entry['file']))]
+        jobs = [(root, entry['file'], budget_for(_category(name, cid, entry, LOD_BUDGETS))[:args.levels], max_errors)
+                for cid, entry in todo]
+        start = time.perf_counter()
+        counts = {'simplified': 0, 'under budget': 0, 'failed': 0}
+        before = after = 0
+        if jobs:
+            with ProcessPoolExecutor(args.workers) as pool:
+                for (cid, entry), (lods, total, error) in zip(todo, pool.map(_lod_one, jobs)):
+                    if error:
+                        counts['failed'] += 1
+                        print(f"  {cid}: {error}")
+                        continue
+                    entry['lods'] = lods
+                    counts['simplified' if lods else 'under budget'] += 1
+                    if lods:
+                        before += total
+                        after += lods[-1]['triangles']
+                        if args.verbose:
+                            print(f"  {cid:<42} {total:>7} -> "
+                                  f"{', '.join(str(level['triangles']) for level in lods)}")
+            save_manifest(manifest, os.path.join(root, 'manifest.json'))
+        failed += counts['failed']
+        line = f"{name}: {', '.join(f'{n} {k}' for k, n in counts.items())}, " \
+               f"{missing} missing, {len(manifest) - len(todo) - missing} already done"
+        if before:
+            line += f"; lowest levels have {after / before:.0%} of the triangles"
+        print(f"{line} ({time.perf_counter() - start:.1f}s)")
+    return 1 if failed else 0
+
+
+# ── variants ──
+
+def _geometry_key(path):
+    """Process pool worker: (geometry key or None, None) or (None, error)."""
+    from . import glb, variants
+    try:
+        return variants.geometry_key(path), None
+    except (OSError, ValueError, KeyError, IndexError, glb.GLBError) as e:
+        return None, str(e) or type(e).__name__
+
+
+def cmd_variants(args):
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from . import glb, variants
+    from .manifest import save_manifest
+    failed = 0
+    for name, root in _sources(args.source):
+        manifest = _load(root)
+        if manifest is None:
+            print(f"{name}: no manifest, skipped (fetch {name} creates one)")
+            continue
+        start = time.perf_counter()
+        # Catalog ids sharing a blob are the same file (already stored once),
+        # not variants: each distinct blob is keyed once and is one variant
+        blobs = {}
+        for cid, entry in sorted(manifest.items()):
+            if os.path.exists(os.path.join(root, entry['file'])):
+                blobs.setdefault(entry.get('sha256') or entry['file'], []).append(cid)
+        groups = {}
+        with ProcessPoolExecutor(args.workers) as pool:
+            paths = [os.path.join(root, manifest[ids[0]]['file']) for ids in blobs.values()]
+            for ids, (key, error) in zip(blobs.values(), pool.map(_geometry_key, paths, chunksize=8)):
+                if error:
+                    failed += 1
+                    print(f"  {ids[0]}: {error}")
+                elif key:
+                    groups.setdefault(key, []).append(ids)
+
+        families = {}
+        for blob_ids in groups.values():
+            if len(blob_ids) < 2:
+                continue
+            family, names = variants.name_family([ids[0] for ids in blob_ids])
+            base, n = family, 2
+            while family in families:
+                family, n = f'{base}_{n}', n + 1
+            # Copies of a blob map to its variant
+            names = {cid: names[ids[0]] for ids in blob_ids for cid in ids}
+            families[family] = ([cid for ids in blob_ids for cid in ids], names,
+                                [ids[0] for ids in blob_ids])
+
+        written = set()
+        before = after = 0
+        for family, (ids, names, distinct) in sorted(families.items()):
+            members = [(names[cid], manifest[cid]['file']) for cid in distinct]
+            if args.dry_run:
+                print(f"  {family}: {', '.join(variant for variant, _ in members)}")
+                continue
+            try:
+                size = variants.write_family(root, family, members)
+            except (OSError, ValueError, KeyError, IndexError, glb.GLBError) as e:
+                failed += 1
+                print(f"  {family}: {str(e) or type(e).__name__}")
+                continue
+            written.add(variants.family_file(family))
+            for cid in ids:
+                manifest[cid]['family'] = {'id': family, 'variant': names[cid],
+                                           'file': variants.family_file(family), 'size': size}
+            before += sum(os.path.getsize(os.path.join(root, f)) for _, f in members)
+            after += size
+            if args.verbose:
+                print(f"  {family:<42} {len(members)} variants "
+                      f"({', '.join(variant for variant, _ in members)})  {_format_bytes(size)}")
+        if args.dry_run:
+            print(f"{name}: {len(families)} families from "
+                  f"{sum(len(ids) for ids, _, _ in families.values())} models (dry run)")
+            continue
+
+        # Families that no longer form (a colourway was replaced or removed)
+        for entry in manifest.values():
+            if 'family' in entry and entry['family']['file'] not in written:
+                del entry['family']
+        for filename in _derived_files(root):
+            if filename.startswith(f'{variants.FAMILIES_DIRNAME}/') and filename not in written:
+                os.remove(os.path.join(root, filename))
+        save_manifest(manifest, os.path.join(root, 'manifest.json'))
+        line = f"{name}: {len(written)} families from " \
+               f"{sum(len(families[f[len(variants.FAMILIES_DIRNAME) + 1:-4]][0]) for f in written)} models"
+        if before:
+            line += f"; {_format_bytes(before)} -> {_format_bytes(after)} ({after / before:.0%})"
+        print(f"{line} ({time.perf_counter() - start:.1f}s)")
+    return 1 if failed else 0
+
+
+# ── optimize ──
+
+OPTIMIZED_DIR = os.path.join(ROOT, 'public', 'models-opt')
+
+
+def _optimize_one(job):
+    """Process pool worker: the report row for one file."""
+    from . import glb, optimize
+    src, dst, bits, compress = job
+    try:
+        return optimize.optimize_file(src, dst, bits, compress)
+    except (OSError, ValueError, KeyError, IndexError, glb.GLBError) as e:
+        return {'status': 'failed', 'error': str(e) or type(e).__name__}
+
+
+def _format_bytes(n):
+    return f"{n / 2**20:.1f}MB" if n >= 2**20 else f"{n / 1024:.0f}KB"
+
+
+def cmd_optimize(args):
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from .manifest import load_manifest, save_manifest
+    report_path = os.path.join(args.out, 'report.json')
+    report = load_manifest(report_path)
+    failed = 0
+    for name, root in _sources(args.source):
+        out = os.path.join(args.out, name)
+        os.makedirs(out, exist_ok=True)
+        jobs = []
+        files = _glb_files(root) + _derived_files(root)
+        for filename in files:
+            src, dst = os.path.join(root, filename), os.path.join(out, filename)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            # Outputs newer than their source are current (sources are replaced, never edited)
+            if args.force or not os.path.exists(dst) or os.path.getmtime(dst) < os.path.getmtime(src):
+                jobs.append((src, dst, args.position_bits, not args.no_compress))
+        start = time.perf_counter()
+        rows = {}
+        if jobs:
+            with ProcessPoolExecutor(args.workers) as pool:
+                for job, row in zip(jobs, pool.map(_optimize_one, jobs, chunksize=4)):
+                    filename = os.path.relpath(job[0], root)
+                    rows[f"{name}/{filename}"] = row
+                    if row['status'] == 'failed':
+                        print(f"  {filename}: {row['error']}")
+                    elif args.verbose:
+                        note = row.get('reason') or f"{row.get('position_error', 0) * 1000:.3f}mm"
+                        print(f"  {filename:<48} {_format_bytes(row['before']):>8} -> "
+                              f"{_format_bytes(row['after']):>8}  {note}")
+            report.update(rows)
+            save_manifest(report, report_path)
+        done = [r for r in rows.values() if r['status'] != 'failed']
+        failed += len(rows) - len(done)
+        before = sum(r['before'] for r in done)
+        after = sum(r['after'] for r in done)
+        statuses = {}
+        for r in rows.values():
+            statuses[r['status']] = statuses.get(r['status'], 0) + 1
+        current = len(files) - len(jobs)
+        line = f"{name}: {', '.join(f'{n} {s}' for s, n in sorted(statuses.items()))}" if rows else f"{name}:"
+        line += f"{',' if rows else ''} {current} current"
+        if before:
+            line += f"; {_format_bytes(before)} -> {_format_bytes(after)} ({after / before:.0%})"
+        worst = [(k, max((r.get(k, 0) for r in done), default=0)) for k in
+                 ('position_error', 'normal_error_deg', 'uv_error')]
+        if any(v for _, v in worst):
+            line += (f"; worst error {worst[0][1] * 1000:.3f}mm, {worst[1][1]:.2f}deg, "
+                     f"uv {worst[2][1]:.1e}")
+        print(f"{line} ({time.perf_counter() - start:.1f}s)")
+    print(f"Report: {report_path}")
+    return 1 if failed else 0
+
+
+# ── textures ──
+
+LOD_FILE_RE = re.compile(r'lod/(.+)\.lod(\d+)\.glb')
+
+
+def _textures_one(job):
+    """Process pool worker: the report row for one file."""
+    from . import glb, textures
+    path, max_size, webp = job
+    try:
+        return textures.process_file(path, path, max_size, webp)
+    except (OSError, ValueError, KeyError, IndexError, glb.GLBError) as e:
+        return {'status': 'failed', 'error': str(e) or type(e).__name__}
+
+
+def cmd_textures(args):
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from .manifest import load_manifest, save_manifest
+    from .textures import TEXTURE_MAX, max_size_for
+    if os.path.realpath(args.dir) == os.path.realpath(MODELS_DIR):
+        sys.exit("textures rewrites files in place: run it on optimize's output, not public/models")
+    report_path = os.path.join(args.dir, 'report.json')
+    report = load_manifest(report_path)
+    failed = 0
+    for name, root in _sources(args.source):
+        tree = os.path.join(args.dir, name)
+        if not os.path.isdir(tree):
+            print(f"{name}: nothing in {tree}, skipped (optimize {name} writes it)")
+            continue
+        by_file = {}
+        for cid, entry in (_load(root) or {}).items():
+            by_file[entry['file']] = (cid, entry)
+            if 'family' in entry:
+                by_file.setdefault(entry['family']['file'], (cid, entry))
+        jobs = []
+        for filename in _glb_files(tree) + _derived_files(tree):
+            # Levels of detail and families take their models' category, LODs at half
+            # the size per level
+            match = LOD_FILE_RE.fullmatch(filename)
+            source, level = (f'{match[1]}.glb', int(match[2])) if match else (filename, 0)
+            cid, entry = by_file.get(source, (source[:-len('.glb')], {}))
+            max_size = max(1, args.max_size >> level) if args.max_size else \
+                max_size_for(_category(name, cid, entry, TEXTURE_MAX), level)
+            jobs.append((os.path.join(tree, filename), max_size, args.webp))
+        start = time.perf_counter()
+        counts = {}
+        before = after = resized = recoded = 0
+        if jobs:
+            with ProcessPoolExecutor(args.workers) as pool:
+                for job, row in zip(jobs, pool.map(_textures_one, jobs)):
+                    filename = os.path.relpath(job[0], tree)
+                    counts[row['status']] = counts.get(row['status'], 0) + 1
+                    if row['status'] == 'failed':
+                        print(f"  {filename}: {row['error']}")
+                        continue
+                    # A rerun over processed files keeps the row that says what was saved
+                    rows = report.setdefault(f"{name}/{filename}", {})
+                    if row['status'] != 'unchanged' or 'textures' not in rows:
+                        rows['textures'] = row
+                    before += row['before']
+                    after += row['after']
+                    resized += row['resized']
+                    recoded += row['recoded']
+                    if args.verbose and row['status'] != 'unchanged':
+                        print(f"  {filename:<48} {_format_bytes(row['before']):>8} -> "
+                              f"{_format_bytes(row['after']):>8}  {row['resized']} resized, "
+                              f"{row['recoded']} re-encoded (max {row['max_size']}px)")
+            save_manifest(report, report_path)
+        failed += counts.get('failed', 0)
+        line = f"{name}: {', '.join(f'{n} {s}' for s, n in sorted(counts.items())) or 'no models'}"
+        if before:
+            line += (f"; {resized} images resized, {recoded} re-encoded; "
+                     f"{_format_bytes(before)} -> {_format_bytes(after)} ({after / before:.0%})")
+        print(f"{line} ({time.perf_counter() - start:.1f}s)")
+    print(f"Report: {report_path}")
+    return 1 if failed else 0
+
+
+# ── stats ──
+
+def _format_counts(counts):
+    return ', '.join(f'{n} {state}' for state, n in sorted(counts.items())) or 'empty'
+
+
+def _crawl_counts():
+    """Frontier rows per state, read-only (no database is created), or None."""
+    import sqlite3
+    path = os.path.join(CACHE_DIR, 'crawl.sqlite')
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return dict(conn.execute('SELECT state, COUNT(*) FROM frontier GROUP BY state'))
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+def cmd_stats(args):
+    report = {'sources': {}, 'crawl': _crawl_counts()}
+    for name, root in _sources(args.source):
+        manifest = _load(root) or {}
+        files = _glb_files(root)
+        # Entries without a recorded size/hash fall back to their file on disk
+        sizes, blobs = 0, {}
+        for entry in manifest.values():
+            path = os.path.join(root, entry['file'])
+            size = entry.get('size') or (os.path.getsize(path) if os.path.exists(path) else 0)
+            sizes += size
+            blobs[entry.get('sha256') or path] = size
+        tiers = {}
+        for entry in manifest.values():
+            if entry.get('tier'):
+                tiers[entry['tier']] = tiers.get(entry['tier'], 0) + 1
+        report['sources'][name] = {
+            'entries': len(manifest), 'files': len(files), 'bytes': sizes,
+            'unique_bytes': sum(blobs.values()), 'manifest': bool(manifest), 'tiers': tiers,
+        }
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return 0
+    for name, s in report['sources'].items():
+        saved = s['bytes'] - s['unique_bytes']
+        line = (f"{name:<10} {s['entries']:>5} entries {s['files']:>5} files "
+                f"{s['bytes'] / 2**20:>8.1f}MB")
+        if saved:
+            line += f" ({saved / 2**20:.1f}MB shared between variants)"
+        if not s['manifest']:
+            line += ' (no manifest)'
+        print(line)
+        if s['tiers']:
+            print(' ' * 11 + ', '.join(f'{n} {t}' for t, n in sorted(s['tiers'].items())))
+    if report['crawl'] is not None:
+        print(f"crawl      {_format_counts(report['crawl'])}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='courtyard_assets',
+                                     description='Asset pipeline: discovery, downloads and manifests')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    # Defaults that need the heavier modules are resolved in the command
+    p = sub.add_parser('discover', help='queue IKEA products in the crawl frontier')
+    p.add_argument('--category', action='append', metavar='URL',
+                   help='category URL to enumerate (repeatable; default: the built-in list)')
+    p.add_argument('--sitemap', nargs='?', const='https://www.ikea.com/sitemaps/sitemap.xml',
+                   metavar='SOURCE', help="stream products from a sitemap (URL or local .xml/.xml.gz; "
+                                          "default: IKEA's) instead of categories")
+    p.add_argument('--locale', default='us/en', help='sitemap locale as country/lang')
+    p.add_argument('--types', nargs='+', metavar='PATTERN',
+                   help='only sitemap products whose slug matches one of these regexes')
+    p.add_argument('--max-per-category', type=int, default=0,
+                   help='products to take from each category (default: all)')
+    _add_metrics_arguments(p)
+    p.set_defaults(func=cmd_discover)
+
+    p = sub.add_parser('fetch', help="bring a source's models into its blob store and manifest")
+    p.add_argument('source', nargs='?', default='ikea',
+                   help='ikea (pending frontier products, no browser), polyhaven, kenney, '
+                        'or a plugin from COURTYARD_SOURCE_PLUGINS (default: ikea)')
+    p.add_argument('--workers', type=int, default=8)
+    p.add_argument('--limit', type=int, default=0, help='stop after N items (default: all)')
+    p.add_argument('--refresh', action='store_true',
+                   help='check stored items upstream instead of skipping them')
+    p.add_argument('--model-budget', type=float, default=1.5, metavar='MB',
+                   help='ikea: largest quality tier to download per model, in MB')
+    p.add_argument('--retry-failed', action='store_true',
+                   help="ikea: requeue earlier runs' failures first")
+    p.add_argument('--path', help='kenney: pack .zip or directory (default: public/models/kenney)')
+    _add_metrics_arguments(p)
+    p.set_defaults(func=cmd_fetch)
+
+    p = sub.add_parser('verify', help='check manifest entries against the files on disk')
+    p.add_argument('source', nargs='*', help='sources to check (default: all)')
+    p.add_argument('--quick', action='store_true', help='check sizes and GLB headers, skip hashing')
+    p.add_argument('--strict', action='store_true', help='fail on warnings too')
+    p.add_argument('--verbose', '-v', action='store_true', help='list warnings')
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser('manifest', help="print a source's manifest or rebuild it from disk")
+    p.add_argument('source')
+    p.add_argument('--json', action='store_true', help='print the manifest as JSON')
+    p.add_argument('--rebuild', action='store_true',
+                   help='drop missing files, hash unhashed entries and add untracked GLBs')
+    p.set_defaults(func=cmd_manifest)
+
+    p = sub.add_parser('inspect', help='record model bounds, triangles and textures in the manifests')
+    p.add_argument('source', nargs='*', help='sources to inspect (default: all)')
+    p.add_argument('--force', action='store_true', help='re-inspect entries that already have it')
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    p.add_argument('--catalog', action='store_true',
+                   help="report CATALOG entries in furniture.js whose w/h/d disagree with their model")
+    p.set_defaults(func=cmd_inspect)
+
+    p = sub.add_parser('lod', help='write decimated levels of detail and list them in the manifests')
+    p.add_argument('source', nargs='*', help='sources to simplify (default: all)')
+    p.add_argument('--levels', type=int, default=3, choices=range(1, 4), metavar='1-3',
+                   help='levels per model at most (default: 3)')
+    p.add_argument('--max-error', type=float, nargs='+', metavar='FRACTION',
+                   help="largest deviation per level, as a fraction of the model's size "
+                        "(default: 0.01 0.025 0.05)")
+    p.add_argument('--force', action='store_true', help='remake levels for entries that have them')
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    p.add_argument('--verbose', '-v', action='store_true', help='list every simplified model')
+    p.set_defaults(func=cmd_lod)
+
+    p = sub.add_parser('variants', help='merge colourways with shared geometry into one GLB per family')
+    p.add_argument('source', nargs='*', help='sources to merge (default: all)')
+    p.add_argument('--dry-run', '-n', action='store_true',
+                   help='list the families without writing them or the manifests')
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    p.add_argument('--verbose', '-v', action='store_true', help='list every family')
+    p.set_defaults(func=cmd_variants)
+
+    p = sub.add_parser('optimize', help='write quantized, meshopt-compressed copies of the models')
+    p.add_argument('source', nargs='*', help='sources to optimise (default: all)')
+    p.add_argument('--out', default=OPTIMIZED_DIR,
+                   help='output tree, one directory per source (default: public/models-opt)')
+    p.add_argument('--position-bits', type=int, default=14, choices=range(8, 17), metavar='8-16',
+                   help='position grid resolution per mesh (default: 14)')
+    p.add_argument('--no-compress', action='store_true',
+                   help='quantize only, without EXT_meshopt_compression')
+    p.add_argument('--force', action='store_true', help='rewrite outputs that are already current')
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    p.add_argument('--verbose', '-v', action='store_true', help='list every file')
+    p.set_defaults(func=cmd_optimize)
+
+    p = sub.add_parser('textures', help='downscale and recompress the images embedded in optimised models')
+    p.add_argument('source', nargs='*', help='sources to process (default: all)')
+    p.add_argument('--dir', default=OPTIMIZED_DIR,
+                   help='tree to rewrite in place, one directory per source (default: public/models-opt)')
+    p.add_argument('--max-size', type=int, default=0, metavar='PX',
+                   help='longest image side for every category (default: per category, see textures.py)')
+    p.add_argument('--webp', action='store_true',
+                   help='encode as WebP (EXT_texture_webp) instead of JPEG and PNG')
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    p.add_argument('--verbose', '-v', action='store_true', help='list every file that changed')
+    p.set_defaults(func=cmd_textures)
+
+    p = sub.add_parser('stats', help='per-source totals and crawl frontier state')
+    p.add_argument('source', nargs='*', help='sources to include (default: all)')
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_stats)
+    return parser
+
+
+def _add_metrics_arguments(parser):
+    # Same flags as metrics.add_arguments(), without importing metrics up front
+    parser.add_argument('--metrics', metavar='DIR',
+                        help='write timing spans (JSONL) and counters (Prometheus textfile) to DIR')
+    parser.add_argument('--profile', action='store_true',
+                        help='cProfile each stage; stats go to the metrics directory')
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args) or 0
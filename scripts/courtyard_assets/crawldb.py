@@ -0,0 +1,279 @@
+"""
+Persistent crawl frontier and results database shared by the IKEA scripts.
+
+One SQLite file in WAL mode (readers never block the writer, several
+processes can share it) holding every product URL we know about and where it
+is in the crawl:
+
+    pending -> in_flight -> done | failed | no3d
+
+- claim() hands out pending rows atomically, so concurrent workers (threads
+  or processes) never get the same product.
+- finish() buffers results and commits them in batches instead of one
+  transaction per row.
+- recover() puts rows left in_flight by a crashed run back to pending, so
+  any script can resume mid-crawl.
+- Lookups by product URL, article number and GLB URL are indexed.
+- Products without a 3D model go into a negative cache keyed by article
+  number. known_no3d() answers from it for NO3D_TTL, except for a random
+  RECHECK_RATE fraction that is let through so removals upstream are noticed.
+"""
+
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+
+from . import CACHE_DIR
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, 'crawl.sqlite')
+
+PENDING, IN_FLIGHT, DONE, FAILED, NO3D = 'pending', 'in_flight', 'done', 'failed', 'no3d'
+
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 5.0  # seconds
+
+NO3D_TTL = 14 * 24 * 3600  # seconds a "no 3D model" result is trusted
+RECHECK_RATE = 0.02        # fraction of fresh negatives rechecked anyway
+
+# .../p/kallax-shelf-unit-white-80275887/, ...-s69481595/, ...-002-110-88/
+ARTICLE_RE = re.compile(r'-(s?\d{8}|\d{3}-\d{3}-\d{2})/?(?:[?#].*)?$', re.I)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS frontier (
+    url         TEXT PRIMARY KEY,
+    article     TEXT,
+    source      TEXT,
+    catalog_id  TEXT,
+    state       TEXT NOT NULL DEFAULT 'pending',
+    glb_url     TEXT,
+    name        TEXT,
+    color       TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    owner       INTEGER,
+    claimed_at  REAL,
+    updated_at  REAL
+);
+CREATE INDEX IF NOT EXISTS frontier_article ON frontier(article);
+CREATE INDEX IF NOT EXISTS frontier_glb_url ON frontier(glb_url);
+CREATE INDEX IF NOT EXISTS frontier_state ON frontier(state);
+CREATE TABLE IF NOT EXISTS no3d (
+    key         TEXT PRIMARY KEY,
+    url         TEXT,
+    checked_at  REAL NOT NULL,
+    checks      INTEGER NOT NULL DEFAULT 1
+);
+'''
+
+
+def article_number(url):
+    """IKEA article number from a product URL (e.g. '80275887', 's69481595')."""
+    m = ARTICLE_RE.search(url)
+    return m.group(1).replace('-', '').lower() if m else None
+
+
+def negative_key(url):
+    """Negative-cache key: the article number (shared across locales), else the URL."""
+    return article_number(url) or url
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class CrawlDB:
+    def __init__(self, path=DEFAULT_PATH, batch_size=BATCH_SIZE,
+                 no3d_ttl=NO3D_TTL, recheck_rate=RECHECK_RATE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.no3d_ttl = no3d_ttl
+        self.recheck_rate = recheck_rate
+        self.pid = os.getpid()
+        self._lock = threading.RLock()
+        self._pending = []
+        self._last_flush = time.time()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    # ── Frontier ──
+
+    def add(self, urls, source=None, catalog_ids=None):
+        """Queue product URLs as pending (known URLs are left untouched). Returns rows added."""
+        now = time.time()
+        rows = [(u, article_number(u), source, (catalog_ids or {}).get(u), now) for u in urls]
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO frontier (url, article, source, catalog_id, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)', rows)
+            added = self.conn.total_changes - before
+            self.conn.execute('COMMIT')
+        return added
+
+    def claim(self, n=1):
+        """Atomically move up to n pending rows to in_flight. Returns their URLs."""
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                urls = [r[0] for r in self.conn.execute(
+                    'SELECT url FROM frontier WHERE state=? ORDER BY updated_at LIMIT ?',
+                    (PENDING, n))]
+                now = time.time()
+                self.conn.executemany(
+                    'UPDATE frontier SET state=?, owner=?, claimed_at=?, attempts=attempts+1 '
+                    'WHERE url=?', [(IN_FLIGHT, self.pid, now, u) for u in urls])
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return urls
+
+    def finish(self, url, state, glb_url=None, error=None, **fields):
+        """Record a result. Buffered; committed in batches (see flush())."""
+        with self._lock:
+            self._pending.append((url, state, glb_url, error, fields))
+            if len(self._pending) >= self.batch_size or \
+                    time.time() - self._last_flush > FLUSH_INTERVAL:
+                self.flush()
+
+    def flush(self):
+        """Commit buffered results in one transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            now = time.time()
+            self.conn.execute('BEGIN IMMEDIATE')
+            for url, state, glb_url, error, fields in self._pending:
+                cols = ', '.join(f'{k}=?' for k in fields)
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO frontier (url, article, updated_at) VALUES (?, ?, ?)',
+                    (url, article_number(url), now))
+                self.conn.execute(
+                    'UPDATE frontier SET state=?, glb_url=COALESCE(?, glb_url), error=?, '
+                    f'owner=NULL, updated_at=?{", " + cols if cols else ""} WHERE url=?',
+                    (state, glb_url, error, now, *fields.values(), url))
+                if state == NO3D:
+                    self.conn.execute(
+                        'INSERT INTO no3d (key, url, checked_at) VALUES (?, ?, ?) '
+                        'ON CONFLICT(key) DO UPDATE SET checked_at=excluded.checked_at, '
+                        'url=excluded.url, checks=checks+1',
+                        (negative_key(url), url, now))
+                elif state == DONE:
+                    self.conn.execute('DELETE FROM no3d WHERE key=?', (negative_key(url),))
+            self.conn.execute('COMMIT')
+            self._pending = []
+            self._last_flush = now
+
+    def recover(self, stale_after=30 * 60):
+        """
+        Requeue in_flight rows whose owning process is gone (or that have been
+        in flight longer than stale_after seconds). Returns rows requeued.
+        """
+        cutoff = time.time() - stale_after
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT url, owner, claimed_at FROM frontier WHERE state=?', (IN_FLIGHT,)).fetchall()
+            stale = [url for url, owner, claimed_at in rows
+                     if owner != self.pid and (owner is None or not _pid_alive(owner)
+                                               or (claimed_at or 0) < cutoff)]
+            if stale:
+                self.conn.execute('BEGIN IMMEDIATE')
+                self.conn.executemany('UPDATE frontier SET state=?, owner=NULL WHERE url=?',
+                                      [(PENDING, u) for u in stale])
+                self.conn.execute('COMMIT')
+        return len(stale)
+
+    def requeue(self, state=FAILED):
+        """Move every row in `state` back to pending (e.g. retry last run's failures)."""
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            n = self.conn.execute('UPDATE frontier SET state=?, owner=NULL WHERE state=?',
+                                  (PENDING, state)).rowcount
+            self.conn.execute('COMMIT')
+        return n
+
+    def revisit(self, urls):
+        """Put no3d rows back to pending, e.g. once their negative-cache entry has expired."""
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany('UPDATE frontier SET state=? WHERE url=? AND state=?',
+                                  [(PENDING, u, NO3D) for u in urls])
+            self.conn.execute('COMMIT')
+
+    # ── Lookups ──
+
+    def get(self, url):
+        """Row for a product URL as a dict, or None."""
+        with self._lock:
+            cur = self.conn.execute('SELECT * FROM frontier WHERE url=?', (url,))
+            row = cur.fetchone()
+            return dict(zip([d[0] for d in cur.description], row)) if row else None
+
+    def state(self, url):
+        with self._lock:
+            # Results still waiting for the next batch commit win
+            for pending_url, state, *_ in reversed(self._pending):
+                if pending_url == url:
+                    return state
+            row = self.conn.execute('SELECT state FROM frontier WHERE url=?', (url,)).fetchone()
+        return row[0] if row else None
+
+    def known_no3d(self, url):
+        """
+        True if the product (by article number) was recently found to have no
+        3D model, so its page needn't be loaded. Expired entries, and a random
+        recheck_rate share of fresh ones, return False.
+        """
+        with self._lock:
+            for pending_url, state, *_ in reversed(self._pending):
+                if pending_url == url:
+                    return state == NO3D
+            row = self.conn.execute('SELECT checked_at FROM no3d WHERE key=?',
+                                    (negative_key(url),)).fetchone()
+        if row is None or time.time() - row[0] > self.no3d_ttl:
+            return False
+        return random.random() >= self.recheck_rate
+
+    def is_processed(self, url):
+        """True if the product is done, or known (within the TTL) to have no 3D model."""
+        return self.state(url) == DONE or self.known_no3d(url)
+
+    def by_article(self, article):
+        with self._lock:
+            return [r[0] for r in self.conn.execute(
+                'SELECT url FROM frontier WHERE article=?', (article.lower(),))]
+
+    def by_glb_url(self, glb_url):
+        with self._lock:
+            return [r[0] for r in self.conn.execute(
+                'SELECT url FROM frontier WHERE glb_url=?', (glb_url,))]
+
+    def counts(self):
+        """{state: rows} across the whole frontier."""
+        with self._lock:
+            return dict(self.conn.execute('SELECT state, COUNT(*) FROM frontier GROUP BY state'))
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
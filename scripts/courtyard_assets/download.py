@@ -0,0 +1,235 @@
+"""
+Download engine shared by the asset scripts.
+
+- Streams into `<dest>.part` and renames atomically on completion, so a
+  half-written file never looks like a finished model.
+- Resumes an existing .part with an HTTP Range request (falls back to a full
+  download if the server ignores the range). The response's validator (a
+  strong ETag, else Last-Modified) is kept next to it in `<dest>.part.validator`
+  and sent as If-Range, so a file that changed on the server is downloaded
+  again in full instead of being appended to the old bytes; a .part without
+  a validator, or a 206 whose validator differs, is discarded.
+- Verifies the byte count against Content-Length / Content-Range and
+  computes the SHA-256 for the blob store in the same pass as the write.
+- With `known` (a set of sha256s the caller already holds, e.g. a BlobStore)
+  the request is made conditional on the validators in httpcache; a 304
+  returns a not_modified Result without transferring the payload.
+- Downloader runs fetches on a thread pool over the pooled session from
+  net.py, so throughput is bounded by bandwidth rather than per-file latency.
+"""
+
+import hashlib
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from urllib.parse import urlsplit
+
+from . import metrics, net
+from .httpcache import get_cache
+
+CHUNK_SIZE = 256 * 1024
+DEFAULT_WORKERS = 8
+
+Result = namedtuple('Result', 'key url path ok size resumed error sha256 not_modified',
+                    defaults=(False,))
+
+CONTENT_RANGE_RE = re.compile(r'bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)')
+
+
+class DownloadError(Exception):
+    pass
+
+
+def _validator(resp):
+    """If-Range value for a response: its strong ETag, else its Last-Modified (or None)."""
+    etag = resp.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return resp.headers.get('Last-Modified')
+
+
+def _read_validator(part):
+    try:
+        with open(part + '.validator') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _discard(part):
+    """Remove a .part file and its validator."""
+    for path in (part, part + '.validator'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _expected_total(resp, offset):
+    """Total size of the file on the server, or None if it wasn't announced."""
+    if resp.status_code == 206:
+        m = CONTENT_RANGE_RE.match(resp.headers.get('Content-Range', ''))
+        if m and m.group(3) != '*':
+            return int(m.group(3))
+        return None
+    length = resp.headers.get('Content-Length')
+    # Content-Length is meaningless for transparently decompressed bodies
+    if length is None or resp.headers.get('Content-Encoding', 'identity') != 'identity':
+        return None
+    return int(length)
+
+
+def _hash_prefix(path):
+    """Hash the bytes already on disk in a .part file being resumed."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h
+
+
+def fetch(url, dest, session=None, min_size=0, timeout=60, progress=False, key=None, known=None):
+    """
+    Download url to dest, resuming from dest + '.part' if present.
+    Returns a Result; never raises for network or verification errors.
+    """
+    host = urlsplit(url).hostname
+    with metrics.span('download', host=host) as s:
+        r = _fetch(url, dest, session, min_size, timeout, progress, key, known)
+        s.update(bytes=r.size, ok=r.ok, resumed=r.resumed, not_modified=r.not_modified)
+    result = 'not_modified' if r.not_modified else 'ok' if r.ok else 'failed'
+    metrics.count('downloads', host=host, result=result)
+    if r.ok and not r.not_modified:
+        metrics.count('download_bytes', r.size, host=host)
+    return r
+
+
+def _fetch(url, dest, session, min_size, timeout, progress, key, known):
+    session = session or net.get_session()
+    cache = get_cache()
+    part = dest + '.part'
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    validator = _read_validator(part) if offset else None
+    if offset and not validator:
+        # Nothing to tell whether the server's file is still the one we started
+        _discard(part)
+        offset = 0
+    headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if offset else {}
+    bar = None
+
+    # Revalidate instead of downloading if we still hold the cached payload
+    cached = cache.lookup(url) if known is not None and not offset else None
+    if cached and cached['sha256'] in known:
+        headers.update(cache.conditional_headers(cached))
+    else:
+        cached = None
+
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        with session.get(url, stream=True, timeout=timeout, headers=headers) as resp:
+            if resp.status_code == 304 and cached:
+                cache.touch(url)
+                return Result(key, url, None, True, cached['size'], False, None,
+                              cached['sha256'], True)
+            if resp.status_code == 416 and offset:
+                # Range past the end: the .part may already be complete
+                m = CONTENT_RANGE_RE.match(resp.headers.get('Content-Range', ''))
+                if m and m.group(3) != '*' and int(m.group(3)) == offset:
+                    sha = _hash_prefix(part).hexdigest()
+                    os.replace(part, dest)
+                    _discard(part)
+                    return Result(key, url, dest, True, offset, True, None, sha)
+                _discard(part)
+                return _fetch(url, dest, session, min_size, timeout, progress, key, known)
+            resp.raise_for_status()
+
+            resumed = resp.status_code == 206
+            if resumed and _validator(resp) not in (None, validator):
+                # Server ignored If-Range and the file has changed since
+                _discard(part)
+                return _fetch(url, dest, session, min_size, timeout, progress, key, known)
+            if not resumed:
+                offset = 0
+                _discard(part)
+                if _validator(resp):
+                    with open(part + '.validator', 'w') as f:
+                        f.write(_validator(resp))
+            total = _expected_total(resp, offset)
+
+            if progress:
+                from tqdm import tqdm
+                bar = tqdm(total=total, initial=offset, unit='B', unit_scale=True,
+                           desc=os.path.basename(dest))
+
+            h = _hash_prefix(part) if resumed else hashlib.sha256()
+            written = offset
+            with open(part, 'ab' if resumed else 'wb') as f:
+                for chunk in resp.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    h.update(chunk)
+                    written += len(chunk)
+                    if bar:
+                        bar.update(len(chunk))
+
+        if total is not None and written != total:
+            # Keep the .part so the next run resumes from here
+            raise DownloadError(f"short read: {written} of {total} bytes")
+        if written < min_size:
+            _discard(part)
+            raise DownloadError(f"too small ({written}B)")
+
+        os.replace(part, dest)
+        _discard(part)
+        sha = h.hexdigest()
+        cache.store(url, resp, sha256=sha, size=written)
+        return Result(key, url, dest, True, written, resumed, None, sha)
+    except Exception as e:
+        return Result(key, url, dest, False, 0, False, str(e), None)
+    finally:
+        if bar:
+            bar.close()
+
+
+class Downloader:
+    """
+    Thread-pool download queue. Submit while discovery is still running,
+    then iterate results() for completed downloads:
+
+        with Downloader() as dl:
+            dl.submit(url, path, key=catalog_id)
+            for r in dl.results():
+                ...
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, session=None, min_size=0, known=None):
+        self.session = session or net.get_session()
+        self.min_size = min_size
+        self.known = known
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+
+    def submit(self, url, dest, key=None):
+        future = self.executor.submit(fetch, url, dest, self.session, self.min_size,
+                                      key=key, known=self.known)
+        self.futures.append(future)
+        return future
+
+    def results(self):
+        """Yield a Result for every submitted download, as each completes."""
+        futures, self.futures = self.futures, []
+        for future in as_completed(futures):
+            yield future.result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown(wait=True)
+
+
+def download_many(items, workers=DEFAULT_WORKERS, session=None, min_size=0):
+    """Download (url, dest) pairs concurrently, yielding Results as they finish."""
+    with Downloader(workers, session, min_size) as dl:
+        for url, dest in items:
+            dl.submit(url, dest)
+        yield from dl.results()
@@ -0,0 +1,132 @@
+"""
+GLB URL extraction from product-page HTML.
+
+A single pass over the page jumps between ".glb" anchors (a literal search,
+no per-character alternation) and applies the precompiled URL grammar only
+around them; the <script id="pip-xr-viewer-model"> JSON blob is located by
+one substring search. JSON escaping (\\/ and \\u002F, once or twice) and
+HTML escaping (&amp;) are undone per match, instead of rewriting the whole
+page first. scripts/bench-extract.py measures it on saved product pages.
+
+URLs follow a strict grammar: scheme, host, path segments, a final segment
+ending in ".glb", an optional query, and then a delimiter (quote, whitespace,
+angle bracket, backslash or end of input). A match can't stop part-way
+through a URL, so truncated results like ".gl" or "model.glb.png" never come
+out. Dedupe is set-based.
+
+Results are ranked XR viewer URL first, then dimma asset URLs, then any other
+GLB URL. Other GLB URLs are only used when the first two are absent. Quality
+tiers are ranked through a single table lookup.
+"""
+
+import html
+import json
+import re
+
+# Preferred dimma quality tiers, best first
+QUALITY_ORDER = ('iqp3', 'rqp3', 'iqp2', 'rqp2', 'iqp1')
+QUALITY_RANK = {q: i for i, q in enumerate(QUALITY_ORDER)}
+QUALITY_RE = re.compile('|'.join(QUALITY_ORDER))
+
+_SEP = r'(?:\\{0,2}/|\\{1,2}u002[fF])'  # '/', JSON-escaped once or twice
+_LABEL = r'[A-Za-z0-9](?:[A-Za-z0-9-]*[A-Za-z0-9])?'
+_SEGMENT = r"[A-Za-z0-9._~%!$'()*+,;=:@-]*"
+_QUERY = r'(?:[^\s"\'<>\\]|\\{1,2}/|\\{1,2}u0026)*'
+GLB_URL = (rf'https?:{_SEP}{_SEP}{_LABEL}(?:\.{_LABEL})+(?::\d+)?'
+           rf'(?:{_SEP}{_SEGMENT})*?\.glb(?:\?{_QUERY})?(?![^\s"\'<>\\)\]}},;])')
+GLB_URL_RE = re.compile(GLB_URL, re.I)
+
+XR_ID = 'pip-xr-viewer-model'
+XR_RE = re.compile(
+    r'<script\b[^>]*\bid\s*=\s*["\']pip-xr-viewer-model["\'][^>]*>(.*?)</script>',
+    re.I | re.S,
+)
+# Every GLB URL contains ".glb"; the scan jumps between these anchors and
+# only runs the URL grammar around them
+ANCHOR_RE = re.compile(r'\.glb', re.I)
+MAX_URL = 2048  # chars searched back from an anchor for the URL's scheme
+
+DIMMA_PREFIX = 'https://web-api.ikea.com/dimma/assets/'
+
+ESCAPE_RE = re.compile(r'\\+(/|u002[fF]|u0026)')
+_UNESCAPED = {'/': '/', 'u002f': '/', 'u0026': '&'}
+
+
+def normalize(url):
+    """Undo the JSON/HTML escaping a URL carries when embedded in a page."""
+    if '\\' in url:
+        url = ESCAPE_RE.sub(lambda m: _UNESCAPED[m.group(1).lower()], url)
+    if '&' in url:
+        url = html.unescape(url)
+    return url
+
+
+def is_glb_url(url):
+    """True if url, in full, is a well-formed GLB URL."""
+    return bool(url) and GLB_URL_RE.fullmatch(url) is not None
+
+
+def _xr_url(src):
+    """URL from the XR viewer JSON blob, or None."""
+    i = src.find(XR_ID)
+    if i == -1:
+        return None
+    m = XR_RE.search(src, max(0, i - 1024))
+    if not m or m.start() > i:
+        return None
+    try:
+        url = json.loads(html.unescape(m.group(1))).get('url')
+    except (ValueError, AttributeError):
+        return None
+    return url if is_glb_url(url) else None
+
+
+def glb_urls(src):
+    """
+    All GLB URLs in a page, deduplicated and ranked: XR viewer URL, then
+    dimma asset URLs in page order, then (only if neither was found) any
+    other GLB URL.
+    """
+    xr = _xr_url(src)
+    seen = {xr} if xr else set()
+    dimma, other = [], []
+    end = 0
+    for anchor in ANCHOR_RE.finditer(src):
+        if anchor.start() < end:
+            continue  # inside the URL just matched
+        start = src.rfind('http', max(0, anchor.start() - MAX_URL), anchor.start())
+        if start == -1:
+            continue
+        m = GLB_URL_RE.match(src, start)
+        if not m or m.end() < anchor.end():
+            continue  # no complete GLB URL ends at this anchor
+        end = m.end()
+        url = normalize(m.group())
+        if url not in seen:
+            seen.add(url)
+            (dimma if url.startswith(DIMMA_PREFIX) else other).append(url)
+    ranked = ([xr] if xr else []) + dimma
+    return ranked or other
+
+
+def quality_rank(url):
+    """Position of the URL's quality tier in QUALITY_ORDER (unknown tiers rank last)."""
+    m = QUALITY_RE.search(url)
+    return QUALITY_RANK[m.group(0)] if m else len(QUALITY_ORDER)
+
+
+def pick_best(urls):
+    """The highest-quality URL; ties keep the input (ranking) order."""
+    return min(urls, key=quality_rank, default=None)
+
+
+def best_glb_url(src):
+    """Best GLB URL in a page, or None."""
+    return pick_best(glb_urls(src))
+
+
+def clean(urls):
+    """Dedupe URLs collected elsewhere (e.g. network events), keeping only well-formed GLB URLs."""
+    seen = set()
+    return [u for u in map(normalize, urls)
+            if is_glb_url(u) and not (u in seen or seen.add(u))]
@@ -0,0 +1,287 @@
+"""
+GLB container reading without loading the geometry.
+
+A GLB is a 12-byte header ('glTF', version, length) followed by a JSON
+chunk and an optional BIN chunk. inspect() memory-maps the file, parses the
+header and the JSON chunk only, and derives everything the catalog needs
+from the glTF JSON:
+
+- bounds: each POSITION accessor's min/max box (required by the spec, so
+  present even for Draco/meshopt-compressed meshes), pushed through the
+  node hierarchy of the default scene; glTF units are metres, Y up, so
+  dims are [width (x), height (y), depth (z)]
+- triangles and vertices per mesh instance, from accessor counts
+- materials, meshes, and each embedded image's pixel size, read from the
+  first bytes of its bufferView (PNG/JPEG/WebP headers), so only a few
+  pages of the binary chunk are ever touched
+
+Quantized positions (KHR_mesh_quantization, normalized integer accessors)
+are dequantized the same way a loader would.
+
+read() and write() are for the stages that rewrite models (optimize.py):
+the whole file in memory, and a new GLB written atomically from a glTF dict
+and a BIN chunk assembled with BinBuilder.
+"""
+
+import json
+import mmap
+import os
+import struct
+
+GLB_MAGIC = b'glTF'
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+MODE_TRIANGLES, MODE_STRIP, MODE_FAN = 4, 5, 6
+# Normalized integer component types -> divisor (KHR_mesh_quantization)
+NORMALIZED = {5120: 127.0, 5121: 255.0, 5122: 32767.0, 5123: 65535.0}
+IMAGE_HEADER_BYTES = 64 * 1024  # enough to reach a JPEG's SOF marker past EXIF
+
+IDENTITY = (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+
+
+class GLBError(Exception):
+    pass
+
+
+def read_json(buf):
+    """(glTF JSON, BIN chunk offset, BIN chunk length) from a GLB buffer or mmap."""
+    if len(buf) < 20 or buf[:4] != GLB_MAGIC:
+        raise GLBError('not a GLB')
+    version, = struct.unpack_from('<I', buf, 4)
+    if version != 2:
+        raise GLBError(f'GLB version {version}')
+    json_len, json_type = struct.unpack_from('<II', buf, 12)
+    if json_type != CHUNK_JSON:
+        raise GLBError('first chunk is not JSON')
+    gltf = json.loads(bytes(buf[20:20 + json_len]))
+    offset = 20 + json_len
+    if offset + 8 <= len(buf):
+        bin_len, bin_type = struct.unpack_from('<II', buf, offset)
+        if bin_type == CHUNK_BIN:
+            return gltf, offset + 8, bin_len
+    return gltf, None, 0
+
+
+def read(path):
+    """(glTF JSON, BIN chunk bytes) of a GLB file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    gltf, offset, length = read_json(data)
+    return gltf, data[offset:offset + length] if offset is not None else b''
+
+
+def _padded(data, fill):
+    return data + fill * (-len(data) % 4)
+
+
+def write(path, gltf, bin_chunk=b''):
+    """Write a GLB (chunks padded to 4 bytes) via a temp file and rename."""
+    text = _padded(json.dumps(gltf, separators=(',', ':')).encode(), b' ')
+    chunks = [struct.pack('<II', len(text), CHUNK_JSON), text]
+    if bin_chunk:
+        data = _padded(bytes(bin_chunk), b'\0')
+        chunks += [struct.pack('<II', len(data), CHUNK_BIN), data]
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(GLB_MAGIC + struct.pack('<II', 2, 12 + sum(len(c) for c in chunks)))
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp, path)
+
+
+class BinBuilder:
+    """Assembles a BIN chunk; append() returns each piece's aligned offset."""
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+
+    def append(self, data, align=4):
+        pad = -self.length % align
+        if pad:
+            self.parts.append(b'\0' * pad)
+            self.length += pad
+        offset = self.length
+        self.parts.append(data)
+        self.length += len(data)
+        return offset
+
+    def getvalue(self):
+        return b''.join(self.parts)
+
+
+# ── Transforms (column-major 4x4 tuples, as in glTF) ──
+
+def _multiply(a, b):
+    return tuple(sum(a[k * 4 + r] * b[c * 4 + k] for k in range(4)) for c in range(4) for r in range(4))
+
+
+def node_matrix(node):
+    """Local transform of a node: its matrix, or translation * rotation * scale."""
+    if 'matrix' in node:
+        return tuple(float(v) for v in node['matrix'])
+    tx, ty, tz = node.get('translation', (0, 0, 0))
+    x, y, z, w = node.get('rotation', (0, 0, 0, 1))
+    sx, sy, sz = node.get('scale', (1, 1, 1))
+    return (
+        (1 - 2 * (y * y + z * z)) * sx, (2 * (x * y + z * w)) * sx, (2 * (x * z - y * w)) * sx, 0.0,
+        (2 * (x * y - z * w)) * sy, (1 - 2 * (x * x + z * z)) * sy, (2 * (y * z + x * w)) * sy, 0.0,
+        (2 * (x * z + y * w)) * sz, (2 * (y * z - x * w)) * sz, (1 - 2 * (x * x + y * y)) * sz, 0.0,
+        float(tx), float(ty), float(tz), 1.0,
+    )
+
+
+def _transform(m, p):
+    x, y, z = p
+    return (m[0] * x + m[4] * y + m[8] * z + m[12],
+            m[1] * x + m[5] * y + m[9] * z + m[13],
+            m[2] * x + m[6] * y + m[10] * z + m[14])
+
+
+def mesh_instances(gltf):
+    """(mesh index, world matrix) for every mesh node in the default scene."""
+    nodes = gltf.get('nodes', [])
+    scenes = gltf.get('scenes')
+    if scenes:
+        roots = scenes[gltf.get('scene', 0)].get('nodes', [])
+    else:
+        children = {c for n in nodes for c in n.get('children', [])}
+        roots = [i for i in range(len(nodes)) if i not in children]
+    stack = [(i, IDENTITY) for i in roots]
+    while stack:
+        index, parent = stack.pop()
+        node = nodes[index]
+        world = _multiply(parent, node_matrix(node))
+        if 'mesh' in node:
+            yield node['mesh'], world
+        stack.extend((c, world) for c in node.get('children', []))
+
+
+def position_box(accessor):
+    """Local (min, max) of a POSITION accessor, dequantized if normalized."""
+    lo, hi = accessor.get('min'), accessor.get('max')
+    if not lo or not hi:
+        return None
+    if accessor.get('normalized'):
+        d = NORMALIZED.get(accessor.get('componentType'), 1.0)
+        lo, hi = [max(v / d, -1.0) for v in lo], [max(v / d, -1.0) for v in hi]
+    return lo[:3], hi[:3]
+
+
+def primitive_triangles(gltf, prim):
+    accessors = gltf.get('accessors', [])
+    index = prim.get('indices', prim.get('attributes', {}).get('POSITION'))
+    if index is None:
+        return 0
+    count = accessors[index].get('count', 0)
+    mode = prim.get('mode', MODE_TRIANGLES)
+    if mode == MODE_TRIANGLES:
+        return count // 3
+    if mode in (MODE_STRIP, MODE_FAN):
+        return max(count - 2, 0)
+    return 0
+
+
+def image_size(head):
+    """(width, height) from the first bytes of a PNG, JPEG or WebP image, or None."""
+    if head[:8] == b'\x89PNG\r\n\x1a\n' and len(head) >= 24:
+        return struct.unpack_from('>II', head, 16)
+    if head[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 <= len(head):
+            if head[i] != 0xFF:
+                i += 1
+                continue
+            marker = head[i + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                i += 2
+                continue
+            length, = struct.unpack_from('>H', head, i + 2)
+            # SOF0..SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                h, w = struct.unpack_from('>HH', head, i + 5)
+                return w, h
+            i += 2 + length
+        return None
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP' and len(head) >= 30:
+        kind = head[12:16]
+        if kind == b'VP8 ':
+            w, h = struct.unpack_from('<HH', head, 26)
+            return w & 0x3FFF, h & 0x3FFF
+        if kind == b'VP8L':
+            b = int.from_bytes(head[21:25], 'little')
+            return (b & 0x3FFF) + 1, ((b >> 14) & 0x3FFF) + 1
+        if kind == b'VP8X':
+            return (int.from_bytes(head[24:27], 'little') + 1,
+                    int.from_bytes(head[27:30], 'little') + 1)
+    return None
+
+
+def inspect_buffer(buf):
+    """Catalog metadata for a GLB held in a buffer (see inspect())."""
+    gltf, bin_offset, _ = read_json(buf)
+    accessors = gltf.get('accessors', [])
+    meshes = gltf.get('meshes', [])
+
+    lo = [float('inf')] * 3
+    hi = [float('-inf')] * 3
+    triangles = vertices = 0
+    for mesh_index, world in mesh_instances(gltf):
+        for prim in meshes[mesh_index].get('primitives', []):
+            position = prim.get('attributes', {}).get('POSITION')
+            if position is None:
+                continue
+            triangles += primitive_triangles(gltf, prim)
+            vertices += accessors[position].get('count', 0)
+            box = position_box(accessors[position])
+            if box is None:
+                continue
+            (x0, y0, z0), (x1, y1, z1) = box
+            for corner in ((x, y, z) for x in (x0, x1) for y in (y0, y1) for z in (z0, z1)):
+                p = _transform(world, corner)
+                for axis in range(3):
+                    lo[axis] = min(lo[axis], p[axis])
+                    hi[axis] = max(hi[axis], p[axis])
+
+    textures = []
+    texture_bytes = 0
+    views = gltf.get('bufferViews', [])
+    for image in gltf.get('images', []):
+        if 'bufferView' not in image or bin_offset is None:
+            continue
+        view = views[image['bufferView']]
+        start = bin_offset + view.get('byteOffset', 0)
+        texture_bytes += view['byteLength']
+        size = image_size(bytes(buf[start:start + min(view['byteLength'], IMAGE_HEADER_BYTES)]))
+        if size:
+            textures.append(list(size))
+
+    info = {
+        'triangles': triangles, 'vertices': vertices,
+        'meshes': len(meshes), 'materials': len(gltf.get('materials', [])),
+        'textures': sorted(textures, reverse=True), 'texture_bytes': texture_bytes,
+    }
+    if lo[0] <= hi[0]:
+        info['min'] = [round(v, 4) for v in lo]
+        info['max'] = [round(v, 4) for v in hi]
+        info['dims'] = [round(b - a, 4) for a, b in zip(lo, hi)]
+    used = gltf.get('extensionsUsed')
+    if used:
+        info['extensions'] = sorted(used)
+    return info
+
+
+def inspect(path):
+    """
+    Bounds, dims, triangle/vertex counts, mesh/material counts and embedded
+    texture sizes of a GLB, reading only its JSON chunk and image headers.
+    Raises GLBError for files that aren't GLB 2.0.
+    """
+    with open(path, 'rb') as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            raise GLBError('empty file') from None
+    with buf:
+        return inspect_buffer(buf)
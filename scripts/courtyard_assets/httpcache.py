@@ -0,0 +1,110 @@
+"""
+HTTP revalidation cache for the asset scripts.
+
+Validators (ETag / Last-Modified) for every URL we fetch are kept in SQLite,
+so re-runs send If-None-Match / If-Modified-Since and the server answers 304
+for anything that hasn't changed upstream.
+
+- Pages and API JSON: the (zlib-compressed) body is cached alongside the
+  validators and returned on a 304.
+- Large assets (GLBs): only the validators plus the payload's sha256 are
+  kept; the bytes themselves live in the blob store (store.py), so a 304 just
+  means "the blob you already have is current".
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from . import CACHE_DIR, metrics
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, 'http.sqlite')
+
+
+class HTTPCache:
+    def __init__(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS responses
+                             (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,
+                              body BLOB, sha256 TEXT, size INTEGER, checked_at REAL)''')
+        self.conn.commit()
+
+    def lookup(self, url):
+        """Cached row for url as a dict, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT etag, last_modified, body, sha256, size FROM responses WHERE url=?',
+                (url,)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, body, sha256, size = row
+        return {'etag': etag, 'last_modified': last_modified,
+                'body': zlib.decompress(body) if body is not None else None,
+                'sha256': sha256, 'size': size}
+
+    def conditional_headers(self, cached):
+        """If-None-Match / If-Modified-Since headers for a cached row."""
+        headers = {}
+        if cached and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+
+    def store(self, url, resp, body=None, sha256=None, size=None):
+        """Record a 200 response's validators (and body or payload hash)."""
+        etag = resp.headers.get('ETag')
+        last_modified = resp.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return  # nothing to revalidate with next time
+        packed = zlib.compress(body) if body is not None else None
+        with self._lock:
+            self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (url, etag, last_modified, packed, sha256, size, time.time()))
+            self.conn.commit()
+
+    def touch(self, url):
+        """Mark a cached URL as revalidated now (after a 304)."""
+        with self._lock:
+            self.conn.execute('UPDATE responses SET checked_at=? WHERE url=?', (time.time(), url))
+            self.conn.commit()
+
+    def get(self, url, session, timeout=20):
+        """
+        Conditional GET for a page or API document.
+        Returns (body_bytes, not_modified). Raises on HTTP errors.
+        """
+        cached = self.lookup(url)
+        headers = self.conditional_headers(cached) if cached and cached['body'] is not None else {}
+        resp = session.get(url, timeout=timeout, headers=headers)
+        if resp.status_code == 304 and headers:
+            self.touch(url)
+            metrics.count('http_cache', result='hit')
+            return cached['body'], True
+        metrics.count('http_cache', result='revalidated_changed' if headers else 'miss')
+        resp.raise_for_status()
+        self.store(url, resp, body=resp.content)
+        return resp.content, False
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide shared cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = HTTPCache()
+    return _cache
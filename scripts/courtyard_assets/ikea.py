@@ -0,0 +1,279 @@
+"""
+Browser-free GLB discovery for IKEA product pages.
+
+IKEA renders the 3D viewer config server-side: the product HTML carries a
+<script id="pip-xr-viewer-model"> JSON blob and/or web-api.ikea.com/dimma
+asset URLs. Reading those from a plain HTTP response resolves most products
+in one round-trip (see extract.py); callers fall back to Selenium only when
+this returns None.
+
+Category listings are enumerated the same way: iter_category_products() pages
+through the listing service the category page itself calls for "show more"
+(falling back to the server-rendered ?page=N listing HTML), so a whole
+category streams in without scrolling a browser. iter_sitemap_products()
+streams a locale's products from the site's sitemaps instead (sitemap.py).
+
+IkeaSource is the asset-source plugin (sources.py) over the crawl frontier
+that discovery fills: it resolves products from their static HTML only, so
+products that need a browser are left pending for ikea-bulk-scan.py.
+"""
+
+import html
+import json
+import os
+import re
+from urllib.parse import urlencode, urljoin, urlsplit
+
+from . import crawldb, download, extract, metrics, net, sitemap, tiers
+from .sources import UNCHANGED, Item, Source, SourceError, register
+
+# https://www.ikea.com/us/en/cat/sofas-fu003/ -> country, language, category id
+CATEGORY_RE = re.compile(r'ikea\.com/([a-z]{2})/([a-z]{2})/cat/(?:[^/?#]*-)?([a-z]*\d+)/?', re.I)
+PRODUCT_URL_RE = re.compile(r'(?:https://www\.ikea\.com)?/[a-z]{2}/[a-z]{2}/p/[a-z0-9%-]+/', re.I)
+
+# Paginated product listing behind the category pages' "show more" button
+LISTING_API = 'https://sik.search.blue.cdtapps.com/{country}/{lang}/product-list-page/more-products'
+PAGE_SIZE = 24
+
+SITEMAP_INDEX = 'https://www.ikea.com/sitemaps/sitemap.xml'
+DEFAULT_LOCALE = 'us/en'
+CLAIM_BATCH = 32  # frontier rows claimed at a time by IkeaSource
+
+# Category URLs to scan for products
+CATEGORY_URLS = [
+    'https://www.ikea.com/us/en/cat/sofas-fu003/',
+    'https://www.ikea.com/us/en/cat/armchairs-fu006/',
+    'https://www.ikea.com/us/en/cat/coffee-side-tables-10705/',
+    'https://www.ikea.com/us/en/cat/tv-media-furniture-10475/',
+    'https://www.ikea.com/us/en/cat/bookcases-shelving-units-st002/',
+    'https://www.ikea.com/us/en/cat/beds-bm003/',
+    'https://www.ikea.com/us/en/cat/wardrobes-19053/',
+    'https://www.ikea.com/us/en/cat/chests-of-drawers-20656/',
+    'https://www.ikea.com/us/en/cat/desks-computer-desks-20649/',
+    'https://www.ikea.com/us/en/cat/dining-tables-21825/',
+    'https://www.ikea.com/us/en/cat/dining-chairs-25219/',
+    'https://www.ikea.com/us/en/cat/office-chairs-20652/',
+    'https://www.ikea.com/us/en/cat/floor-lamps-10731/',
+    'https://www.ikea.com/us/en/cat/table-lamps-desk-lamps-10732/',
+    'https://www.ikea.com/us/en/cat/rugs-10653/',
+    'https://www.ikea.com/us/en/cat/kitchen-islands-carts-24264/',
+    'https://www.ikea.com/us/en/cat/nightstands-20656/',
+    'https://www.ikea.com/us/en/cat/bathroom-vanities-20724/',
+]
+
+# Product slug keyword -> budget category (longest keyword wins)
+CATEGORY_MAP = {
+    'sofa': 'living', 'armchair': 'living', 'coffee': 'living', 'side-table': 'living',
+    'tv': 'living', 'bookcase': 'living', 'shelf': 'living', 'bed': 'bedroom',
+    'wardrobe': 'bedroom', 'drawer': 'bedroom', 'nightstand': 'bedroom',
+    'desk': 'office', 'dining': 'kitchen', 'chair': 'kitchen', 'office-chair': 'office',
+    'lamp': 'living', 'rug': 'living', 'kitchen': 'kitchen', 'vanit': 'bathroom',
+}
+
+
+def _unescape(src):
+    """Undo the JSON/HTML escaping IKEA applies to URLs embedded in scripts."""
+    return html.unescape(src.replace('\\u002F', '/').replace('\\/', '/'))
+
+
+def product_slug(url):
+    """Product name slug from an IKEA URL, without its article number."""
+    # e.g. https://www.ikea.com/us/en/p/kallax-shelf-unit-white-80275887/
+    parts = url.rstrip('/').split('/')
+    slug = parts[-1] if parts else 'unknown'
+    return re.sub(r'-[a-z]?\d{7,}$', '', slug)
+
+
+def catalog_id(slug):
+    """Filesystem-safe catalog id for a product slug (the manifest key and file stem)."""
+    return slug.replace('-', '_')[:40]
+
+
+def category_of(slug):
+    """Budget category for a product slug, or None."""
+    for keyword in sorted(CATEGORY_MAP, key=len, reverse=True):
+        if keyword in slug:
+            return CATEGORY_MAP[keyword]
+    return None
+
+
+def find_glb_url(product_url, session=None, timeout=20):
+    """
+    Resolve a product page to its GLB URL using plain HTTP.
+    Returns None when the static HTML has no model (or the fetch failed),
+    which is the caller's cue to escalate to the browser path.
+    """
+    try:
+        with metrics.span('page_fetch') as s:
+            src = net.fetch_text(product_url, timeout=timeout, session=session)
+            s['bytes'] = len(src)
+    except Exception:
+        return None
+    with metrics.span('extract') as s:
+        glb_url = extract.best_glb_url(src)
+        s['found'] = glb_url is not None
+    return glb_url
+
+
+def _listing_item_urls(item, variants):
+    urls = [item.get('pipUrl')]
+    if variants:
+        urls.extend(v.get('pipUrl') for v in (item.get('gprDescription') or {}).get('variants') or [])
+    return [u for u in urls if u]
+
+
+def _iter_listing_api(country, lang, category, session, timeout, variants, page_size):
+    """Product URLs from the JSON listing service, one window of page_size at a time."""
+    start = 0
+    while True:
+        query = urlencode({'category': category, 'start': start, 'end': start + page_size, 'c': 'plp'})
+        url = LISTING_API.format(country=country, lang=lang) + '?' + query
+        data = json.loads(net.fetch_text(url, timeout=timeout, session=session))
+        listing = data.get('moreProducts') or {}
+        window = listing.get('productWindow') or []
+        for item in window:
+            yield from _listing_item_urls(item.get('product', item), variants)
+        start += page_size
+        total = listing.get('productCount')
+        if len(window) < page_size or (total and start >= total):
+            return
+
+
+def _iter_listing_pages(category_url, session, timeout):
+    """Product URLs from the server-rendered ?page=N listings (each page extends the last)."""
+    base = category_url.split('#')[0]
+    page = 1
+    seen = set()
+    while True:
+        url = f"{base}{'&' if '?' in base else '?'}page={page}"
+        src = _unescape(net.fetch_text(url, timeout=timeout, session=session))
+        new = []
+        for href in PRODUCT_URL_RE.findall(src):
+            u = urljoin('https://www.ikea.com', href)
+            if u not in seen:
+                seen.add(u)
+                new.append(u)
+        if not new:
+            return
+        yield from new
+        page += 1
+
+
+def iter_category_products(category_url, session=None, variants=True, timeout=20,
+                           page_size=PAGE_SIZE):
+    """
+    Yield every product URL in an IKEA category, without a browser and
+    without duplicates. Colour/size variants listed under a product are
+    included unless variants=False. Yields nothing if neither the listing
+    service nor the listing HTML could be read (the caller's cue to fall
+    back to the browser).
+    """
+    seen = set()
+    m = CATEGORY_RE.search(urlsplit(category_url)._replace(query='').geturl())
+    sources = []
+    if m:
+        country, lang, category = m.groups()
+        sources.append(lambda: _iter_listing_api(country.lower(), lang.lower(), category,
+                                                 session, timeout, variants, page_size))
+    sources.append(lambda: _iter_listing_pages(category_url, session, timeout))
+
+    for source in sources:
+        try:
+            for url in source():
+                if url not in seen:
+                    seen.add(url)
+                    yield url
+        except Exception:
+            continue  # listing service changed or unavailable: try the next source
+        if seen:
+            return
+
+
+def iter_sitemap_products(locale=DEFAULT_LOCALE, types=None, source=SITEMAP_INDEX, session=None):
+    """
+    Stream product URLs for one locale ('us/en', 'de/de', ...) from IKEA's
+    sitemap index: only that locale's product sitemaps (prod-en-US_N.xml)
+    are read, and only /<country>/<lang>/p/ URLs are yielded. types is an
+    optional list of regexes matched against the product slug, e.g.
+    ['sofa', 'chair', 'table'].
+    """
+    country, lang = locale.lower().strip('/').split('/')
+    product_re = re.compile(rf'ikea\.com/{country}/{lang}/p/([^/?#]+)', re.I)
+    type_re = re.compile('|'.join(f'(?:{t})' for t in types), re.I) if types else None
+    child_re = re.compile(rf'prod-{lang}-{country}(?![a-z])', re.I)
+
+    def is_product(url):
+        m = product_re.search(url)
+        return bool(m) and (type_re is None or bool(type_re.search(m.group(1))))
+
+    return sitemap.iter_urls(source, url_filter=is_product,
+                             sitemap_filter=lambda url: bool(child_re.search(url)),
+                             session=session)
+
+
+@register
+class IkeaSource(Source):
+    name = 'ikea'
+
+    def __init__(self, root=None, model_budget=tiers.DEFAULT_MODEL_BUDGET, retry_failed=False):
+        super().__init__(root)
+        self.db = crawldb.CrawlDB()
+        self.db.recover()
+        if retry_failed:
+            self.db.requeue(crawldb.FAILED)
+        self.resolver = tiers.TierResolver(model_budget)
+        self.claimed = set()   # frontier rows this run holds in flight
+        self.deferred = set()  # no model in the static HTML
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(model_budget=int(args.model_budget * tiers.MB), retry_failed=args.retry_failed)
+
+    def enumerate(self):
+        while True:
+            urls = self.db.claim(CLAIM_BATCH)
+            if not urls:
+                return
+            for url in urls:
+                self.claimed.add(url)
+                yield Item(catalog_id(product_slug(url)), url)
+
+    def resolve(self, item, entry=None):
+        glb_url = find_glb_url(item.ref)
+        if not glb_url:
+            return None
+        choice = self.resolver.resolve(glb_url, category_of(product_slug(item.ref)))
+        if entry and entry.get('url') == choice.url:
+            return UNCHANGED
+        return choice.url
+
+    def fetch(self, item, plan, work):
+        r = download.fetch(plan, os.path.join(work, f"{item.id}.glb"), min_size=1000)
+        if not r.ok:
+            raise SourceError(r.error)
+        return r.path, plan
+
+    def normalize(self, item, fetched):
+        path, glb_url = fetched
+        super().normalize(item, path)
+        return path, {'url': glb_url, 'tier': tiers.tier_of(glb_url)}
+
+    def record(self, outcome):
+        url = outcome.item.ref
+        if outcome.status == 'deferred':
+            self.deferred.add(url)
+            return
+        self.claimed.discard(url)
+        entry = outcome.entry or {}
+        if outcome.status == 'failed':
+            self.db.finish(url, crawldb.FAILED, error=outcome.error)
+        else:
+            self.db.finish(url, crawldb.DONE, glb_url=entry.get('url'), catalog_id=outcome.item.id)
+
+    def close(self):
+        # Claimed but not finished: deferred to the browser scan, or cut off by a limit
+        for url in self.claimed:
+            self.db.finish(url, crawldb.PENDING,
+                           error='no model in static HTML' if url in self.deferred else None)
+        self.resolver.close()
+        self.db.close()
@@ -0,0 +1,108 @@
+"""
+Kenney asset packs (e.g. the Furniture Kit) as an asset source.
+
+Imports the GLBs from a downloaded pack, either the .zip as distributed or
+an unpacked directory; any *.glb inside is taken, so the pack's
+"Models/GLTF format/" layout needs no configuration. With no path the
+source re-imports public/models/kenney itself, which brings files that were
+copied in by hand under the blob store and manifest.
+
+Catalog ids are the file stems (bathroomCabinet), which is also what the
+client's CATALOG references as kenney/<id>.glb. The manifest adds a display
+name split from the camel case and a category from the first word. Entries
+are re-imported only when the pack's file size differs from the stored one.
+"""
+
+import os
+import re
+import shutil
+import zipfile
+
+from .sources import Item, Source, SourceError, register
+
+# First camel-case word of the file name -> furniture category
+CATEGORY_MAP = {
+    'bathroom': 'bathroom', 'bathtub': 'bathroom', 'shower': 'bathroom', 'toilet': 'bathroom',
+    'washer': 'bathroom', 'dryer': 'bathroom',
+    'bed': 'bedroom', 'cabinet': 'bedroom', 'coat': 'bedroom', 'pillow': 'bedroom',
+    'kitchen': 'kitchen', 'hood': 'kitchen', 'toaster': 'kitchen', 'trashcan': 'kitchen',
+    'desk': 'office', 'computer': 'office', 'laptop': 'office',
+    'lounge': 'living', 'table': 'living', 'chair': 'living', 'stool': 'living',
+    'bench': 'living', 'side': 'living', 'bookcase': 'living', 'books': 'living',
+    'lamp': 'living', 'rug': 'living', 'plant': 'living', 'potted': 'living',
+    'television': 'living', 'speaker': 'living', 'radio': 'living', 'bear': 'living',
+    'wall': 'structure', 'floor': 'structure', 'stairs': 'structure', 'doorway': 'structure',
+    'paneling': 'structure', 'ceiling': 'structure', 'cardboard': 'misc',
+}
+DEFAULT_CATEGORY = 'misc'
+
+WORD_RE = re.compile(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+')
+
+
+def display_name(stem):
+    """'loungeSofaCorner' -> 'Lounge Sofa Corner'."""
+    return ' '.join(w.capitalize() for w in WORD_RE.findall(stem)) or stem
+
+
+def category_of(stem):
+    words = WORD_RE.findall(stem)
+    return CATEGORY_MAP.get(words[0].lower(), DEFAULT_CATEGORY) if words else DEFAULT_CATEGORY
+
+
+@register
+class KenneySource(Source):
+    name = 'kenney'
+
+    def __init__(self, root=None, path=None):
+        super().__init__(root)
+        self.path = str(path or self.root)
+        if not os.path.exists(self.path):
+            raise SourceError(f"{self.path} not found")
+        self.zip = zipfile.ZipFile(self.path) if zipfile.is_zipfile(self.path) else None
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(path=args.path)
+
+    def _members(self):
+        """(stem, member or path, size) for every GLB in the pack."""
+        if self.zip:
+            for info in self.zip.infolist():
+                if info.filename.lower().endswith('.glb') and not info.is_dir():
+                    yield os.path.basename(info.filename)[:-4], info.filename, info.file_size
+            return
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            # Don't descend into a blob store left in place by the old layout
+            dirnames[:] = sorted(d for d in dirnames if d != 'blobs')
+            for filename in sorted(filenames):
+                if filename.lower().endswith('.glb'):
+                    path = os.path.join(dirpath, filename)
+                    yield filename[:-4], path, os.path.getsize(path)
+
+    def enumerate(self):
+        seen = set()
+        for stem, ref, size in self._members():
+            if stem in seen:
+                continue  # packs ship some models twice (e.g. per format folder)
+            seen.add(stem)
+            yield Item(stem, (ref, size), {'name': display_name(stem), 'category': category_of(stem)})
+
+    def is_current(self, item, entry):
+        return entry.get('size') == item.ref[1]
+
+    def resolve(self, item, entry=None):
+        return item.ref[0]
+
+    def fetch(self, item, plan, work):
+        # Copied, never moved: the pack (or the published file) stays as it is
+        dest = os.path.join(work, f"{item.id}.glb")
+        if self.zip:
+            with self.zip.open(plan) as src, open(dest, 'wb') as out:
+                shutil.copyfileobj(src, out)
+        else:
+            shutil.copyfile(plan, dest)
+        return dest
+
+    def close(self):
+        if self.zip:
+            self.zip.close()
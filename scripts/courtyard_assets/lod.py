@@ -0,0 +1,453 @@
+"""
+Level-of-detail chains: decimated copies of a model for distant views.
+
+    python -m courtyard_assets lod [SOURCE...]   # -> public/models/<source>/lod/
+
+Each model gets up to three levels, <stem>.lod1.glb .. lod3.glb next to the
+source in its lod/ directory, at the triangle budgets LOD_BUDGETS sets for
+its category. Levels a model is already under are not written. The source
+itself is level 0. The manifest entry lists them:
+
+    "lods": [{"file": "lod/<stem>.lod1.glb", "triangles": 7996, "error": 0.0011, "size": ...}, ...]
+
+error is the simplifier's estimate of the largest surface deviation, in metres.
+
+simplify() is a quadric error metric edge-collapse simplifier vectorised
+with NumPy. Instead of collapsing one edge at a time from a priority queue,
+every pass prices all edges at once, gives each vertex its cheapest
+collapse onto a neighbour (a half-edge collapse: the vertex moves onto the
+neighbour, so no new positions are invented), and applies, together, every
+collapse that is the cheapest among the vertices of all its faces. No two
+collapses in a pass touch the same face, so the flip check against the
+current positions is exact. Quadrics are the planes of the faces around a
+vertex, each counted once whatever its area (so thin parts made of small
+faces are not flattened away first), plus heavily weighted planes along
+open borders and material boundaries, so silhouettes and material regions
+hold their outline. Each level has an error cap (max_errors, relative to
+the mesh's size); collapses over it are never made, so a level may stop
+above its budget rather than lose the shape.
+
+Vertices are welded by position for the topology; every vertex keeps its
+own attributes (normals, UVs, ...) when it moves, so seams stay closed
+and nothing is interpolated. Draco-compressed primitives (most IKEA models)
+are decoded with DracoPy (pip install DracoPy), which the lod command
+requires: it stops with one message up front if DracoPy is missing rather
+than fail model by model. The levels are written uncompressed, for the
+optimize command to compress like any other model.
+"""
+
+import json
+
+import numpy as np
+
+from . import glb
+from .optimize import (ARRAY_BUFFER, COMPONENT_TYPES, COMPONENTS, DRACO, DTYPES,
+                       ELEMENT_ARRAY_BUFFER, MODE_TRIANGLES, add_view, pack,
+                       read_accessor, vertex_rows)
+
+LOD_DIRNAME = 'lod'
+# Triangles per level (LOD1, LOD2, LOD3), by manifest category
+LOD_BUDGETS = {
+    'living': (8000, 2500, 800),
+    'bedroom': (8000, 2500, 800),
+    'seating': (6000, 2000, 600),
+    'shelves': (6000, 2000, 600),
+    'kitchen': (6000, 2000, 600),
+    'office': (6000, 2000, 600),
+    'table': (4000, 1200, 400),
+    'bathroom': (4000, 1200, 400),
+    'structure': (2000, 600, 200),
+}
+DEFAULT_BUDGET = (6000, 2000, 600)
+# Largest collapse error per level, as a fraction of the mesh's bounding box diagonal
+DEFAULT_MAX_ERRORS = (0.01, 0.025, 0.05)
+LEVEL_MARGIN = 1.25  # a level is only made for models this far over its budget
+MIN_REDUCTION = 0.75  # ... and only kept if it has at most this share of the previous level
+BORDER_WEIGHT = 10.0
+FLIP_COS = 0.2  # collapses turning a face by more than ~78 degrees are rejected
+MAX_PASSES = 200
+
+
+class LODError(Exception):
+    pass
+
+
+def budget_for(category):
+    return LOD_BUDGETS.get(category, DEFAULT_BUDGET)
+
+
+def lod_file(filename, level):
+    """Manifest-relative path of a level: lod/<stem>.lod<level>.glb."""
+    stem = filename[:-len('.glb')] if filename.endswith('.glb') else filename
+    return f'{LOD_DIRNAME}/{stem}.lod{level}.glb'
+
+
+# ── Simplifier ──
+
+def _plane_quadrics(point, normal, weight):
+    """(n, 11) quadrics of the planes through point with unit normal: A (6), b (3), c, weight."""
+    d = -(normal * point).sum(axis=1)
+    nx, ny, nz = normal.T
+    return weight[:, None] * np.column_stack(
+        [nx * nx, nx * ny, nx * nz, ny * ny, ny * nz, nz * nz, nx * d, ny * d, nz * d, d * d,
+         np.ones_like(d)])
+
+
+def _evaluate(q, p):
+    x, y, z = p.T
+    return (q[:, 0] * x * x + 2 * q[:, 1] * x * y + 2 * q[:, 2] * x * z + q[:, 3] * y * y
+            + 2 * q[:, 4] * y * z + q[:, 5] * z * z
+            + 2 * (q[:, 6] * x + q[:, 7] * y + q[:, 8] * z) + q[:, 9])
+
+
+def _accumulate(index, values, size):
+    return np.column_stack([np.bincount(index, values[:, j], minlength=size)
+                            for j in range(values.shape[1])])
+
+
+def _face_normals(positions, faces):
+    p = positions[faces]
+    return np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+
+
+def _edges(faces, groups, size):
+    """(lo, hi, border) per unique undirected edge of the faces."""
+    a = faces.ravel()
+    b = faces[:, [1, 2, 0]].ravel()
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    key = lo.astype(np.int64) * size + hi
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    start = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    count = np.diff(np.r_[start, len(key)])
+    g = np.repeat(groups, 3)[order]
+    mixed = np.minimum.reduceat(g, start) != np.maximum.reduceat(g, start)
+    return lo[order][start], hi[order][start], (count == 1) | mixed, order[start] // 3
+
+
+def _first_per_vertex(src, order):
+    """The first of `order` (edge indices sorted by src) for each src vertex."""
+    if not len(order):
+        return order
+    return order[np.r_[True, src[order][1:] != src[order][:-1]]]
+
+
+def _flipping(positions, faces, normal, src, dst):
+    """Which collapses src -> dst would flip or flatten one of the faces they move."""
+    # Pair every corner with each collapse of its vertex
+    count = np.bincount(src, minlength=len(positions))
+    by_src = np.argsort(src, kind='stable')
+    corner_vertex = faces.ravel()
+    pairs = count[corner_vertex]
+    corner = np.repeat(np.arange(len(corner_vertex)), pairs)
+    offset = np.arange(pairs.sum()) - np.repeat(np.cumsum(pairs) - pairs, pairs)
+    edge = by_src[np.repeat((np.cumsum(count) - count)[corner_vertex], pairs) + offset]
+    face, k = corner // 3, corner % 3
+    # Faces containing both ends disappear rather than move
+    moves = ~(faces[face] == dst[edge][:, None]).any(axis=1)
+    face, k, edge = face[moves], k[moves], edge[moves]
+    after = faces[face]
+    after[np.arange(len(face)), k] = dst[edge]
+    new = _face_normals(positions, after)
+    old = normal[face]
+    flips = (new * old).sum(axis=1) <= \
+        FLIP_COS * np.linalg.norm(new, axis=1) * np.linalg.norm(old, axis=1)
+    return np.bincount(edge[flips], minlength=len(src)) > 0
+
+
+def _quadrics(positions, faces, groups):
+    size = len(positions)
+    normal = _face_normals(positions, faces)
+    area = np.linalg.norm(normal, axis=1)
+    unit = np.divide(normal, area[:, None], out=np.zeros_like(normal), where=area[:, None] > 0)
+    q = _plane_quadrics(positions[faces[:, 0]], unit, (area > 0).astype(np.float64))
+    quadrics = _accumulate(faces.ravel(), np.repeat(q, 3, axis=0), size)
+
+    # Borders: a plane through the edge, perpendicular to its face
+    lo, hi, border, face = _edges(faces, groups, size)
+    lo, hi, face = lo[border], hi[border], face[border]
+    edge = positions[hi] - positions[lo]
+    side = np.cross(edge, unit[face])
+    length = np.linalg.norm(side, axis=1)
+    side = np.divide(side, length[:, None], out=np.zeros_like(side), where=length[:, None] > 0)
+    q = _plane_quadrics(positions[lo], side, np.full(len(lo), BORDER_WEIGHT))
+    quadrics += _accumulate(np.r_[lo, hi], np.r_[q, q], size)
+    return quadrics
+
+
+def simplify(positions, faces, groups, targets, max_errors):
+    """
+    Decimate a triangle mesh towards each target triangle count in turn.
+
+    positions (n, 3) and faces (m, 3) describe the mesh; groups (m,) gives
+    each face's primitive, whose boundaries are kept like open borders.
+    max_errors caps each level's collapse error, as a fraction of the
+    mesh's bounding box diagonal; a level that hits it stops short of its
+    target. Returns (levels, welded positions), with one (kept faces, vertex
+    map, error) per target: indices into `faces` of the faces that survive,
+    each vertex's welded position after the collapses, and the largest
+    collapse error so far (in units of positions).
+    """
+    positions = np.asarray(positions, np.float64)
+    welded, weld = np.unique(positions, axis=0, return_inverse=True)
+    weld = weld.ravel()
+    size = len(welded)
+    current = weld[faces]
+    keep = np.flatnonzero((current[:, 0] != current[:, 1]) & (current[:, 1] != current[:, 2])
+                          & (current[:, 2] != current[:, 0]))
+    current = current[keep]
+    groups = np.asarray(groups)
+    quadrics = _quadrics(welded, current, groups[keep])
+    alias = np.arange(size)
+    shuffle = np.random.default_rng(0).permutation(size)
+    diagonal = float(np.linalg.norm(welded.max(axis=0) - welded.min(axis=0))) if size else 0.0
+    error = 0.0
+    levels = []
+    targets = list(zip(targets, max_errors))
+
+    for _ in range(MAX_PASSES):
+        while targets and len(current) <= targets[0][0]:
+            levels.append((keep.copy(), alias[weld], error))
+            targets.pop(0)
+        if not targets or not len(current):
+            break
+        limit = targets[0][1] * diagonal
+        lo, hi, _, _ = _edges(current, groups[keep], size)
+        src, dst = np.r_[lo, hi], np.r_[hi, lo]
+        q = quadrics[src] + quadrics[dst]
+        cost = np.maximum(_evaluate(q, welded[dst]), 0.0)
+        # A sum of squared plane distances, so no single plane is further than this
+        err = np.sqrt(cost)
+
+        # Each vertex's cheapest collapse that doesn't flip or flatten a face it
+        # moves; only the vertices whose cheapest one does have the rest tried
+        ok = err <= limit
+        order = np.lexsort((cost, src))
+        normal = _face_normals(welded, current)
+        best = _first_per_vertex(src, order[ok[order]])
+        bad = best[_flipping(welded, current, normal, src[best], dst[best])]
+        retry = np.zeros(size, bool)
+        retry[src[bad]] = True
+        ok[bad] = False
+        others = np.flatnonzero(ok & retry[src])
+        ok[others[_flipping(welded, current, normal, src[others], dst[others])]] = False
+        first = _first_per_vertex(src, order[ok[order]])
+        target = np.full(size, -1)
+        target[src[first]] = dst[first]
+        vcost = np.full(size, np.inf)
+        vcost[src[first]] = cost[first]
+        verr = np.zeros(size)
+        verr[src[first]] = err[first]
+        valid = target >= 0
+
+        # Independent set: a collapse goes ahead if it is the cheapest in all its faces
+        candidates = np.flatnonzero(valid)
+        if not len(candidates):
+            # Stuck at this level's error cap: it ends here, the next may go further
+            levels.append((keep.copy(), alias[weld], error))
+            targets.pop(0)
+            continue
+        # (ties, common on flat areas, broken in a fixed random order so they spread out)
+        rank = np.full(size, len(candidates))
+        rank[candidates[np.lexsort((shuffle[candidates], vcost[candidates]))]] = np.arange(len(candidates))
+        face_min = rank[current].min(axis=1)
+        vertex_min = np.full(size, len(candidates))
+        np.minimum.at(vertex_min, current.ravel(), np.repeat(face_min, 3))
+        chosen = np.flatnonzero(valid & (rank == vertex_min))
+        # Don't overshoot the target much: each collapse removes about two faces
+        need = max(1, (len(current) - targets[0][0] + 1) // 2)
+        chosen = chosen[np.argsort(rank[chosen])[:need]]
+
+        np.add.at(quadrics, target[chosen], quadrics[chosen])
+        error = max(error, float(verr[chosen].max()))
+        remap = np.arange(size)
+        remap[chosen] = target[chosen]
+        alias = remap[alias]
+        current = remap[current]
+        alive = (current[:, 0] != current[:, 1]) & (current[:, 1] != current[:, 2]) & \
+            (current[:, 2] != current[:, 0])
+        current, keep = current[alive], keep[alive]
+
+    levels += [(keep.copy(), alias[weld], error)] * len(targets)
+    return levels, welded
+
+
+# ── Reading and writing models ──
+
+def _draco_primitive(gltf, data, prim):
+    """(attributes {semantic: array}, faces) of a Draco-compressed primitive."""
+    try:
+        import DracoPy
+    except ImportError:
+        raise LODError('Draco-compressed (pip install DracoPy to decode it)') from None
+    ext = prim['extensions'][DRACO]
+    view = gltf['bufferViews'][ext['bufferView']]
+    start = view.get('byteOffset', 0)
+    try:
+        mesh = DracoPy.decode(data[start:start + view['byteLength']])
+    except Exception as e:  # DracoPy's own exception types vary between versions
+        raise LODError(f'Draco data DracoPy cannot decode ({e})') from None
+    attributes = {}
+    for semantic, index in prim['attributes'].items():
+        accessor = gltf['accessors'][index]
+        if semantic not in ext['attributes']:
+            raise LODError(f'{semantic} is not in the Draco data')
+        values = np.asarray(mesh.get_attribute_by_unique_id(ext['attributes'][semantic])['data'])
+        attributes[semantic] = values.reshape(len(values), COMPONENTS[accessor['type']]).astype(
+            DTYPES[accessor['componentType']])
+    return attributes, np.asarray(mesh.faces, np.int64).reshape(-1, 3)
+
+
+def _primitive(gltf, data, prim):
+    if DRACO in prim.get('extensions', {}):
+        return _draco_primitive(gltf, data, prim)
+    attributes = {s: read_accessor(gltf, data, i) for s, i in prim['attributes'].items()}
+    if 'indices' in prim:
+        faces = read_accessor(gltf, data, prim['indices']).astype(np.int64).reshape(-1, 3)
+    else:
+        faces = np.arange(len(attributes['POSITION']) // 3 * 3).reshape(-1, 3)
+    return attributes, faces
+
+
+def _triangles(gltf):
+    """Triangles drawn by the default scene (each mesh instance counted)."""
+    meshes = gltf.get('meshes', [])
+    return sum(glb.primitive_triangles(gltf, prim) for index, _ in glb.mesh_instances(gltf)
+               for prim in meshes[index].get('primitives', []))
+
+
+def _simplifiable(prim):
+    return prim.get('mode', MODE_TRIANGLES) == MODE_TRIANGLES and 'POSITION' in prim.get(
+        'attributes', {}) and not prim.get('targets')
+
+
+def _add_accessor(gltf, values, template, target=ARRAY_BUFFER):
+    if target == ARRAY_BUFFER:
+        view = add_view(gltf, vertex_rows(values), target, 'ATTRIBUTES')
+    else:
+        view = add_view(gltf, values.view(np.uint8).reshape(len(values), -1), target, 'INDICES')
+    gltf['accessors'].append({
+        'bufferView': view,
+        'componentType': COMPONENT_TYPES[values.dtype], 'count': len(values),
+        'type': template.get('type', 'SCALAR'),
+        **({'normalized': True} if template.get('normalized') else {}),
+    })
+    return len(gltf['accessors']) - 1
+
+
+def prune_accessors(gltf):
+    """Drop accessors nothing refers to any more, renumbering the rest."""
+    refs = []  # (container, key) holding an accessor index
+    for mesh in gltf.get('meshes', []):
+        for prim in mesh.get('primitives', []):
+            refs += [(prim['attributes'], s) for s in prim.get('attributes', {})]
+            if 'indices' in prim:
+                refs.append((prim, 'indices'))
+            for target in prim.get('targets', []):
+                refs += [(target, s) for s in target]
+    for skin in gltf.get('skins', []):
+        if 'inverseBindMatrices' in skin:
+            refs.append((skin, 'inverseBindMatrices'))
+    for animation in gltf.get('animations', []):
+        for sampler in animation.get('samplers', []):
+            refs += [(sampler, 'input'), (sampler, 'output')]
+    for node in gltf.get('nodes', []):
+        instancing = node.get('extensions', {}).get('EXT_mesh_gpu_instancing', {})
+        refs += [(instancing['attributes'], s) for s in instancing.get('attributes', {})]
+    used = sorted({c[k] for c, k in refs})
+    remap = {old: new for new, old in enumerate(used)}
+    for container, key in refs:
+        container[key] = remap[container[key]]
+    gltf['accessors'] = [gltf['accessors'][i] for i in used]
+
+
+def build_levels(path, budgets, max_errors=DEFAULT_MAX_ERRORS):
+    """
+    Simplify a GLB towards each triangle budget. Returns the source's
+    triangle count and [(triangles, error, glTF, BIN chunk)] for the levels
+    worth keeping (models already under a budget get no level for it).
+    """
+    gltf, data = glb.read(path)
+    total = _triangles(gltf)
+    wanted = [i for i, budget in enumerate(budgets) if total > budget * LEVEL_MARGIN]
+    if not wanted:
+        return total, []
+    targets = [budgets[i] for i in wanted]
+    max_errors = [max_errors[min(i, len(max_errors) - 1)] for i in wanted]
+
+    # Every mesh gets the same share of each budget
+    ratios = [t / total for t in targets]
+    per_mesh = {}
+    for mi, mesh in enumerate(gltf.get('meshes', [])):
+        prims = [(pi, p) for pi, p in enumerate(mesh.get('primitives', [])) if _simplifiable(p)]
+        if not prims:
+            continue
+        loaded = [_primitive(gltf, data, p) for _, p in prims]
+        offsets = np.cumsum([0] + [len(a['POSITION']) for a, _ in loaded])
+        positions = np.concatenate([a['POSITION'] for a, _ in loaded])
+        faces = np.concatenate([f + o for (_, f), o in zip(loaded, offsets)])
+        groups = np.concatenate([np.full(len(f), i) for i, (_, f) in enumerate(loaded)])
+        mesh_targets = [max(1, int(len(faces) * r)) for r in ratios]
+        levels, welded = simplify(positions, faces, groups, mesh_targets, max_errors)
+        per_mesh[mi] = (prims, loaded, offsets, faces, groups, levels, welded)
+
+    out = []
+    for level in range(len(targets)):
+        lod = json.loads(json.dumps(gltf))
+        lod.setdefault('accessors', [])
+        lod.setdefault('bufferViews', [])
+        error = 0.0
+        for mi, (prims, loaded, offsets, faces, groups, levels, welded) in per_mesh.items():
+            # Meshes that ran out of collapses stay at their last level
+            kept, vertex_map, mesh_error = levels[min(level, len(levels) - 1)] if levels else \
+                (np.arange(len(faces)), None, 0.0)
+            error = max(error, mesh_error)
+            mesh = lod['meshes'][mi]
+            parts = [faces[kept[groups[kept] == g]] for g in range(len(prims))]
+            if not any(len(corners) for corners in parts):
+                continue  # nothing left: the mesh stays as it is
+            for g, ((pi, _), (attributes, _)) in enumerate(zip(prims, loaded)):
+                prim = mesh['primitives'][pi]
+                corners = parts[g]
+                if not len(corners):
+                    continue  # small parts can vanish; dropped below
+                used, local = np.unique(corners, return_inverse=True)
+                new = {}
+                for semantic, values in attributes.items():
+                    values = values[used - offsets[g]]
+                    if semantic == 'POSITION' and vertex_map is not None:
+                        values = welded[vertex_map[used]].astype(values.dtype)
+                    template = gltf['accessors'][prim['attributes'][semantic]]
+                    new[semantic] = _add_accessor(lod, values, template)
+                    if semantic == 'POSITION':
+                        accessor = lod['accessors'][new[semantic]]
+                        accessor['min'] = values.min(axis=0).tolist() if len(values) else [0, 0, 0]
+                        accessor['max'] = values.max(axis=0).tolist() if len(values) else [0, 0, 0]
+                prim['attributes'] = new
+                dtype = np.uint16 if len(used) < 0xFFFF else np.uint32
+                prim['indices'] = _add_accessor(lod, local.reshape(-1, 1).astype(dtype), {},
+                                                ELEMENT_ARRAY_BUFFER)
+                extensions = prim.get('extensions', {})
+                extensions.pop(DRACO, None)
+                if not extensions:
+                    prim.pop('extensions', None)
+            vanished = {pi for (pi, _), corners in zip(prims, parts) if not len(corners)}
+            mesh['primitives'] = [p for pi, p in enumerate(mesh['primitives']) if pi not in vanished]
+        prune_accessors(lod)
+        if not any(DRACO in p.get('extensions', {}) for m in lod.get('meshes', [])
+                   for p in m.get('primitives', [])):
+            for key in ('extensionsUsed', 'extensionsRequired'):
+                if DRACO in lod.get(key, []):
+                    lod[key].remove(DRACO)
+                    if not lod[key]:
+                        del lod[key]
+        bin_chunk, _ = pack(lod, data, compress=False)
+        out.append((_triangles(lod), error, lod, bin_chunk))
+    # Keep levels that are a real step down from the one before
+    kept_levels = []
+    previous = total
+    for level in out:
+        if level[0] <= previous * MIN_REDUCTION:
+            kept_levels.append(level)
+            previous = level[0]
+    return total, kept_levels
@@ -0,0 +1,28 @@
+"""
+manifest.json helpers.
+
+Entries are dicts keyed by catalog id: {"file": ..., "sha256": ..., "size": ...}
+plus any source-specific fields (Poly Haven adds name/categories). Older IKEA
+manifests map catalog id -> filename; load_manifest() upgrades those in memory.
+"""
+
+import json
+import os
+
+
+def load_manifest(path):
+    """Load a manifest, returning {} if it doesn't exist yet."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        data = json.load(f)
+    return {cid: ({'file': entry} if isinstance(entry, str) else entry)
+            for cid, entry in data.items()}
+
+
+def save_manifest(manifest, path):
+    """Write manifest.json atomically so a crash never leaves it half-written."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
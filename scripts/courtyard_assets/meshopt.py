@@ -0,0 +1,122 @@
+"""
+EXT_meshopt_compression encoders in NumPy.
+
+Writes the bitstreams that meshoptimizer's decoders (three.js's
+MeshoptDecoder, gltfpack's output readers) read; no native module needed.
+
+encode_vertex_buffer() is the vertex codec, version 0 (mode ATTRIBUTES):
+vertices are split into blocks of up to 256; in each block every byte
+position of the vertex is coded separately as zigzag deltas from the
+previous vertex, in groups of 16 that are stored as all-zero, 2-bit, 4-bit
+(each with escapes for larger values) or raw 8-bit, whichever is smallest.
+Quantized, vertex-cache-ordered attributes are mostly small deltas, so most
+groups take 2 or 4 bits per byte before gzip/brotli sees them.
+
+encode_index_sequence() is the index codec, version 1 (mode INDICES): each
+index is a zigzag delta from the previous one as a LEB128 varint. meshopt's
+encoder also switches between two baselines to keep jumps short; this one
+always uses the first (a valid stream the decoder reads the same way), which
+keeps it a handful of array operations.
+"""
+
+import numpy as np
+
+VERTEX_HEADER = 0xA0  # vertex codec, version 0
+INDEX_SEQUENCE_HEADER = 0xD1  # index sequence codec, version 1
+VERTEX_BLOCK_MAX = 256
+BLOCK_BYTES = 8192
+GROUP = 16
+TAIL_MIN = 32
+
+
+def _block_size(stride):
+    return min((BLOCK_BYTES // stride) & ~(GROUP - 1), VERTEX_BLOCK_MAX)
+
+
+def _encode_groups(groups):
+    """
+    Encoded bytes of one block: groups is (stride, n, 16) zigzag deltas, a
+    row of n groups per byte of the vertex; each row is its header bytes
+    followed by the groups.
+    """
+    stride, n, _ = groups.shape
+    nonzero = groups.any(axis=2)
+    over2 = (groups >= 3).sum(axis=2)
+    over4 = (groups >= 15).sum(axis=2)
+    # Sizes of the four encodings; ties go to the narrower one
+    sizes = np.stack([np.where(nonzero, 99, 0), 4 + over2, 8 + over4,
+                      np.full_like(over2, GROUP)], axis=2)
+    mode = sizes.argmin(axis=2)
+    length = np.take_along_axis(sizes, mode[..., None], axis=2)[..., 0]
+
+    payload = np.zeros((stride, n, 32), np.uint8)
+    for bits, width, escape in ((1, 4, 3), (2, 8, 15)):
+        sel = mode == bits
+        if not sel.any():
+            continue
+        g = groups[sel]
+        per_byte = 8 // (1 << bits)
+        packed = np.minimum(g, escape).reshape(len(g), width, per_byte).astype(np.uint8)
+        shifts = (np.arange(per_byte - 1, -1, -1) * (1 << bits)).astype(np.uint8)
+        rows = np.zeros((len(g), 32), np.uint8)
+        rows[:, :width] = np.bitwise_or.reduce(packed << shifts, axis=2)
+        # Escaped values follow the packed bytes, in order
+        escaped = g >= escape
+        slot = np.where(escaped, width + np.cumsum(escaped, axis=1) - 1, 31)
+        np.put_along_axis(rows, slot, np.where(escaped, g, 0).astype(np.uint8), axis=1)
+        payload[sel] = rows
+    payload[mode == 3, :GROUP] = groups[mode == 3]
+
+    # Two header bits per group, four groups per byte, first group lowest
+    padded = np.zeros((stride, -(-n // 4) * 4), np.uint8)
+    padded[:, :n] = mode
+    header = (padded.reshape(stride, -1, 4) << np.array([0, 2, 4, 6], np.uint8)).sum(
+        axis=2, dtype=np.uint8)
+
+    rows = np.zeros((stride, n + 1, 32), np.uint8)
+    rows[:, 0, :header.shape[1]] = header
+    rows[:, 1:] = payload
+    lengths = np.empty((stride, n + 1), np.int64)
+    lengths[:, 0] = header.shape[1]
+    lengths[:, 1:] = length
+    return rows[np.arange(32) < lengths[..., None]]
+
+
+def encode_vertex_buffer(vertices):
+    """Vertex codec stream for a (count, stride) uint8 array; stride % 4 == 0."""
+    count, stride = vertices.shape
+    if stride % 4 or stride > 256:
+        raise ValueError(f'vertex stride {stride}')
+    out = [bytes([VERTEX_HEADER])]
+    if count:
+        first = vertices[0]
+        delta = np.diff(vertices, axis=0, prepend=first[None]).view(np.int8)
+        zigzag = ((delta << 1) ^ (delta >> 7)).view(np.uint8)
+        block = _block_size(stride)
+        for start in range(0, count, block):
+            chunk = zigzag[start:start + block]
+            aligned = -(-len(chunk) // GROUP) * GROUP
+            columns = np.zeros((stride, aligned), np.uint8)
+            columns[:, :len(chunk)] = chunk.T
+            out.append(_encode_groups(columns.reshape(stride, aligned // GROUP, GROUP)).tobytes())
+    tail = bytearray(max(TAIL_MIN, stride))
+    if count:
+        tail[-stride:] = vertices[0].tobytes()
+    out.append(bytes(tail))
+    return b''.join(out)
+
+
+def encode_index_sequence(indices):
+    """Index sequence codec stream for a flat array of vertex indices."""
+    indices = np.asarray(indices, np.int64)
+    delta = np.diff(indices, prepend=0).astype(np.int32)
+    # zigzag, then the low bit selects the baseline (always 0 here)
+    value = ((delta << 1) ^ (delta >> 31)).view(np.uint32) << np.uint32(1)
+    # LEB128: up to 5 groups of 7 bits, continuation bit on all but the last
+    shifts = np.arange(5, dtype=np.uint32) * 7
+    groups = (value[:, None] >> shifts) & 0x7F
+    used = 1 + (value[:, None] >= (np.uint64(1) << shifts[1:].astype(np.uint64))).sum(axis=1)
+    more = np.arange(5) < (used[:, None] - 1)
+    varints = (groups | (more * 0x80)).astype(np.uint8)
+    body = varints[np.arange(5) < used[:, None]].tobytes()
+    return bytes([INDEX_SEQUENCE_HEADER]) + body + bytes(4)
@@ -0,0 +1,209 @@
+"""
+Structured timing spans and counters for the asset scripts.
+
+The shared modules are instrumented at the points where time goes: page
+navigation (browser.py), HTTP requests, retries and cache revalidation
+(net.py, httpcache.py), downloads (download.py), tier probes (tiers.py) and
+page extraction (ikea.py). The scripts add their own stages and skip
+reasons on top.
+
+    with metrics.span('download', host=host) as s:
+        ...
+        s['bytes'] = n
+    metrics.count('skipped', reason='no3d_cached')
+
+Counters and per-stage time totals are always kept (a dict update per
+event). Scripts that call add_arguments()/setup() also get:
+
+  --metrics DIR   every finished span as one JSON line in
+                  DIR/<script>-<time>.jsonl, and counters plus stage totals
+                  as a Prometheus textfile, DIR/<script>.prom (rewritten
+                  atomically at exit, for node_exporter's textfile collector)
+  --profile       cProfile around each outermost span, aggregated per
+                  stage into DIR/<script>-<stage>.prof (DIR defaults to
+                  .asset-cache/metrics) with the top functions printed at
+                  exit. cProfile follows one thread, so spans that start
+                  while another thread is being profiled are not sampled;
+                  use a single worker for a complete profile.
+"""
+
+import atexit
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from . import CACHE_DIR
+
+DEFAULT_DIR = os.path.join(CACHE_DIR, 'metrics')
+PREFIX = 'courtyard_'
+
+_lock = threading.Lock()
+_local = threading.local()
+_counters = defaultdict(float)             # (name, labels) -> value
+_stages = defaultdict(lambda: [0, 0.0])    # stage -> [count, seconds]
+_profiles = {}                             # stage -> pstats.Stats
+_profiling = threading.Lock()              # held by the thread being profiled
+_config = {'jsonl': None, 'prom': None, 'profile_dir': None, 'script': None}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def count(name, n=1, **labels):
+    """Add n to a counter (labels distinguish series, e.g. reason='no3d_cached')."""
+    with _lock:
+        _counters[_key(name, labels)] += n
+
+
+@contextmanager
+def span(stage, **attrs):
+    """
+    Time a block as one unit of a stage. Yields a dict of attributes the
+    block can add to (bytes, status, ...); exceptions are recorded and
+    re-raised.
+    """
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+    profiler = None
+    if _config['profile_dir'] and depth == 0 and _profiling.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs['error'] = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _local.depth = depth
+        if profiler:
+            profiler.disable()
+            _profiling.release()
+        _record(stage, elapsed, attrs, profiler)
+
+
+def timed_iter(iterable, stage, **attrs):
+    """Yield from iterable, recording the wait for each item as a span of stage."""
+    it = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            return
+        except BaseException as e:
+            _record(stage, time.perf_counter() - start, {**attrs, 'error': type(e).__name__})
+            raise
+        _record(stage, time.perf_counter() - start, dict(attrs))
+        yield item
+
+
+def _record(stage, elapsed, attrs, profiler=None):
+    with _lock:
+        totals = _stages[stage]
+        totals[0] += 1
+        totals[1] += elapsed
+        if profiler:
+            stats = _profiles.get(stage)
+            if stats is None:
+                _profiles[stage] = pstats.Stats(profiler)
+            else:
+                stats.add(profiler)
+        if _config['jsonl']:
+            record = {'ts': round(time.time(), 3), 'stage': stage,
+                      'ms': round(elapsed * 1000, 2),
+                      'thread': threading.current_thread().name, **attrs}
+            _config['jsonl'].write(json.dumps(record, default=str) + '\n')
+
+
+def snapshot():
+    """Counters and stage totals as plain dicts."""
+    with _lock:
+        counters = {name + (str(dict(labels)) if labels else ''): value
+                    for (name, labels), value in sorted(_counters.items())}
+        stages = {stage: {'count': n, 'seconds': round(s, 3)}
+                  for stage, (n, s) in sorted(_stages.items())}
+    return {'counters': counters, 'stages': stages}
+
+
+def _prom_labels(labels):
+    if not labels:
+        return ''
+    esc = lambda v: v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in labels) + '}'
+
+
+def prometheus_text():
+    """Counters and stage totals in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        by_name = defaultdict(list)
+        for (name, labels), value in sorted(_counters.items()):
+            by_name[name].append((labels, value))
+        for name, series in by_name.items():
+            lines.append(f'# TYPE {PREFIX}{name}_total counter')
+            lines += [f'{PREFIX}{name}_total{_prom_labels(labels)} {value:g}' for labels, value in series]
+        if _stages:
+            lines.append(f'# TYPE {PREFIX}stage_seconds summary')
+            for stage, (n, seconds) in sorted(_stages.items()):
+                lines.append(f'{PREFIX}stage_seconds_sum{{stage="{stage}"}} {seconds:.6f}')
+                lines.append(f'{PREFIX}stage_seconds_count{{stage="{stage}"}} {n}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+def add_arguments(parser):
+    """Add --metrics and --profile to a script's argparse parser."""
+    parser.add_argument('--metrics', metavar='DIR',
+                        help='write timing spans (JSONL) and counters (Prometheus textfile) to DIR')
+    parser.add_argument('--profile', action='store_true',
+                        help='cProfile each stage; stats go to the metrics directory')
+
+
+def setup(args, script):
+    """Start exporting per the parsed --metrics / --profile flags; flushed at exit."""
+    directory = args.metrics or (DEFAULT_DIR if args.profile else None)
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _config['script'] = script
+    if args.metrics:
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        _config['jsonl'] = open(os.path.join(directory, f'{script}-{stamp}.jsonl'), 'a', buffering=1)
+        _config['prom'] = os.path.join(directory, f'{script}.prom')
+    if args.profile:
+        _config['profile_dir'] = directory
+    atexit.register(close)
+
+
+def close():
+    """Write the Prometheus textfile and profiles, and close the span log."""
+    if _config['prom']:
+        write_prometheus(_config['prom'])
+        print(f"Metrics: {_config['prom']}")
+        _config['prom'] = None
+    if _config['jsonl']:
+        _config['jsonl'].close()
+        _config['jsonl'] = None
+    if _config['profile_dir']:
+        with _lock:
+            profiles = dict(_profiles)
+        for stage, stats in sorted(profiles.items()):
+            path = os.path.join(_config['profile_dir'], f"{_config['script']}-{stage}.prof")
+            stats.dump_stats(path)
+            print(f"\nProfile [{stage}] -> {path}")
+            stats.sort_stats('cumulative').print_stats(10)
+        _config['profile_dir'] = None
@@ -0,0 +1,102 @@
+"""
+Pooled HTTP session shared by the asset scripts.
+
+One keep-alive connection pool per host, with a browser-like User-Agent
+(ikea.com serves a stripped page to unknown clients) and transparent retries
+on connection errors and 5xx responses.
+
+Every request is admitted by its host's adaptive limiter (ratelimit.py). A
+429/503 is not retried blindly: it is reported to the limiter, which backs
+the host off (honouring Retry-After), and the request is retried once the
+limiter lets it through again.
+
+With COURTYARD_BASE_URL set, requests are sent to that replay server
+instead of the live hosts (see replay.py).
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics, ratelimit, replay
+from .httpcache import get_cache
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/124.0 Safari/537.36')
+
+# Connections kept alive per host; sized for the worker pools in the scripts
+POOL_SIZE = 32
+
+# Attempts at a request the host keeps answering with 429/503
+THROTTLE_RETRIES = 4
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class ThrottledAdapter(HTTPAdapter):
+    """HTTPAdapter that sends every request through its host's ratelimit.HostLimiter."""
+
+    def send(self, request, **kwargs):
+        limiter = ratelimit.limiter_for(request.url)
+        request.url = replay.rewrite(request.url)
+        for attempt in range(THROTTLE_RETRIES):
+            queued = time.monotonic()
+            started = limiter.acquire()
+            metrics.count('ratelimit_wait_seconds', started - queued, host=limiter.host)
+            try:
+                resp = super().send(request, **kwargs)
+            except Exception:
+                limiter.release(started)
+                metrics.count('http_requests', host=limiter.host, status='error')
+                raise
+            limiter.release(started, resp.status_code, resp.headers.get('Retry-After'))
+            metrics.count('http_requests', host=limiter.host, status=resp.status_code)
+            if resp.status_code not in ratelimit.THROTTLE_STATUS or attempt == THROTTLE_RETRIES - 1:
+                return resp
+            metrics.count('http_retries', host=limiter.host, reason='throttled')
+            resp.close()
+
+
+def make_session(pool_size=POOL_SIZE):
+    """Create a requests.Session with pooled, retrying adapters."""
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept-Language': 'en-US,en;q=0.9',
+    })
+    # 429/503 are left to ThrottledAdapter so the limiter sees them
+    retry = Retry(total=3, backoff_factor=0.5,
+                  status_forcelist=(500, 502, 504), respect_retry_after_header=False,
+                  allowed_methods=('GET', 'HEAD'))
+    adapter = ThrottledAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """Return the process-wide shared session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = make_session()
+    return _session
+
+
+def fetch_bytes(url, timeout=20, session=None):
+    """
+    Conditional GET through the revalidation cache.
+    Returns (body, not_modified). Raises on HTTP errors.
+    """
+    return get_cache().get(url, session or get_session(), timeout=timeout)
+
+
+def fetch_text(url, timeout=20, session=None):
+    """GET a page (revalidating any cached copy) and return its body as text."""
+    body, _ = fetch_bytes(url, timeout=timeout, session=session)
+    return body.decode('utf-8', errors='replace')
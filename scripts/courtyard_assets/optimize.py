@@ -0,0 +1,375 @@
+"""
+Optimisation stage: GLBs rewritten with quantized vertex attributes
+(KHR_mesh_quantization) and meshopt-compressed buffers
+(EXT_meshopt_compression), for a parallel tree the client can load instead
+of public/models.
+
+Per mesh, with NumPy doing the packing:
+
+- POSITION: unsigned shorts on a uniform grid of 2^bits steps (14 by
+  default) over the mesh's bounding box. The grid's offset and scale go on
+  a new child node that the mesh moves to, so loaders dequantize through the
+  scene graph and the model's bounds (glb.inspect()) don't change
+- NORMAL, TANGENT: normalized bytes
+- TEXCOORD_n within [0, 1]: normalized unsigned shorts (others stay float)
+- anything else is kept as it is
+
+Vertices are reordered by first use in the index buffer, which drops
+unreferenced ones and makes consecutive vertices neighbours, and indices
+become 16-bit where they fit. Every attribute and index buffer view written
+is then meshopt-compressed (meshopt.py) where that makes it smaller; the
+uncompressed layout only exists as the extension's fallback buffer, which has
+no data, so both extensions are required.
+
+Meshes are copied as they are when they have Draco-compressed primitives
+(most IKEA models: Draco decodes to floats and already beats this on size),
+morph targets or skins, sparse or already quantized accessors, or
+accessors shared with another mesh. Files with external buffers or that are
+already meshopt-compressed are copied unchanged.
+
+optimize_file() returns the file's report row: bytes before and after, and
+the largest error quantization introduced, positions in metres (and relative
+to the mesh's extent), normals in degrees, texture coordinates in UV units.
+"""
+
+import os
+import shutil
+from collections import Counter
+
+import numpy as np
+
+from . import glb, meshopt
+
+DEFAULT_POSITION_BITS = 14
+QUANTIZATION = 'KHR_mesh_quantization'
+MESHOPT = 'EXT_meshopt_compression'
+DRACO = 'KHR_draco_mesh_compression'
+
+ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER = 34962, 34963
+BYTE, UNSIGNED_BYTE, SHORT, UNSIGNED_SHORT, UNSIGNED_INT, FLOAT = 5120, 5121, 5122, 5123, 5125, 5126
+DTYPES = {BYTE: np.int8, UNSIGNED_BYTE: np.uint8, SHORT: np.int16,
+          UNSIGNED_SHORT: np.uint16, UNSIGNED_INT: np.uint32, FLOAT: np.float32}
+COMPONENT_TYPES = {np.dtype(t): c for c, t in DTYPES.items()}
+COMPONENTS = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT2': 4, 'MAT3': 9, 'MAT4': 16}
+MODE_TRIANGLES = 4
+# errors recorded by _quantize() -> report fields
+REPORT_ERRORS = (('position', 'position_error'), ('position_rel', 'position_error_rel'),
+                 ('normal', 'normal_error_deg'), ('uv', 'uv_error'))
+
+
+def read_accessor(gltf, data, index):
+    """An accessor's elements as a (count, components) array of its component type."""
+    accessor = gltf['accessors'][index]
+    dtype = np.dtype(DTYPES[accessor['componentType']])
+    n = COMPONENTS[accessor['type']]
+    if 'bufferView' not in accessor:
+        return np.zeros((accessor['count'], n), dtype)
+    view = gltf['bufferViews'][accessor['bufferView']]
+    stride = view.get('byteStride') or dtype.itemsize * n
+    offset = view.get('byteOffset', 0) + accessor.get('byteOffset', 0)
+    return np.ndarray((accessor['count'], n), dtype, data, offset,
+                      (stride, dtype.itemsize)).copy()
+
+
+def _file_problem(gltf):
+    """Why a file is copied unchanged, or None."""
+    if MESHOPT in gltf.get('extensionsUsed', []):
+        return 'already meshopt-compressed'
+    if any('uri' in b for b in gltf.get('buffers', [])) or \
+            any(v.get('buffer', 0) for v in gltf.get('bufferViews', [])):
+        return 'external buffers'
+    return None
+
+
+def _mesh_problem(gltf, mesh_index, mesh_users, skinned):
+    """Why a mesh is kept as it is, or None."""
+    accessors = gltf.get('accessors', [])
+    if mesh_index in skinned:
+        return 'skinned'
+    for prim in gltf['meshes'][mesh_index].get('primitives', []):
+        if DRACO in prim.get('extensions', {}):
+            return 'draco'
+        if prim.get('targets'):
+            return 'morph targets'
+        attributes = prim.get('attributes', {})
+        if 'POSITION' not in attributes:
+            return 'no positions'
+        if accessors[attributes['POSITION']]['componentType'] != FLOAT:
+            return 'already quantized'
+        for index in [*attributes.values(), prim.get('indices')]:
+            if index is None:
+                continue
+            if 'sparse' in accessors[index]:
+                return 'sparse accessors'
+            if mesh_users[index] != {mesh_index}:
+                return 'shared accessors'
+    return None
+
+
+def add_view(gltf, rows, target, mode):
+    """
+    Append a bufferView holding rows ((count, stride) uint8), to be laid out
+    (and meshopt-encoded in `mode`) by pack(). Returns its index.
+    """
+    count, stride = rows.shape
+    view = {'buffer': 0, 'byteLength': rows.nbytes, 'target': target,
+            '_data': rows, '_meshopt': (mode, stride, count)}
+    if target == ARRAY_BUFFER:
+        view['byteStride'] = stride
+    gltf['bufferViews'].append(view)
+    return len(gltf['bufferViews']) - 1
+
+
+def vertex_rows(values):
+    """(count, stride) bytes of an attribute, each element padded to 4 bytes."""
+    count, n = values.shape
+    size = values.dtype.itemsize * n
+    rows = np.zeros((count, -(-size // 4) * 4), np.uint8)
+    rows[:, :size] = np.ascontiguousarray(values).view(np.uint8).reshape(count, size)
+    return rows
+
+
+def _unit(vectors):
+    length = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, length, out=np.zeros_like(vectors), where=length > 0)
+
+
+def _angle(a, b):
+    """Largest angle between corresponding unit vectors, in degrees."""
+    if not len(a):
+        return 0.0
+    dot = np.clip((_unit(a) * _unit(b)).sum(axis=1), -1, 1)
+    return float(np.degrees(np.arccos(dot)).max())
+
+
+def _snorm8(values):
+    q = np.rint(np.clip(values, -1, 1) * 127).astype(np.int8)
+    return q, np.maximum(q / 127.0, -1.0)
+
+
+def _quantize(semantic, values, origin, scale, bits, errors):
+    """
+    (values to store, accessor fields) for one float attribute, recording the
+    largest error in `errors`; (None, {}) if it is kept as it is.
+    """
+    values = values.astype(np.float64)
+    if semantic == 'POSITION':
+        q = np.clip(np.rint((values - origin) / scale), 0, (1 << bits) - 1).astype(np.uint16)
+        error = float(np.abs(q * scale + origin - values).max()) if len(q) else 0.0
+        errors['position'] = max(errors.get('position', 0.0), error)
+        errors['position_rel'] = max(errors.get('position_rel', 0.0), error / (scale * ((1 << bits) - 1)))
+        return q, {'min': q.min(axis=0).tolist(), 'max': q.max(axis=0).tolist()}
+    if semantic == 'NORMAL':
+        q, restored = _snorm8(_unit(values))
+        errors['normal'] = max(errors.get('normal', 0.0), _angle(values, restored))
+        return q, {'normalized': True}
+    if semantic == 'TANGENT':
+        q, restored = _snorm8(np.column_stack([_unit(values[:, :3]), np.sign(values[:, 3:])]))
+        errors['normal'] = max(errors.get('normal', 0.0), _angle(values[:, :3], restored[:, :3]))
+        return q, {'normalized': True}
+    if semantic.startswith('TEXCOORD_') and len(values) and values.min() >= 0 and values.max() <= 1:
+        q = np.rint(values * 65535).astype(np.uint16)
+        errors['uv'] = max(errors.get('uv', 0.0), float(np.abs(q / 65535.0 - values).max()))
+        return q, {'normalized': True}
+    return None, {}
+
+
+def _first_use(indices):
+    """(old vertex ids in order of first use, indices remapped to that order)."""
+    used, first = np.unique(indices, return_index=True)
+    order = used[np.argsort(first, kind='stable')]
+    remap = np.zeros(int(used[-1]) + 1, np.int64)
+    remap[order] = np.arange(len(order))
+    return order, remap[indices]
+
+
+def _quantize_mesh(gltf, data, mesh, bits, refs, errors):
+    """Rewrite a mesh's accessors in place; returns the position grid (origin, scale)."""
+    accessors = gltf['accessors']
+    prims = mesh['primitives']
+    positions = [read_accessor(gltf, data, i) for i in {p['attributes']['POSITION'] for p in prims}]
+    lo = np.min([p.min(axis=0) for p in positions if len(p)] or [np.zeros(3)], axis=0).astype(np.float64)
+    hi = np.max([p.max(axis=0) for p in positions if len(p)] or [np.zeros(3)], axis=0).astype(np.float64)
+    extent = float((hi - lo).max())
+    scale = extent / ((1 << bits) - 1) if extent > 0 else 1.0
+
+    done = set()
+    for prim in prims:
+        attributes = prim['attributes']
+        order = indices = None
+        if 'indices' in prim:
+            indices = read_accessor(gltf, data, prim['indices']).ravel()
+            # Only reorder vertices this primitive alone uses
+            if prim.get('mode', MODE_TRIANGLES) == MODE_TRIANGLES and len(indices) and \
+                    all(refs[i] == 1 for i in [*attributes.values(), prim['indices']]):
+                order, indices = _first_use(indices)
+        for semantic, index in attributes.items():
+            if index in done:
+                continue
+            done.add(index)
+            old = accessors[index]
+            values = read_accessor(gltf, data, index)
+            if order is not None:
+                values = values[order]
+            stored, fields = (_quantize(semantic, values, lo, scale, bits, errors)
+                              if old['componentType'] == FLOAT else (None, {}))
+            if stored is None:
+                stored = values
+                fields = {'normalized': True} if old.get('normalized') else {}
+                if 'min' in old and len(values):
+                    fields.update(min=values.min(axis=0).tolist(), max=values.max(axis=0).tolist())
+            accessors[index] = {
+                'bufferView': add_view(gltf, vertex_rows(stored), ARRAY_BUFFER, 'ATTRIBUTES'),
+                'componentType': COMPONENT_TYPES[stored.dtype], 'count': len(stored),
+                'type': old['type'], **fields,
+                **{k: old[k] for k in ('name', 'extras') if k in old},
+            }
+        if indices is not None and prim['indices'] not in done:
+            done.add(prim['indices'])
+            vertices = len(order) if order is not None else accessors[attributes['POSITION']]['count']
+            # 0xFFFF is the primitive restart value, so 16-bit indices stop one short
+            dtype = np.uint16 if vertices < 0xFFFF else np.uint32
+            stored = indices.astype(dtype)
+            accessors[prim['indices']] = {
+                'bufferView': add_view(gltf, stored.view(np.uint8).reshape(len(stored), -1),
+                                        ELEMENT_ARRAY_BUFFER, 'INDICES'),
+                'componentType': COMPONENT_TYPES[np.dtype(dtype)], 'count': len(stored), 'type': 'SCALAR',
+            }
+    return lo, scale
+
+
+def _used_views(gltf):
+    used = set()
+    for accessor in gltf.get('accessors', []):
+        if 'bufferView' in accessor:
+            used.add(accessor['bufferView'])
+        sparse = accessor.get('sparse')
+        if sparse:
+            used.update((sparse['indices']['bufferView'], sparse['values']['bufferView']))
+    used.update(image['bufferView'] for image in gltf.get('images', []) if 'bufferView' in image)
+    for mesh in gltf.get('meshes', []):
+        for prim in mesh.get('primitives', []):
+            draco = prim.get('extensions', {}).get(DRACO)
+            if draco:
+                used.add(draco['bufferView'])
+    return used
+
+
+def _remap_views(gltf, remap):
+    for accessor in gltf.get('accessors', []):
+        if 'bufferView' in accessor:
+            accessor['bufferView'] = remap[accessor['bufferView']]
+        sparse = accessor.get('sparse')
+        if sparse:
+            for part in ('indices', 'values'):
+                sparse[part]['bufferView'] = remap[sparse[part]['bufferView']]
+    for image in gltf.get('images', []):
+        if 'bufferView' in image:
+            image['bufferView'] = remap[image['bufferView']]
+    for mesh in gltf.get('meshes', []):
+        for prim in mesh.get('primitives', []):
+            draco = prim.get('extensions', {}).get(DRACO)
+            if draco:
+                draco['bufferView'] = remap[draco['bufferView']]
+
+
+def pack(gltf, data, compress):
+    """
+    Lay out the buffer views still in use into a new BIN chunk, encoding the
+    ones add_view() wrote. Returns (BIN bytes, whether meshopt was used).
+    """
+    views = gltf.get('bufferViews', [])
+    used = sorted(_used_views(gltf))
+    out = glb.BinBuilder()
+    fallback = 0
+    packed = []
+    for old in used:
+        view = views[old]
+        rows = view.pop('_data', None)
+        mode, stride, count = view.pop('_meshopt', (None, 0, 0))
+        payload = rows if rows is not None else \
+            memoryview(data)[view.get('byteOffset', 0):view.get('byteOffset', 0) + view['byteLength']]
+        encoded = None
+        if compress and mode:
+            encoded = (meshopt.encode_vertex_buffer(rows) if mode == 'ATTRIBUTES' else
+                       meshopt.encode_index_sequence(rows.view(np.uint16 if stride == 2 else np.uint32).ravel()))
+        if encoded is not None and len(encoded) < view['byteLength']:
+            fallback += -fallback % 4
+            view.update(buffer=1, byteOffset=fallback)
+            fallback += view['byteLength']
+            view.setdefault('extensions', {})[MESHOPT] = {
+                'buffer': 0, 'byteOffset': out.append(encoded), 'byteLength': len(encoded),
+                'byteStride': stride, 'count': count, 'mode': mode,
+            }
+        else:
+            view.update(buffer=0, byteOffset=out.append(payload.tobytes() if rows is not None else payload))
+        packed.append(view)
+    gltf['bufferViews'] = packed
+    _remap_views(gltf, {old: new for new, old in enumerate(used)})
+    gltf['buffers'] = [{'byteLength': out.length}]
+    if fallback:
+        gltf['buffers'].append({'byteLength': fallback, 'extensions': {MESHOPT: {'fallback': True}}})
+    if not packed:
+        del gltf['bufferViews'], gltf['buffers']
+    return out.getvalue(), bool(fallback)
+
+
+def _require(gltf, extension):
+    for key in ('extensionsUsed', 'extensionsRequired'):
+        if extension not in gltf.setdefault(key, []):
+            gltf[key].append(extension)
+
+
+def optimize_file(src, dst, position_bits=DEFAULT_POSITION_BITS, compress=True):
+    """Write the optimised copy of src to dst; returns the file's report row."""
+    gltf, data = glb.read(src)
+    row = {'before': os.path.getsize(src)}
+    meshes = gltf.get('meshes', [])
+    reason = _file_problem(gltf)
+    quantized = {}
+    skipped = Counter()
+    errors = {}
+    if not reason:
+        mesh_users = {}
+        refs = Counter()
+        for i, mesh in enumerate(meshes):
+            for prim in mesh.get('primitives', []):
+                for index in [*prim.get('attributes', {}).values(), prim.get('indices')]:
+                    if index is not None:
+                        mesh_users.setdefault(index, set()).add(i)
+                        refs[index] += 1
+        skinned = {n['mesh'] for n in gltf.get('nodes', []) if 'mesh' in n and 'skin' in n}
+        for i, mesh in enumerate(meshes):
+            problem = _mesh_problem(gltf, i, mesh_users, skinned)
+            if problem:
+                skipped[problem] += 1
+            else:
+                quantized[i] = _quantize_mesh(gltf, data, mesh, position_bits, refs, errors)
+        if not quantized:
+            reason = skipped.most_common(1)[0][0] if skipped else 'no meshes'
+
+    if reason:
+        shutil.copyfile(src, dst)
+        row.update(status='copied', reason=reason)
+    else:
+        # Dequantize positions through a child node carrying the grid
+        nodes = gltf.setdefault('nodes', [])
+        for node in list(nodes):
+            if node.get('mesh') in quantized:
+                origin, scale = quantized[node['mesh']]
+                nodes.append({'mesh': node.pop('mesh'), 'translation': origin.tolist(),
+                              'scale': [scale] * 3})
+                node.setdefault('children', []).append(len(nodes) - 1)
+        bin_chunk, compressed = pack(gltf, data, compress)
+        _require(gltf, QUANTIZATION)
+        if compressed:
+            _require(gltf, MESHOPT)
+        glb.write(dst, gltf, bin_chunk)
+        row.update(status='optimized', meshes=len(quantized))
+        for key, name in REPORT_ERRORS:
+            if key in errors:
+                row[name] = errors[key]
+    if skipped:
+        row['meshes_kept'] = dict(skipped)
+    row['after'] = os.path.getsize(dst)
+    return row
@@ -0,0 +1,158 @@
+"""
+Poly Haven furniture models as an asset source.
+
+Models are listed from the public API, downloaded as glTF (the .gltf, its
+.bin and textures at RES, in parallel) into a temporary directory and packed
+into a single .glb with gltf-pipeline (npx). The manifest keeps each model's
+name and categories.
+
+With refresh, stored models are revalidated with a conditional request for
+their /files listing (ETag / Last-Modified); unchanged models transfer
+nothing further.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import time
+
+from . import ROOT, download, metrics, net
+from .sources import UNCHANGED, Item, Source, SourceError, register
+
+API = "https://api.polyhaven.com"
+DL = "https://dl.polyhaven.org/file/ph-assets/Models"
+RES = "1k"  # texture resolution
+FALLBACK_RES = ("2k", "4k", "1k")
+TMP_DIR = os.path.join(ROOT, "_tmp_polyhaven")
+CONVERT_TIMEOUT = 120
+
+
+def fetch_json(url):
+    """
+    Fetch JSON from a URL with retry, revalidating any cached copy.
+    Returns (data, not_modified).
+    """
+    for attempt in range(3):
+        try:
+            body, not_modified = net.fetch_bytes(url, timeout=30)
+            return json.loads(body), not_modified
+        except Exception as e:
+            if attempt == 2:
+                raise
+            print(f"  Retry {attempt+1} for {url}: {e}")
+            metrics.count('http_retries', reason='error')
+            metrics.count('idle_seconds', 2)
+            time.sleep(2)
+
+
+def download_files(items):
+    """Download (url, dest) pairs concurrently, resuming partial files."""
+    todo = [(url, dest) for url, dest in items if not os.path.exists(dest)]
+    for attempt in range(3):
+        failed = []
+        for r in download.download_many(todo):
+            if not r.ok:
+                failed.append((r.url, r.path))
+                print(f"  Retry {attempt+1}: {r.url.rsplit('/', 1)[-1]}: {r.error}")
+        if not failed:
+            return
+        todo = failed
+        metrics.count('download_retries', len(failed))
+        metrics.count('idle_seconds', 2)
+        time.sleep(2)
+    raise SourceError(f"{len(todo)} file(s) failed to download")
+
+
+def list_models(category="furniture"):
+    """[{id, name, categories}] for every model in a Poly Haven category."""
+    data, _ = fetch_json(f"{API}/assets?t=models&c={category}")
+    return [{"id": model_id, "name": info.get("name", model_id),
+             "categories": info.get("categories", [])}
+            for model_id, info in sorted(data.items())]
+
+
+def gltf_files(files_data, res=RES):
+    """
+    (url, relative path) for a model's .gltf and everything it includes, from
+    its /files listing; the .gltf comes first. Empty if there is no glTF.
+    """
+    gltf_data = files_data.get("gltf", {})
+    res_data = gltf_data.get(res, {})
+    if not res_data:
+        # Try other resolutions
+        for fallback_res in FALLBACK_RES:
+            res_data = gltf_data.get(fallback_res, {})
+            if res_data:
+                break
+
+    # The API nests: res_data["gltf"] = { url, size, include: { relative_path: {url, size} } }
+    gltf_entry = res_data.get("gltf", {})
+    main_url = gltf_entry.get("url")
+    if not main_url:
+        return []
+    files = [(main_url, main_url.rsplit("/", 1)[-1])]
+    for rel_path, file_info in gltf_entry.get("include", {}).items():
+        if file_info.get("url"):
+            files.append((file_info["url"], rel_path))
+    return files
+
+
+def convert_to_glb(gltf_file, glb_path):
+    """Pack a .gltf and its files into one .glb with gltf-pipeline."""
+    # shell=True needed on Windows for npx
+    cmd = f'npx gltf-pipeline -i "{gltf_file}" -o "{glb_path}" -b'
+    try:
+        result = subprocess.run(cmd, shell=True, capture_output=True, text=True,
+                                timeout=CONVERT_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise SourceError("gltf-pipeline timed out") from None
+    if result.returncode != 0:
+        raise SourceError(f"gltf-pipeline: {result.stderr[:200]}")
+
+
+@register
+class PolyHavenSource(Source):
+    name = 'polyhaven'
+
+    def __init__(self, root=None, category="furniture", res=RES, tmp_dir=TMP_DIR):
+        super().__init__(root)
+        self.category = category
+        self.res = res
+        self.tmp_dir = str(tmp_dir)
+
+    def enumerate(self):
+        for model in list_models(self.category):
+            yield Item(model["id"], model["id"],
+                       {"name": model["name"], "categories": model["categories"]})
+
+    def resolve(self, item, entry=None):
+        files_data, not_modified = fetch_json(f"{API}/files/{item.id}")
+        if entry and not_modified:
+            return UNCHANGED
+        files = gltf_files(files_data, self.res)
+        if not files:
+            raise SourceError("no glTF files listed")
+        return files
+
+    def fetch(self, item, plan, work):
+        # The glTF tree is large and only converted, so it lives outside public/
+        model_dir = os.path.join(self.tmp_dir, item.id)
+        download_files([(url, os.path.join(model_dir, rel)) for url, rel in plan])
+        return os.path.join(model_dir, plan[0][1])
+
+    def normalize(self, item, fetched):
+        glb_path = os.path.join(self.work_dir, item.id, f"{item.id}.glb")
+        with metrics.span("convert", model=item.id) as s:
+            try:
+                convert_to_glb(fetched, glb_path)
+                s["ok"] = True
+            finally:
+                metrics.count("conversions", result="ok" if s.get("ok") else "failed")
+        shutil.rmtree(os.path.dirname(fetched), ignore_errors=True)
+        return glb_path, {}
+
+    def close(self):
+        # Clean up tmp dir if empty
+        if os.path.isdir(self.tmp_dir) and not os.listdir(self.tmp_dir):
+            os.rmdir(self.tmp_dir)
@@ -0,0 +1,159 @@
+"""
+Adaptive per-host rate limiting shared by every fetcher in a process.
+
+Each host gets a HostLimiter combining:
+
+- a token bucket: at most `rate` requests started per second (bursts of
+  up to one second's worth), and
+- an AIMD concurrency window: at most int(limit) requests in flight. Every
+  healthy response grows the window by 1/limit (about one slot per window's
+  worth of responses) and nudges the rate back up. A 429/503 halves both
+  the window and the rate and pauses the host until its Retry-After has
+  passed (DEFAULT_BACKOFF without one). Other 5xx responses and connection
+  errors halve the window only.
+
+Only one decrease is applied per congestion event: failures of requests that
+started before the last decrease are not counted again.
+
+The requests-based fetchers get this through the session adapter in net.py.
+The Selenium scrapers get it through browser.navigate(). Hosts not listed in
+HOST_LIMITS use DEFAULT_LIMITS.
+"""
+
+import email.utils
+import threading
+import time
+from urllib.parse import urlsplit
+
+# host -> (max requests/sec, max concurrent requests). A host also matches
+# its subdomains unless they have their own entry.
+HOST_LIMITS = {
+    'www.ikea.com': (4, 6),          # product and category pages
+    'web-api.ikea.com': (16, 16),    # dimma GLB assets
+    'api.polyhaven.com': (8, 8),
+    'dl.polyhaven.org': (32, 16),
+}
+DEFAULT_LIMITS = (8, 8)
+
+THROTTLE_STATUS = (429, 503)
+MIN_RATE = 0.2                 # requests/sec floor after repeated backoff
+RATE_STEP = 0.05               # requests/sec regained per healthy response
+DEFAULT_BACKOFF = 5.0          # pause (s) after a 429/503 without Retry-After
+MAX_RETRY_AFTER = 300.0
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), MAX_RETRY_AFTER)
+    try:
+        when = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return min(max(when - time.time(), 0.0), MAX_RETRY_AFTER)
+
+
+class HostLimiter:
+    def __init__(self, host, max_rate, max_concurrency):
+        self.host = host
+        self.max_rate = float(max_rate)
+        self.max_concurrency = max_concurrency
+        self.rate = self.max_rate
+        self.limit = max(1.0, max_concurrency / 2)  # window starts half open
+        self.inflight = 0
+        self.throttled = 0  # 429/503 responses seen
+        self.errors = 0     # other 5xx and connection errors
+        self._tokens = self.rate
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(max(self.rate, 1.0),
+                           self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def acquire(self):
+        """Block until a request may start. Returns a token to pass to release()."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0 and self.inflight < int(self.limit):
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.inflight += 1
+                        return now
+                    wait = (1 - self._tokens) / self.rate
+                self._cond.wait(wait if wait > 0 else None)
+
+    def release(self, started, status=None, retry_after=None):
+        """
+        Report how a request that acquire() admitted ended: its HTTP status,
+        or None if it failed without a response; retry_after is the raw
+        Retry-After header, if any.
+        """
+        delay = parse_retry_after(retry_after)
+        with self._cond:
+            self.inflight -= 1
+            now = time.monotonic()
+            throttled = status in THROTTLE_STATUS
+            if throttled or status is None or status >= 500:
+                if throttled:
+                    self.throttled += 1
+                else:
+                    self.errors += 1
+                pause = delay if delay is not None else DEFAULT_BACKOFF if throttled else 0
+                self._paused_until = max(self._paused_until, now + pause)
+                if started >= self._last_decrease:
+                    self._last_decrease = now
+                    self.limit = max(1.0, self.limit / 2)
+                    if throttled:
+                        self.rate = max(MIN_RATE, self.rate / 2)
+                        self._tokens = min(self._tokens, 0.0)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+                self.rate = min(self.max_rate, self.rate + RATE_STEP)
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return {'rate': round(self.rate, 2), 'limit': round(self.limit, 2),
+                    'inflight': self.inflight, 'throttled': self.throttled,
+                    'errors': self.errors}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limits_for(host):
+    """(max rate, max concurrency) for a host, from its own or a parent domain's entry."""
+    parts = host.split('.')
+    for i in range(len(parts) - 1):
+        limits = HOST_LIMITS.get('.'.join(parts[i:]))
+        if limits:
+            return limits
+    return DEFAULT_LIMITS
+
+
+def limiter_for(url):
+    """The process-wide limiter for url's host."""
+    host = (urlsplit(url).hostname or '').lower()
+    limiter = _limiters.get(host)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(host)
+            if limiter is None:
+                limiter = _limiters[host] = HostLimiter(host, *limits_for(host))
+    return limiter
+
+
+def snapshot():
+    """Current state of every host limiter, keyed by host."""
+    return {host: limiter.snapshot() for host, limiter in sorted(_limiters.items())}
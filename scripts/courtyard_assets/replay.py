@@ -0,0 +1,282 @@
+"""
+Offline record/replay stand-in for the upstream sites.
+
+Setting COURTYARD_BASE_URL (e.g. http://127.0.0.1:8800) points every script
+at a replay server instead of the live hosts: the shared session (net.py)
+and browser.navigate() rewrite
+
+    https://www.ikea.com/us/en/p/...  ->  http://127.0.0.1:8800/www.ikea.com/us/en/p/...
+
+while rate limiting, caching and the crawl state still key on the original
+URL. The server (scripts/replay-server.py) answers from an archive: a SQLite
+index of URL -> status, content type and validators, with bodies in a
+content-addressed BlobStore, so the GLB tiers and texture files shared
+between products are kept once.
+
+In record mode, URLs missing from the archive are fetched from upstream,
+stored (including 404s, so a missing quality tier replays as missing) and
+served. In replay mode they are 404s. Product pages, dimma GLBs, Poly Haven
+/assets and /files JSON and the files they list are all recorded the same
+way, by running the scripts once against a recording server.
+
+Replays can inject latency (+ jitter), random 5xx errors and per-host
+throttling (429 with Retry-After past a request rate), seeded so runs are
+reproducible. HEAD, single byte ranges and If-None-Match are supported, so
+tier probing, resumable downloads and revalidation behave as upstream.
+"""
+
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from . import CACHE_DIR
+from .store import BLOB_DIRNAME, BlobStore
+
+BASE_URL = os.environ.get('COURTYARD_BASE_URL', '').rstrip('/') or None
+
+DEFAULT_ARCHIVE = os.path.join(CACHE_DIR, 'replay')
+DEFAULT_PORT = 8800
+ERROR_STATUSES = (500, 502, 503)
+COPY_CHUNK = 256 * 1024
+
+
+def rewrite(url):
+    """url as served by the replay server at BASE_URL (unchanged when no override is set)."""
+    if not BASE_URL or url.startswith(BASE_URL) or not url.startswith(('http://', 'https://')):
+        return url
+    parts = urlsplit(url)
+    return f"{BASE_URL}/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else '')
+
+
+def upstream_url(path):
+    """Original URL for a replay server request path (/<host>/<path>?<query>), or None."""
+    host, _, rest = path.lstrip('/').partition('/')
+    if '.' not in host:
+        return None
+    return f"https://{host}/{rest}"
+
+
+class Archive:
+    def __init__(self, root=DEFAULT_ARCHIVE):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.blobs = BlobStore(root, ext='', blob_dir=os.path.join(root, BLOB_DIRNAME))
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, 'index.sqlite'), check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS responses
+                             (url TEXT PRIMARY KEY, status INTEGER, content_type TEXT,
+                              etag TEXT, last_modified TEXT, sha256 TEXT, size INTEGER,
+                              recorded_at REAL)''')
+        self.conn.commit()
+
+    def lookup(self, url):
+        """Archived response metadata for url as a dict, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT status, content_type, etag, last_modified, sha256, size '
+                'FROM responses WHERE url=?', (url,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('status', 'content_type', 'etag', 'last_modified', 'sha256', 'size'), row))
+
+    def body_path(self, entry):
+        return self.blobs.blob_path(entry['sha256'])
+
+    def record(self, url, session, timeout=60):
+        """Fetch url from upstream into the archive. Returns its entry."""
+        resp = session.get(url, stream=True, timeout=timeout)
+        with resp:
+            fd, tmp = tempfile.mkstemp(dir=self.blobs.staging_dir)
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in resp.iter_content(COPY_CHUNK):
+                    f.write(chunk)
+            size = os.path.getsize(tmp)
+            sha = self.blobs.add(tmp)
+            entry = {'status': resp.status_code,
+                     'content_type': resp.headers.get('Content-Type'),
+                     # A stable validator even where upstream sends none
+                     'etag': resp.headers.get('ETag') or f'"{sha[:16]}"',
+                     'last_modified': resp.headers.get('Last-Modified'),
+                     'sha256': sha, 'size': size}
+        with self._lock:
+            self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                              (url, entry['status'], entry['content_type'], entry['etag'],
+                               entry['last_modified'], sha, size, time.time()))
+            self.conn.commit()
+        return entry
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class Faults:
+    """Latency, error and throttling injection for a replay server."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle=0.0,
+                 retry_after=None, seed=None):
+        self.latency = latency        # seconds added to every response
+        self.jitter = jitter          # up to this many more, uniformly
+        self.error_rate = error_rate  # share of requests answered with a 5xx
+        self.throttle = throttle      # requests/sec per host before 429s (0: off)
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self._buckets = {}            # host -> (tokens, last refill)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            return self.latency + self.jitter * self.random.random()
+
+    def status(self, host):
+        """Status to fail this request with (and its Retry-After), or (None, None)."""
+        with self._lock:
+            if self.throttle:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(host, (self.throttle, now))
+                tokens = min(self.throttle, tokens + (now - last) * self.throttle)
+                if tokens < 1:
+                    self._buckets[host] = (tokens, now)
+                    wait = self.retry_after or math.ceil((1 - tokens) / self.throttle)
+                    return 429, str(wait)
+                self._buckets[host] = (tokens - 1, now)
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self.random.choice(ERROR_STATUSES), None
+        return None, None
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real hosts
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _send_empty(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _serve(self, send_body):
+        url = upstream_url(self.path)
+        if url is None:
+            return self._send_empty(404)
+        server = self.server
+        time.sleep(server.faults.delay())
+        status, retry_after = server.faults.status(urlsplit(url).hostname)
+        if status:
+            server.count('injected')
+            return self._send_empty(status, [('Retry-After', retry_after)] if retry_after else ())
+
+        entry = server.archive.lookup(url)
+        if entry is None and server.session is not None:
+            try:
+                entry = server.archive.record(url, server.session)
+                server.count('recorded')
+            except Exception as e:
+                self.log_error('record %s: %s', url, e)
+                return self._send_empty(502)
+        if entry is None:
+            server.count('missing')
+            return self._send_empty(404)
+        server.count('served')
+
+        validators = [('ETag', entry['etag'])]
+        if entry['last_modified']:
+            validators.append(('Last-Modified', entry['last_modified']))
+        if entry['status'] == 200 and self.headers.get('If-None-Match') == entry['etag']:
+            return self._send_empty(304, validators)
+
+        start, end = 0, entry['size'] - 1
+        status = entry['status']
+        byte_range = self.headers.get('Range', '')
+        if status == 200 and byte_range.startswith('bytes=') and ',' not in byte_range:
+            first, _, last = byte_range[6:].partition('-')
+            if first.isdigit():
+                start, end = int(first), min(int(last), end) if last.isdigit() else end
+            elif last.isdigit():
+                start = max(0, entry['size'] - int(last))
+            if start > end:
+                return self._send_empty(416, [('Content-Range', f"bytes */{entry['size']}")])
+            status = 206
+
+        self.send_response(status)
+        if entry['content_type']:
+            self.send_header('Content-Type', entry['content_type'])
+        for name, value in validators:
+            self.send_header(name, value)
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{entry['size']}")
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if not send_body:
+            return
+        with open(server.archive.body_path(entry), 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(COPY_CHUNK, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+        server.count('bytes', end - start + 1 - remaining)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, archive, faults=None, session=None, verbose=False):
+        super().__init__(address, ReplayHandler)
+        self.archive = archive
+        self.faults = faults or Faults()
+        self.session = session  # set in record mode: misses are fetched upstream
+        self.verbose = verbose
+        self.stats = {'served': 0, 'recorded': 0, 'missing': 0, 'injected': 0, 'bytes': 0}
+        self._stats_lock = threading.Lock()
+
+    def count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start(archive_dir=DEFAULT_ARCHIVE, host='127.0.0.1', port=0, record=False,
+          faults=None, verbose=False):
+    """
+    Run a replay server on a background thread (port 0 picks a free port).
+    Returns the server; its base_url is what COURTYARD_BASE_URL should be set
+    to. Stop it with shutdown().
+    """
+    global BASE_URL
+    session = None
+    if record:
+        from . import net
+        BASE_URL = None  # fetch upstream itself, not through an override
+        session = net.make_session()
+    server = ReplayServer((host, port), Archive(archive_dir), faults, session, verbose)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
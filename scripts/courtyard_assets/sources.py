@@ -0,0 +1,251 @@
+"""
+Asset source plugins and the pipeline that runs them.
+
+A source turns some upstream catalogue into GLBs under public/models/<name>.
+It implements four steps; everything else (concurrency, skipping what is
+already stored, the blob store, manifest.json, metrics) is done here once
+for every source:
+
+    enumerate()               -> Items to consider (id, ref, meta)
+    resolve(item, entry)      -> a plan for fetching it: URLs, a path, ...;
+                                 None if it can't be had this way (left for
+                                 another run), UNCHANGED if `entry`, the
+                                 stored copy, is still current
+    fetch(item, plan, work)   -> the fetched payload (work is a scratch
+                                 directory for the item, removed once it
+                                 has been ingested)
+    normalize(item, fetched)  -> (path of the final .glb, extra manifest fields)
+
+run() enumerates on the calling thread, runs resolve/fetch/normalize for
+each item on a thread pool (bounded, so a source that enumerates lazily,
+like the IKEA crawl frontier, isn't drained ahead of the workers) and hands
+results to a single writer thread that owns the blob store and manifest,
+the same split as ikea-bulk-scan.py. Ingested models get their bounds,
+triangle and texture summary (glb.inspect()) in the entry's "model" field.
+Items whose manifest entry is already in the blob store are skipped without
+being resolved, unless refresh=True or the source's is_current() says
+otherwise.
+
+Built-in sources (ikea, polyhaven, kenney) are registered by module path and
+imported on first use, so listing them costs nothing. Other modules can add
+sources with @register; COURTYARD_SOURCE_PLUGINS (comma-separated module
+names) imports them for the CLI. The module itself stays light (the CLI's
+verify command imports it); the pipeline's imports happen in run().
+"""
+
+import importlib
+import os
+import queue
+import shutil
+import threading
+from collections import namedtuple
+
+from . import MODELS_DIR
+from .store import blob_dir_for
+
+Item = namedtuple('Item', 'id ref meta', defaults=(None,))
+Outcome = namedtuple('Outcome', 'item status entry error', defaults=(None, None))
+
+UNCHANGED = object()
+GLB_MAGIC = b'glTF'
+DEFAULT_WORKERS = 8
+
+BUILTIN = {
+    'ikea': 'courtyard_assets.ikea:IkeaSource',
+    'polyhaven': 'courtyard_assets.polyhaven:PolyHavenSource',
+    'kenney': 'courtyard_assets.kenney:KenneySource',
+}
+_registry = {}
+
+
+class SourceError(Exception):
+    pass
+
+
+class Source:
+    """Base class for asset sources; see the module docstring for the protocol."""
+
+    name = None
+
+    def __init__(self, root=None):
+        self.root = str(root or os.path.join(MODELS_DIR, self.name))
+        # Per-item scratch space, on the blob store's filesystem so ingesting is a rename
+        self.work_dir = os.path.join(blob_dir_for(self.root), 'staging', 'work')
+
+    @classmethod
+    def from_args(cls, args):
+        """Build the source from the CLI's parsed fetch options."""
+        return cls()
+
+    def enumerate(self):
+        raise NotImplementedError
+
+    def resolve(self, item, entry=None):
+        raise NotImplementedError
+
+    def fetch(self, item, plan, work):
+        raise NotImplementedError
+
+    def normalize(self, item, fetched):
+        """Default: the fetched file is the model, checked to be a GLB."""
+        with open(fetched, 'rb') as f:
+            if f.read(4) != GLB_MAGIC:
+                raise SourceError('not a GLB')
+        return fetched, {}
+
+    def is_current(self, item, entry):
+        """Whether a stored entry can be kept without resolving the item again."""
+        return True
+
+    def record(self, outcome):
+        """Called from the writer thread with every item's Outcome."""
+
+    def close(self):
+        """Called once run() has finished (or failed)."""
+
+
+def register(cls):
+    """Class decorator making a Source available by its name."""
+    _registry[cls.name] = cls
+    return cls
+
+
+def load_plugins(modules=None):
+    """Import plugin modules (default: COURTYARD_SOURCE_PLUGINS) so they can register."""
+    if modules is None:
+        modules = [m for m in os.environ.get('COURTYARD_SOURCE_PLUGINS', '').split(',') if m.strip()]
+    for module in modules:
+        importlib.import_module(module.strip())
+
+
+def names():
+    return sorted(set(BUILTIN) | set(_registry))
+
+
+def get(name):
+    """The Source class registered as name (built-ins are imported here)."""
+    if name not in _registry and name in BUILTIN:
+        module, _, attr = BUILTIN[name].partition(':')
+        _registry[name] = getattr(importlib.import_module(module), attr)
+    try:
+        return _registry[name]
+    except KeyError:
+        raise SourceError(f"unknown source {name!r} (have: {', '.join(names())})") from None
+
+
+def _process(source, item, entry, results, slots):
+    """Worker: resolve, fetch and normalize one item, reporting to the writer."""
+    from . import metrics
+    try:
+        with metrics.span('resolve', source=source.name):
+            plan = source.resolve(item, entry)
+        if plan is UNCHANGED:
+            results.put((Outcome(item, 'unchanged', entry), None, None))
+            return
+        if plan is None:
+            results.put((Outcome(item, 'deferred'), None, None))
+            return
+        work = os.path.join(source.work_dir, item.id)
+        os.makedirs(work, exist_ok=True)
+        with metrics.span('fetch', source=source.name):
+            fetched = source.fetch(item, plan, work)
+        with metrics.span('normalize', source=source.name):
+            path, extra = source.normalize(item, fetched)
+        results.put((Outcome(item, 'ok'), path, extra))
+    except Exception as e:
+        results.put((Outcome(item, 'failed', error=str(e) or type(e).__name__), None, None))
+    finally:
+        slots.release()
+
+
+def _ingest(source, store, manifest, manifest_path, item, path, extra, log):
+    """Store a fetched item's GLB and record it in the manifest. Returns its entry."""
+    from . import glb, metrics
+    from .manifest import save_manifest
+    filename = f"{item.id}.glb"
+    with metrics.span('ingest', source=source.name):
+        entry = store.ingest(path, filename, **{**(item.meta or {}), **extra})
+        try:
+            entry['model'] = glb.inspect(store.blob_path(entry['sha256']))
+        except (OSError, ValueError, KeyError, IndexError, glb.GLBError) as e:
+            log(f"  {item.id}: not inspected ({e})")
+    manifest[item.id] = entry
+    save_manifest(manifest, manifest_path)
+    shutil.rmtree(os.path.join(source.work_dir, item.id), ignore_errors=True)
+    return entry
+
+
+def _writer(source, results, store, manifest, manifest_path, counts, log):
+    from . import metrics
+    while True:
+        result = results.get()
+        if result is None:
+            break
+        outcome, path, extra = result
+        item = outcome.item
+        # An error storing one item fails that item; the writer keeps going
+        # so run() neither loses the rest nor reports a partial run as done
+        try:
+            if outcome.status == 'ok':
+                try:
+                    entry = _ingest(source, store, manifest, manifest_path, item, path, extra, log)
+                except Exception as e:
+                    outcome = outcome._replace(
+                        status='failed', error=f'ingest failed: {e or type(e).__name__}')
+                else:
+                    outcome = outcome._replace(entry=entry)
+                    log(f"  {item.id}: {entry['size'] // 1024}KB")
+            if outcome.status == 'failed':
+                log(f"  {item.id}: failed ({outcome.error})")
+            elif outcome.status == 'unchanged' and item.meta:
+                manifest[item.id].update(item.meta)
+            source.record(outcome)
+        except Exception as e:
+            log(f"  {item.id}: failed ({e or type(e).__name__})")
+            outcome = outcome._replace(status='failed')
+        counts[outcome.status] = counts.get(outcome.status, 0) + 1
+        metrics.count('items', source=source.name, result=outcome.status)
+
+
+def run(source, workers=DEFAULT_WORKERS, refresh=False, limit=0, log=print):
+    """
+    Bring a source's items into its blob store and manifest. Returns
+    {status: items} for stored, ok, unchanged, deferred and failed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from . import metrics
+    from .manifest import load_manifest, save_manifest
+    from .store import BlobStore
+
+    os.makedirs(source.root, exist_ok=True)
+    store = BlobStore(source.root)
+    manifest_path = os.path.join(source.root, 'manifest.json')
+    # Entries from before the blob store are hashed in once
+    manifest = store.index_manifest(load_manifest(manifest_path))
+    counts = {}
+    results = queue.Queue()
+    writer = threading.Thread(target=_writer, name=f'{source.name}-writer',
+                              args=(source, results, store, manifest, manifest_path, counts, log))
+    writer.start()
+    slots = threading.BoundedSemaphore(workers * 2)
+    submitted = 0
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            for item in metrics.timed_iter(source.enumerate(), 'enumerate', source=source.name):
+                # Read-only here; the writer thread owns manifest updates
+                entry = manifest.get(item.id)
+                if store.has_entry(entry) and not refresh and source.is_current(item, entry):
+                    results.put((Outcome(item, 'stored', entry), None, None))
+                    continue
+                if limit and submitted >= limit:
+                    break
+                slots.acquire()
+                pool.submit(_process, source, item, entry if store.has_entry(entry) else None,
+                            results, slots)
+                submitted += 1
+    finally:
+        results.put(None)
+        writer.join()
+        source.close()
+        save_manifest(manifest, manifest_path)
+    return counts
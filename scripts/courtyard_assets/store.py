@@ -0,0 +1,180 @@
+"""
+Content-addressed blob store for downloaded models.
+
+Payloads live once under .asset-cache/blobs/<source>/<sha[:2]>/<sha256><ext>;
+the catalog file the client loads (<root>/<catalog_id>.glb) is a hard link
+to its blob, so colour variants that ship identical bytes share one copy on
+disk. The manifest records each entry's sha256, which turns "already
+downloaded?" into a set lookup against the blob index instead of a stat per
+product.
+
+The store and its staging/ directory are kept out of the served root
+(public/models/<source>), so a frontend build only copies catalog files and
+never a blob twice or a half-written download. Links need the cache on the
+same filesystem as public/ (it is, by default); elsewhere, catalog files are
+copies. Stores from before this layout (<root>/blobs) are moved over the
+first time a BlobStore is opened on that root.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+
+from . import CACHE_DIR
+
+BLOB_DIRNAME = 'blobs'
+HASH_CHUNK = 1024 * 1024
+
+
+def blob_dir_for(root):
+    """The blob store directory for a source's served root (public/models/<source>)."""
+    return os.path.join(CACHE_DIR, BLOB_DIRNAME, os.path.basename(os.path.normpath(root)))
+
+
+def sha256_file(path):
+    """Hash a file on disk."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _link_or_copy(src, dest):
+    """Atomically make dest a hard link to src (a copy where links aren't supported)."""
+    tmp = f"{dest}.tmp"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+class BlobStore:
+    def __init__(self, root, ext='.glb', blob_dir=None):
+        self.root = root
+        self.ext = ext
+        self.blob_dir = blob_dir or blob_dir_for(root)
+        self.staging_dir = os.path.join(self.blob_dir, 'staging')
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._hashes = None
+        self._migrate(os.path.join(root, BLOB_DIRNAME))
+
+    def _migrate(self, old_dir):
+        """Move blobs from a store kept inside root into blob_dir, and drop what's left there."""
+        if os.path.abspath(old_dir) == os.path.abspath(self.blob_dir) or not os.path.isdir(old_dir):
+            return
+        for entry in os.scandir(old_dir):
+            if entry.is_dir() and len(entry.name) == 2:
+                dest_dir = os.path.join(self.blob_dir, entry.name)
+                os.makedirs(dest_dir, exist_ok=True)
+                for f in os.scandir(entry.path):
+                    dest = os.path.join(dest_dir, f.name)
+                    if not os.path.exists(dest):
+                        # A rename on the same filesystem: catalog links stay linked
+                        shutil.move(f.path, dest)
+        # Leftover staging downloads and .part files go with it
+        shutil.rmtree(old_dir)
+
+    @property
+    def hashes(self):
+        """Set of stored hashes, built with one directory walk on first use."""
+        if self._hashes is None:
+            found = set()
+            for entry in os.scandir(self.blob_dir):
+                if entry.is_dir() and len(entry.name) == 2:
+                    found.update(f.name[:-len(self.ext)] for f in os.scandir(entry.path)
+                                 if f.name.endswith(self.ext))
+            self._hashes = found
+        return self._hashes
+
+    def __contains__(self, sha):
+        return sha in self.hashes
+
+    def has_entry(self, entry):
+        """True if a manifest entry's payload is in the store."""
+        return bool(entry) and entry.get('sha256') in self
+
+    def blob_path(self, sha):
+        return os.path.join(self.blob_dir, sha[:2], sha + self.ext)
+
+    def staging_path(self, name):
+        """Where to download a payload before it is hashed into the store."""
+        return os.path.join(self.staging_dir, name)
+
+    def add(self, path, sha=None):
+        """Move a file into the store (dropping it if the blob exists). Returns its hash."""
+        sha = sha or sha256_file(path)
+        blob = self.blob_path(sha)
+        with self._lock:
+            if sha in self.hashes:
+                if os.path.abspath(path) != os.path.abspath(blob):
+                    os.remove(path)
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(path, blob)
+                self.hashes.add(sha)
+        return sha
+
+    def publish(self, sha, filename):
+        """Expose a blob as <root>/<filename>, hard-linked to the stored copy."""
+        dest = os.path.join(self.root, filename)
+        blob = self.blob_path(sha)
+        if not (os.path.exists(dest) and os.path.samefile(dest, blob)):
+            _link_or_copy(blob, dest)
+        return dest
+
+    def ingest(self, path, filename, sha=None, **extra):
+        """Store a downloaded file and publish it. Returns its manifest fields."""
+        sha = self.add(path, sha)
+        self.publish(sha, filename)
+        return {'file': filename, 'sha256': sha,
+                'size': os.path.getsize(self.blob_path(sha)), **extra}
+
+    def adopt(self, filename):
+        """
+        Bring a file that was written straight into <root> under the store,
+        replacing it with a link to the (possibly pre-existing) blob.
+        """
+        path = os.path.join(self.root, filename)
+        sha = sha256_file(path)
+        blob = self.blob_path(sha)
+        with self._lock:
+            if sha not in self.hashes:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                _link_or_copy(path, blob)
+                self.hashes.add(sha)
+        self.publish(sha, filename)
+        return {'file': filename, 'sha256': sha, 'size': os.path.getsize(blob)}
+
+    def index_manifest(self, manifest):
+        """
+        One-time migration: adopt manifest entries recorded before the store
+        existed (no sha256 yet). Entries whose file is missing are dropped.
+        """
+        for cid, entry in list(manifest.items()):
+            if entry.get('sha256') in self:
+                continue
+            if os.path.exists(os.path.join(self.root, entry['file'])):
+                entry.update(self.adopt(entry['file']))
+            else:
+                del manifest[cid]
+        return manifest
+
+    def lookup(self, manifest, cid, filename, min_size=0):
+        """
+        Manifest entry for cid if its payload is already stored, else None.
+        A file left at <root>/<filename> by an older run is adopted once.
+        """
+        entry = manifest.get(cid)
+        if self.has_entry(entry):
+            return entry
+        path = os.path.join(self.root, filename)
+        if os.path.exists(path) and os.path.getsize(path) > min_size:
+            entry = manifest[cid] = self.adopt(filename)
+            return entry
+        return None
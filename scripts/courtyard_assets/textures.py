@@ -0,0 +1,236 @@
+"""
+Embedded texture pass: downscale and recompress the images inside GLBs.
+
+    python -m courtyard_assets textures [SOURCE...]   # over public/models-opt, after optimize
+
+Poly Haven downloads fall back to 2k/4k maps when a model has no 1k set,
+and IKEA models embed whatever the dimma API ships (2048px is common, a few
+are over 4000px, many are PNG). For every image embedded in the BIN chunk:
+
+- it is scaled down with Pillow (Lanczos) so its longer side is at most
+  TEXTURE_MAX for the model's category, halved for each level of detail;
+- it is re-encoded for its use: colour and other data maps as JPEG,
+  normal maps losslessly as PNG, renormalised after scaling so the
+  averaged normals keep unit length. With webp=True both become WebP
+  (lossy, keeping alpha, and lossless), referenced through
+  EXT_texture_webp; images that already are WebP stay WebP. Maps with
+  transparency stay PNG rather than lose their alpha to JPEG.
+
+A re-encoded image is kept if it was scaled down or came out smaller; an
+image already within its limit and in its target format (or a JPEG normal
+map, which lossless encoding would only make bigger) is left alone, so
+running the pass over its own output changes nothing (no generational
+loss from re-encoding JPEGs).
+
+The GLB is repacked without re-serialising anything else: every other
+bufferView, and every EXT_meshopt_compression range, is copied byte for
+byte into the new BIN chunk in its original order; only offsets change.
+"""
+
+import io
+import os
+import shutil
+
+import numpy as np
+from PIL import Image
+
+from . import glb
+from .optimize import MESHOPT
+
+# Longest image side, by manifest category (levels of detail get half per level)
+TEXTURE_MAX = {
+    'living': 1024,
+    'bedroom': 1024,
+    'seating': 1024,
+    'shelves': 1024,
+    'table': 1024,
+    'kitchen': 1024,
+    'office': 1024,
+    'bathroom': 512,
+    'structure': 512,
+    'misc': 256,
+}
+DEFAULT_TEXTURE_MAX = 1024
+MIN_TEXTURE = 64
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+WEBP = 'EXT_texture_webp'
+MIME = {'jpeg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+# Pillow's format names for the ones above
+FORMATS = {'JPEG': 'jpeg', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def max_size_for(category, level=0):
+    """Longest image side for a model of this category at an LOD level (0 = the source)."""
+    return max(MIN_TEXTURE, TEXTURE_MAX.get(category, DEFAULT_TEXTURE_MAX) >> level)
+
+
+def texture_infos(value, key=''):
+    """(property name, textureInfo dict) for every texture a material samples, extensions included."""
+    if isinstance(value, dict):
+        if key.endswith('Texture') and 'index' in value:
+            yield key, value
+        for k, v in value.items():
+            yield from texture_infos(v, k)
+    elif isinstance(value, list):
+        for v in value:
+            yield from texture_infos(v, key)
+
+
+def texture_sources(texture):
+    """Images a texture samples: its core source and any extension's (WebP, KTX2, ...)."""
+    if 'source' in texture:
+        yield texture['source']
+    for ext in texture.get('extensions', {}).values():
+        if isinstance(ext, dict) and 'source' in ext:
+            yield ext['source']
+
+
+def _image_roles(gltf):
+    """(normal map images, PNG/JPEG fallbacks of EXT_texture_webp textures)."""
+    textures = gltf.get('textures', [])
+    normal = set()
+    for material in gltf.get('materials', []):
+        for key, info in texture_infos(material):
+            if 'normal' in key.lower() and info['index'] < len(textures):
+                normal.update(texture_sources(textures[info['index']]))
+    fallback = {t['source'] for t in textures if 'source' in t and WEBP in t.get('extensions', {})}
+    return normal, fallback
+
+
+def _renormalize(image):
+    rgb = np.asarray(image.convert('RGB'), np.float32) / 127.5 - 1.0
+    rgb /= np.maximum(np.linalg.norm(rgb, axis=2, keepdims=True), 1e-6)
+    return Image.fromarray(np.round((rgb + 1.0) * 127.5).clip(0, 255).astype(np.uint8))
+
+
+def _has_alpha(image):
+    if image.mode == 'P':
+        return 'transparency' in image.info
+    return image.mode in ('RGBA', 'LA', 'PA') and image.getextrema()[-1][0] < 255
+
+
+def _encode(image, fmt, lossless):
+    out = io.BytesIO()
+    if fmt == 'jpeg':
+        image = image.convert('L' if image.mode in ('L', 'LA') else 'RGB')
+        image.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+    elif fmt == 'webp':
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+        image.save(out, 'WEBP', lossless=lossless, quality=100 if lossless else WEBP_QUALITY)
+    else:
+        image.save(out, 'PNG', optimize=True)
+    return out.getvalue()
+
+
+def recode(data, max_size, normal=False, webp=False):
+    """
+    One embedded image, resized and re-encoded for its use. Returns
+    (bytes, format, resized), or None if it is already as it should be.
+    Raises OSError (Pillow's UnidentifiedImageError) if it isn't an image.
+    """
+    image = Image.open(io.BytesIO(data))
+    current = FORMATS.get(image.format)
+    resized = max(image.size) > max_size
+    if current == 'webp' or webp:
+        fmt = 'webp'
+    elif normal or (current == 'png' and _has_alpha(image)):
+        fmt = 'png'
+    else:
+        fmt = 'jpeg'
+    # Nothing to gain from re-encoding a lossy normal map losslessly at the same size
+    if not resized and (fmt == current or (normal and current == 'jpeg')):
+        return None
+    image.load()
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+    if resized:
+        scale = max_size / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+        if normal:
+            image = _renormalize(image)
+    return _encode(image, fmt, lossless=normal), fmt, resized
+
+
+def repack(gltf, data, replaced):
+    """
+    The GLB's BIN chunk with the bufferViews in `replaced` ({index: bytes})
+    swapped in and every other range copied as it is; offsets and lengths
+    in gltf are updated to match.
+    """
+    ranges = []  # (offset, length, dict holding them, view index)
+    for index, view in enumerate(gltf.get('bufferViews', [])):
+        if view['buffer'] == 0:
+            ranges.append((view.get('byteOffset', 0), view['byteLength'], view, index))
+        ext = view.get('extensions', {}).get(MESHOPT)
+        if ext and ext['buffer'] == 0:
+            ranges.append((ext.get('byteOffset', 0), ext['byteLength'], ext, None))
+    builder = glb.BinBuilder()
+    placed = {}  # views sharing a range keep sharing it
+    for offset, length, holder, index in sorted(ranges, key=lambda r: r[0]):
+        if index in replaced:
+            key, chunk = ('view', index), replaced[index]
+        else:
+            key, chunk = (offset, length), data[offset:offset + length]
+        if key not in placed:
+            placed[key] = builder.append(chunk)
+        holder['byteOffset'] = placed[key]
+        holder['byteLength'] = len(chunk)
+    gltf['buffers'][0]['byteLength'] = builder.length
+    return builder.getvalue()
+
+
+def _use_webp(gltf, images):
+    """Point the textures sampling these (now WebP) images at them through EXT_texture_webp."""
+    for texture in gltf.get('textures', []):
+        if texture.get('source') in images:
+            texture.setdefault('extensions', {})[WEBP] = {'source': texture.pop('source')}
+    for key in ('extensionsUsed', 'extensionsRequired'):
+        if WEBP not in gltf.setdefault(key, []):
+            gltf[key].append(WEBP)
+
+
+def process_file(src, dst, max_size, webp=False):
+    """Write src with its embedded images resized and recompressed to dst (may be src)."""
+    gltf, data = glb.read(src)
+    row = {'before': os.path.getsize(src), 'max_size': max_size,
+           'images': 0, 'resized': 0, 'recoded': 0, 'unreadable': 0}
+    buffers = gltf.get('buffers', [])
+    normal, fallback = _image_roles(gltf)
+    replaced = {}
+    webp_images = set()
+    for index, image in enumerate(gltf.get('images', [])):
+        if 'bufferView' not in image or not buffers or 'uri' in buffers[0]:
+            continue
+        row['images'] += 1
+        view = gltf['bufferViews'][image['bufferView']]
+        start = view.get('byteOffset', 0)
+        blob = data[start:start + view['byteLength']]
+        try:
+            result = recode(blob, max_size, index in normal, webp and index not in fallback)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            row['unreadable'] += 1
+            continue
+        if result is None:
+            continue
+        encoded, fmt, resized = result
+        if not resized and len(encoded) >= len(blob):
+            continue
+        replaced[image['bufferView']] = encoded
+        image['mimeType'] = MIME[fmt]
+        row['resized' if resized else 'recoded'] += 1
+        if fmt == 'webp':
+            webp_images.add(index)
+
+    if not replaced:
+        if dst != src:
+            shutil.copyfile(src, dst)
+        row.update(status='unchanged', after=row['before'])
+        return row
+    if any(t.get('source') in webp_images for t in gltf.get('textures', [])):
+        _use_webp(gltf, webp_images)
+    glb.write(dst, gltf, repack(gltf, data, replaced))
+    row.update(status='recompressed', after=os.path.getsize(dst))
+    return row
@@ -0,0 +1,163 @@
+"""
+Quality-tier selection for IKEA dimma assets under a byte budget.
+
+A dimma GLB URL names its quality tier in the path (.../iqp3/...). Instead of
+downloading whichever tier the page happened to list, TierResolver probes
+every tier in QUALITY_ORDER with HEAD requests on the pooled session (in
+parallel) and picks the best tier whose size fits:
+
+- the per-model budget (model_budget, overridable per category with
+  model_budgets), and
+- what is left of the category's total budget for this run (category_budgets),
+  if one is set.
+
+If no tier fits the per-model budget, the smallest one is taken and the
+Choice is flagged over_budget. If even that doesn't fit what is left of the
+category's budget, the Choice is flagged exhausted (and over_budget): the
+caller skips the model rather than download it. URLs without a tier, or
+whose tiers can't be probed, are returned unchanged.
+
+A category's budget is only charged for models actually downloaded: resolve()
+reserves the chosen size, so concurrent workers don't overspend, and the
+caller then calls commit(choice) after a successful download or
+release(choice) after a failed one.
+"""
+
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics, net
+from .extract import QUALITY_ORDER, QUALITY_RE
+
+MB = 1024 * 1024
+DEFAULT_MODEL_BUDGET = int(1.5 * MB)
+PROBE_WORKERS = 8
+
+Probe = namedtuple('Probe', 'tier url size')
+Choice = namedtuple('Choice', 'url tier size probes over_budget exhausted category',
+                    defaults=(False, None))
+
+
+def tier_of(url):
+    m = QUALITY_RE.search(url)
+    return m.group(0) if m else None
+
+
+def tier_variants(url):
+    """(tier, url) for every quality tier of a dimma URL, best first."""
+    m = QUALITY_RE.search(url)
+    if not m:
+        return []
+    return [(q, url[:m.start()] + q + url[m.end():]) for q in QUALITY_ORDER]
+
+
+def probe_size(url, session=None, timeout=15):
+    """Size in bytes of the resource at url, or None if it doesn't exist / can't be sized."""
+    session = session or net.get_session()
+    try:
+        resp = session.head(url, timeout=timeout, allow_redirects=True)
+        if resp.status_code == 404:
+            return None
+        if resp.ok and resp.headers.get('Content-Length'):
+            return int(resp.headers['Content-Length'])
+        # HEAD unsupported or unsized: ask for one byte and read the total
+        with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True,
+                         timeout=timeout) as resp:
+            total = resp.headers.get('Content-Range', '').rpartition('/')[2]
+            return int(total) if resp.status_code == 206 and total.isdigit() else None
+    except Exception:
+        return None
+
+
+def parse_budgets(items):
+    """['bedroom=3', 'office=1.5'] (MB) -> {'bedroom': bytes, 'office': bytes}."""
+    budgets = {}
+    for item in items or []:
+        category, _, mb = item.partition('=')
+        budgets[category.strip()] = int(float(mb) * MB)
+    return budgets
+
+
+class TierResolver:
+    def __init__(self, model_budget=DEFAULT_MODEL_BUDGET, model_budgets=None,
+                 category_budgets=None, session=None, workers=PROBE_WORKERS):
+        self.model_budget = model_budget
+        self.model_budgets = model_budgets or {}
+        self.category_budgets = category_budgets or {}
+        self.session = session or net.get_session()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.spent = defaultdict(int)     # bytes downloaded per category so far
+        self.reserved = defaultdict(int)  # bytes chosen but not yet downloaded
+        self._lock = threading.Lock()
+
+    def probe(self, url):
+        """Probe every tier of url in parallel. Returns the existing ones, best first."""
+        variants = tier_variants(url)
+        sizes = self.executor.map(lambda v: probe_size(v[1], self.session), variants)
+        return [Probe(tier, u, size) for (tier, u), size in zip(variants, sizes)
+                if size is not None]
+
+    def _remaining(self, category):
+        """Bytes left of category's budget (None if it has none). Call with the lock held."""
+        if category not in self.category_budgets:
+            return None
+        return self.category_budgets[category] - self.spent[category] - self.reserved[category]
+
+    def limit(self, category=None):
+        """Largest model (bytes) that fits for category right now."""
+        limit = self.model_budgets.get(category, self.model_budget)
+        with self._lock:
+            remaining = self._remaining(category)
+        return limit if remaining is None else min(limit, remaining)
+
+    def resolve(self, url, category=None):
+        """Pick the best tier of url under the budget. Returns a Choice."""
+        with self._lock:
+            remaining = self._remaining(category)
+        if remaining is not None and remaining <= 0:
+            metrics.count('tier_choices', tier=None, exhausted=True)
+            return Choice(url, tier_of(url), None, [], True, True, category)
+        with metrics.span('tier_probe', category=category) as s:
+            probes = self.probe(url)
+            s['tiers'] = len(probes)
+        if not probes:
+            return Choice(url, tier_of(url), None, [], False, False, category)
+        model_limit = self.model_budgets.get(category, self.model_budget)
+        with self._lock:
+            remaining = self._remaining(category)
+            fits = [p for p in probes if p.size <= model_limit
+                    and (remaining is None or p.size <= remaining)]
+            best = fits[0] if fits else min(probes, key=lambda p: p.size)
+            if remaining is not None and best.size > remaining:
+                metrics.count('tier_choices', tier=None, exhausted=True)
+                return Choice(url, tier_of(url), None, probes, True, True, category)
+            if remaining is not None:
+                self.reserved[category] += best.size
+        metrics.count('tier_choices', tier=best.tier, over_budget=not fits)
+        return Choice(best.url, best.tier, best.size, probes, not fits, False, category)
+
+    def commit(self, choice):
+        """Charge a downloaded Choice to its category's budget."""
+        self._settle(choice, charge=True)
+
+    def release(self, choice):
+        """Return a Choice that wasn't downloaded to its category's budget."""
+        self._settle(choice, charge=False)
+
+    def _settle(self, choice, charge):
+        if choice.exhausted or choice.size is None or choice.category not in self.category_budgets:
+            return
+        with self._lock:
+            self.reserved[choice.category] -= choice.size
+            if charge:
+                self.spent[choice.category] += choice.size
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,215 @@
+"""
+Colour-variant merging: models that share their geometry become one GLB
+with every colourway as a KHR_materials_variants variant.
+
+    python -m courtyard_assets variants [SOURCE...]   # -> public/models/<source>/families/
+
+IKEA ships each colourway of a product as its own model, identical but for
+its materials (groensta_chair_indoor_outdoor_gray_turqu / _white, ...).
+geometry_key() hashes what the renderer would draw with materials left
+out: every mesh instance's world matrix and, per primitive, the mode and
+the bytes of its attribute, index and morph target accessors (or its Draco
+bufferView, which is the same bytes for the same mesh, so nothing is
+decoded). Catalog ids that share a blob (byte-identical files, which the
+blob store already keeps once) count as one model; two or more distinct
+models with the same key form a family.
+
+merge() keeps the first member's file as the family's base, BIN chunk and
+all, so its geometry isn't re-serialised, and appends the other members'
+materials with the textures, samplers and images they use. Images are
+shared by content, and materials that come out identical (a colourway
+that only differs in one part) are stored once. Each primitive then maps
+every variant to its material; loaders without KHR_materials_variants
+show the first variant.
+
+The family is named after the members' common catalog id prefix
+(groensta_chair_indoor_outdoor) and each variant after the rest of its
+id (gray_turqu, white). Each member's manifest entry records its family:
+
+    "family": {"id": "groensta_chair_indoor_outdoor", "variant": "white",
+               "file": "families/groensta_chair_indoor_outdoor.glb", "size": ...}
+"""
+
+import hashlib
+import json
+import os
+
+from . import glb
+from .optimize import read_accessor
+from .textures import texture_infos
+
+FAMILIES_DIRNAME = 'families'
+VARIANTS = 'KHR_materials_variants'
+
+
+def family_file(family):
+    return f'{FAMILIES_DIRNAME}/{family}.glb'
+
+
+def geometry_key(path):
+    """Hash of a model's geometry and node layout, materials excluded; None if it has no meshes."""
+    gltf, data = glb.read(path)
+    meshes = gltf.get('meshes', [])
+    views = gltf.get('bufferViews', [])
+    h = hashlib.sha256()
+    found = False
+    for mesh_index, world in glb.mesh_instances(gltf):
+        h.update(repr(world).encode())
+        for prim in meshes[mesh_index].get('primitives', []):
+            found = True
+            h.update(str(prim.get('mode', glb.MODE_TRIANGLES)).encode())
+            draco = prim.get('extensions', {}).get('KHR_draco_mesh_compression')
+            if draco:
+                view = views[draco['bufferView']]
+                start = view.get('byteOffset', 0)
+                h.update(json.dumps(draco['attributes'], sort_keys=True).encode())
+                h.update(data[start:start + view['byteLength']])
+                continue
+            accessors = sorted(prim.get('attributes', {}).items())
+            if 'indices' in prim:
+                accessors.append(('indices', prim['indices']))
+            for i, target in enumerate(prim.get('targets', [])):
+                accessors += [(f'target{i}:{s}', a) for s, a in sorted(target.items())]
+            for name, index in accessors:
+                values = read_accessor(gltf, data, index)
+                h.update(f'{name}:{values.dtype}:{values.shape}'.encode())
+                h.update(values.tobytes())
+    return h.hexdigest() if found else None
+
+
+def name_family(ids):
+    """(family id, {catalog id: variant name}) from the members' common id prefix."""
+    words = [cid.split('_') for cid in ids]
+    common = []
+    for parts in zip(*words):
+        if len(set(parts)) > 1:
+            break
+        common.append(parts[0])
+    family = '_'.join(common) or sorted(ids)[0]
+    return family, {cid: cid[len(family) + 1:] if common and cid != family else cid
+                    for cid in ids}
+
+
+class _Merger:
+    """Appends materials (and what they sample) from other models to a base glTF."""
+
+    def __init__(self, gltf, data):
+        self.gltf = gltf
+        self.builder = glb.BinBuilder()
+        self.builder.append(data)
+        for key in ('materials', 'textures', 'samplers', 'images', 'bufferViews'):
+            gltf.setdefault(key, [])
+        self.seen = {key: {self._key(item): i for i, item in enumerate(gltf[key])}
+                     for key in ('materials', 'textures', 'samplers')}
+        self.images = {}
+        for i, image in enumerate(gltf['images']):
+            self.images.setdefault(self._image_key(image, gltf, data), i)
+
+    @staticmethod
+    def _key(item):
+        return json.dumps(item, sort_keys=True)
+
+    @staticmethod
+    def _image_key(image, gltf, data):
+        if 'bufferView' not in image:
+            return image.get('uri')
+        view = gltf['bufferViews'][image['bufferView']]
+        start = view.get('byteOffset', 0)
+        return hashlib.sha256(data[start:start + view['byteLength']]).hexdigest()
+
+    def _add(self, key, item):
+        """Index of an identical item already in the base, or of item appended."""
+        found = self.seen[key].get(self._key(item))
+        if found is None:
+            found = self.seen[key][self._key(item)] = len(self.gltf[key])
+            self.gltf[key].append(item)
+        return found
+
+    def _image(self, other, data, index):
+        image = dict(other['images'][index])
+        key = self._image_key(image, other, data)
+        if key not in self.images:
+            if 'bufferView' in image:
+                view = other['bufferViews'][image['bufferView']]
+                start = view.get('byteOffset', 0)
+                offset = self.builder.append(data[start:start + view['byteLength']])
+                self.gltf['bufferViews'].append(
+                    {'buffer': 0, 'byteOffset': offset, 'byteLength': view['byteLength']})
+                image['bufferView'] = len(self.gltf['bufferViews']) - 1
+            self.images[key] = len(self.gltf['images'])
+            self.gltf['images'].append(image)
+        return self.images[key]
+
+    def _texture(self, other, data, index):
+        texture = json.loads(json.dumps(other['textures'][index]))
+        if 'sampler' in texture:
+            texture['sampler'] = self._add('samplers', other['samplers'][texture['sampler']])
+        if 'source' in texture:
+            texture['source'] = self._image(other, data, texture['source'])
+        for ext in texture.get('extensions', {}).values():
+            if isinstance(ext, dict) and 'source' in ext:
+                ext['source'] = self._image(other, data, ext['source'])
+        return self._add('textures', texture)
+
+    def material(self, other, data, index):
+        """Base index of another model's material, added if the base has no identical one."""
+        material = json.loads(json.dumps(other['materials'][index]))
+        for _, info in texture_infos(material):
+            info['index'] = self._texture(other, data, info['index'])
+        return self._add('materials', material)
+
+    def bin_chunk(self):
+        self.gltf['buffers'][0]['byteLength'] = self.builder.length
+        return self.builder.getvalue()
+
+
+def merge(members):
+    """
+    One glTF carrying every member's materials as variants. members is
+    [(variant name, path)], all with the same geometry_key(); the first is
+    the base. Returns (glTF, BIN chunk).
+    """
+    (_, base_path), others = members[0], members[1:]
+    gltf, data = glb.read(base_path)
+    merger = _Merger(gltf, data)
+    prims = [prim for mesh_index, _ in glb.mesh_instances(gltf)
+             for prim in gltf['meshes'][mesh_index].get('primitives', [])]
+    # variant -> material per primitive, in mesh instance order
+    materials = [[prim.get('material') for prim in prims]]
+    for _, path in others:
+        other, other_data = glb.read(path)
+        other_prims = [prim for mesh_index, _ in glb.mesh_instances(other)
+                       for prim in other['meshes'][mesh_index].get('primitives', [])]
+        materials.append([None if prim.get('material') is None else
+                          merger.material(other, other_data, prim['material'])
+                          for prim in other_prims])
+        for key in ('extensionsUsed', 'extensionsRequired'):
+            for ext in other.get(key, []):
+                if ext not in gltf.setdefault(key, []):
+                    gltf[key].append(ext)
+
+    for i, prim in enumerate(prims):
+        by_material = {}
+        for variant, chosen in enumerate(materials):
+            if chosen[i] is not None:
+                by_material.setdefault(chosen[i], []).append(variant)
+        if len(by_material) > 1:
+            prim.setdefault('extensions', {})[VARIANTS] = {
+                'mappings': [{'material': m, 'variants': v} for m, v in by_material.items()]}
+    gltf.setdefault('extensions', {})[VARIANTS] = {
+        'variants': [{'name': name} for name, _ in members]}
+    if VARIANTS not in gltf.setdefault('extensionsUsed', []):
+        gltf['extensionsUsed'].append(VARIANTS)
+    for key in ('extensionsUsed', 'extensionsRequired'):
+        if key in gltf and not gltf[key]:
+            del gltf[key]
+    return gltf, merger.bin_chunk()
+
+
+def write_family(root, family, members):
+    """Merge members [(variant, filename)] into root/families/<family>.glb; returns its size."""
+    gltf, bin_chunk = merge([(name, os.path.join(root, filename)) for name, filename in members])
+    path = os.path.join(root, family_file(family))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    glb.write(path, gltf, bin_chunk)
+    return os.path.getsize(path)
@@ -1,30 +1,30 @@
 """
 Download specific IKEA furniture GLB models for the courtyard designer.
-Uses Selenium headless to extract GLB URLs from product pages.
+Reads GLB URLs from the product HTML over plain HTTP, and only launches
+Selenium headless for pages whose static HTML has no model. The best quality
+tier under the default byte budget (courtyard_assets/tiers.py) is downloaded.
 
-Usage: python scripts/download-ikea-models.py
+Usage: python scripts/download-ikea-models.py [--metrics DIR] [--profile]
 """
 
+import argparse
 import os
 import sys
-import json
 import re
-import requests
-from tqdm import tqdm
 from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import TimeoutException
 import logging
 
+from courtyard_assets import browser, crawldb, download, extract, ikea, metrics, tiers
+from courtyard_assets.manifest import load_manifest, save_manifest
+from courtyard_assets.store import BlobStore
+
 logging.getLogger('WDM').setLevel(logging.NOTSET)
 os.environ['WDM_LOG_LEVEL'] = '0'
 
 # Target directory
 OUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'public', 'models', 'ikea')
+# Resource blocking (courtyard_assets.browser.BLOCK_PROFILES); only the XR viewer JSON is read
+BLOCK_PROFILE = 'full'
 os.makedirs(OUT_DIR, exist_ok=True)
 
 # Products to download — mapped to our catalog IDs
@@ -68,7 +68,7 @@ PRODUCTS = [
 ]
 
 
-def get_driver():
+def get_driver(block=BLOCK_PROFILE):
     options = webdriver.ChromeOptions()
     options.add_argument('--headless')
     options.add_argument('--disable-gpu')
@@ -76,84 +76,117 @@ def get_driver():
     options.add_argument('--disable-dev-shm-usage')
     options.add_argument('--log-level=3')
     options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    options.page_load_strategy = 'eager'
+    browser.configure_options(options, block)
 
     original_stderr = sys.stderr
     sys.stderr = open(os.devnull, 'w')
-    try:
-        service = Service(ChromeDriverManager(log_level=0).install())
-    except TypeError:
-        service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
+    # chromedriver path is cached across runs (see courtyard_assets/browser.py)
+    driver = browser.launch_chrome(options)
     sys.stderr = original_stderr
+    browser.apply_blocking(driver, block)
+    browser.install_glb_watch(driver)
     return driver
 
 
 def extract_glb_url(driver, url):
-    """Extract GLB model URL from an IKEA product page."""
-    driver.get(url)
-    try:
-        script_el = WebDriverWait(driver, 8).until(
-            EC.presence_of_element_located((By.ID, 'pip-xr-viewer-model'))
-        )
-        data = json.loads(script_el.get_attribute('innerHTML'))
-        return data.get('url')
-    except TimeoutException:
+    """
+    Extract GLB model URL from an IKEA product page. Raises
+    browser.PageLoadError if the page didn't load (throttled or a server
+    error), so it isn't taken for one without a model.
+    """
+    browser.raise_for_status(browser.navigate(driver, url))
+    # The XR viewer JSON is server-rendered: once the page has loaded without
+    # it there is no model, so don't sit out the full timeout
+    urls = extract.clean(browser.wait_for_glb(driver, timeout=8, until_load=True))
+    if not urls:
         print(f"  No 3D model found")
         return None
-    except json.JSONDecodeError:
-        print(f"  JSON decode error")
-        return None
-
-
-def download_file(url, path):
-    """Download a file with progress bar."""
-    resp = requests.get(url, stream=True)
-    total = int(resp.headers.get('content-length', 0))
-    with open(path, 'wb') as f, tqdm(total=total, unit='B', unit_scale=True, desc=os.path.basename(path)) as bar:
-        for chunk in resp.iter_content(1024):
-            f.write(chunk)
-            bar.update(len(chunk))
+    # Same URL as the other scripts would store: best quality, tracking noise dropped
+    return extract.pick_best(urls)
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Download IKEA models for the courtyard designer')
+    metrics.add_arguments(parser)
+    metrics.setup(parser.parse_args(), 'download-ikea-models')
+
     print(f"Downloading IKEA models to {OUT_DIR}")
     print(f"Products to fetch: {len(PRODUCTS)}\n")
 
-    driver = get_driver()
+    driver = None  # launched on first page the HTTP path can't resolve
     downloaded = 0
     skipped = 0
     failed = 0
 
-    manifest = {}
-
-    try:
-        for catalog_id, url in PRODUCTS:
-            filename = f"{catalog_id}.glb"
-            filepath = os.path.join(OUT_DIR, filename)
-
-            if os.path.exists(filepath) and os.path.getsize(filepath) > 1000:
-                print(f"[skip] {catalog_id} — already exists ({os.path.getsize(filepath)} bytes)")
-                manifest[catalog_id] = filename
-                skipped += 1
-                continue
-
-            print(f"[fetch] {catalog_id} — {url}")
-            glb_url = extract_glb_url(driver, url)
-
-            if glb_url:
-                print(f"  GLB: {glb_url[:80]}...")
-                download_file(glb_url, filepath)
-                manifest[catalog_id] = filename
+    store = BlobStore(OUT_DIR)
+    db = crawldb.CrawlDB()
+    product_urls = {p[0]: p[-1] for p in PRODUCTS}
+    manifest_path = os.path.join(OUT_DIR, 'manifest.json')
+    manifest = store.index_manifest(load_manifest(manifest_path))
+    resolver = tiers.TierResolver()  # best quality tier under the default byte budget
+
+    # Downloads run in the background while the next pages are resolved
+    with download.Downloader(min_size=1000) as dl:
+        try:
+            for catalog_id, url in PRODUCTS:
+                filename = f"{catalog_id}.glb"
+
+                entry = store.lookup(manifest, catalog_id, filename, min_size=1000)
+                if entry:
+                    print(f"[skip] {catalog_id} — already stored ({entry['size']} bytes)")
+                    metrics.count('skipped', reason='stored')
+                    db.finish(url, crawldb.DONE, catalog_id=catalog_id, source='download-ikea-models')
+                    skipped += 1
+                    continue
+
+                if db.known_no3d(url):
+                    print(f"[no3d] {catalog_id} (cached)")
+                    metrics.count('skipped', reason='no3d_cached')
+                    failed += 1
+                    continue
+
+                print(f"[fetch] {catalog_id} — {url}")
+                glb_url = ikea.find_glb_url(url)
+                if not glb_url:
+                    try:
+                        driver = driver or get_driver()
+                        glb_url = extract_glb_url(driver, url)
+                    except Exception as e:
+                        # Retried next run; keep going so this run's downloads are stored
+                        error = f'page load failed: {e}'.splitlines()[0]
+                        print(f"  {error}")
+                        db.finish(url, crawldb.FAILED, error=error, catalog_id=catalog_id,
+                                  source='download-ikea-models')
+                        failed += 1
+                        continue
+
+                if glb_url:
+                    glb_url = resolver.resolve(glb_url).url
+                    print(f"  GLB: {glb_url[:80]}...")
+                    dl.submit(glb_url, store.staging_path(filename), key=catalog_id)
+                else:
+                    db.finish(url, crawldb.NO3D, catalog_id=catalog_id, source='download-ikea-models')
+                    failed += 1
+        finally:
+            if driver:
+                driver.quit()
+            resolver.close()
+
+        for r in dl.results():
+            if r.ok:
+                print(f"[done] {r.key} ({r.size // 1024}KB{', resumed' if r.resumed else ''})")
+                manifest[r.key] = store.ingest(r.path, f"{r.key}.glb", r.sha256, url=r.url,
+                                               tier=tiers.tier_of(r.url))
+                db.finish(product_urls[r.key], crawldb.DONE, glb_url=r.url, catalog_id=r.key, source='download-ikea-models')
                 downloaded += 1
             else:
+                print(f"[fail] {r.key} — {r.error}")
+                db.finish(product_urls[r.key], crawldb.FAILED, glb_url=r.url, error=r.error, source='download-ikea-models')
                 failed += 1
-    finally:
-        driver.quit()
 
-    # Write manifest
-    manifest_path = os.path.join(OUT_DIR, 'manifest.json')
-    with open(manifest_path, 'w') as f:
-        json.dump(manifest, f, indent=2)
+    save_manifest(manifest, manifest_path)
+    db.close()
 
     print(f"\n{'='*50}")
     print(f"Done! Downloaded: {downloaded}, Skipped: {skipped}, Failed: {failed}")
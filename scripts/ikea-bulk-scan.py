@@ -3,59 +3,76 @@ Bulk scan IKEA US product pages to find which ones have 3D models.
 Checks page source for dimma/GLB URLs - much faster than clicking 3D buttons.
 Then downloads all found models.
 
-Usage: python scripts/ikea-bulk-scan.py
+Categories are enumerated in full from IKEA's paginated listing data (no
+browser, no scrolling); --max-per-category caps them if wanted. With
+--sitemap, products are streamed from the site's sitemap index instead
+(gzip and nested indexes handled, constant memory), filtered by --locale and
+optional --types slug patterns. scripts/fixtures/sitemap/sitemap.xml is a
+local fixture index for trying it offline; --discover-only just fills the
+frontier.
+
+Product HTML is fetched over plain HTTP first; a browser is only used for
+pages whose static HTML has no model.
+Product URLs go into the shared crawl frontier (.asset-cache/crawl.sqlite);
+a pool of workers claims them from there, so an interrupted scan resumes
+where it stopped. A single writer thread owns manifest.json, the frontier
+results and the content-addressed blob store (.asset-cache/blobs/ikea).
+
+Products found to have no 3D model are remembered by article number and not
+loaded again until the negative cache expires (--no3d-ttl), apart from a small
+random share (--recheck-rate) that is rechecked anyway.
+
+Browsers skip images, fonts, media and trackers; product pages also skip CSS
+(--block none|light|full picks the product-page profile).
+
+Workers share per-host adaptive rate limits (courtyard_assets/ratelimit.py)
+for both HTTP requests and browser page loads: 429/5xx responses and
+Retry-After back a host off, and healthy responses let it ramp back up.
+
+Every quality tier of a found model is probed with HEAD requests and the best
+one under the byte budget is downloaded (--model-budget MB per model,
+--category-budget CAT=MB for the run's total per category, see
+courtyard_assets/ikea.py CATEGORY_MAP); the tier is recorded in the manifest.
+A category's budget is charged for completed downloads only; once it is used
+up, its remaining models are left (as failed) for the next run.
+
+Selenium is imported only when a worker first needs a browser, so
+--discover-only and fully HTTP-resolved runs don't load it. For discovery,
+static fetches and manifest checks without a scan, see
+`python -m courtyard_assets` (courtyard_assets/cli.py).
+
+Usage: python scripts/ikea-bulk-scan.py [--workers N] [--max-per-category N]
+                                        [--no3d-ttl DAYS] [--recheck-rate P]
+                                        [--block PROFILE] [--sitemap [SOURCE]]
+                                        [--locale CC/LL] [--types PATTERN ...]
+                                        [--discover-only] [--model-budget MB]
+                                        [--category-budget CAT=MB ...]
 """
 
-import os, sys, json, re, time, requests
-from tqdm import tqdm
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-from webdriver_manager.chrome import ChromeDriverManager
+import os, sys, time, queue, argparse, threading
+import hashlib
 import logging
 
+from courtyard_assets import browser, crawldb, download, extract, ikea, metrics, tiers
+from courtyard_assets.manifest import load_manifest, save_manifest
+from courtyard_assets.store import BlobStore
+
 logging.getLogger('WDM').setLevel(logging.NOTSET)
 os.environ['WDM_LOG_LEVEL'] = '0'
 
 OUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'public', 'models', 'ikea')
 os.makedirs(OUT_DIR, exist_ok=True)
 
-# Category URLs to scan for products
-CATEGORY_URLS = [
-    'https://www.ikea.com/us/en/cat/sofas-fu003/',
-    'https://www.ikea.com/us/en/cat/armchairs-fu006/',
-    'https://www.ikea.com/us/en/cat/coffee-side-tables-10705/',
-    'https://www.ikea.com/us/en/cat/tv-media-furniture-10475/',
-    'https://www.ikea.com/us/en/cat/bookcases-shelving-units-st002/',
-    'https://www.ikea.com/us/en/cat/beds-bm003/',
-    'https://www.ikea.com/us/en/cat/wardrobes-19053/',
-    'https://www.ikea.com/us/en/cat/chests-of-drawers-20656/',
-    'https://www.ikea.com/us/en/cat/desks-computer-desks-20649/',
-    'https://www.ikea.com/us/en/cat/dining-tables-21825/',
-    'https://www.ikea.com/us/en/cat/dining-chairs-25219/',
-    'https://www.ikea.com/us/en/cat/office-chairs-20652/',
-    'https://www.ikea.com/us/en/cat/floor-lamps-10731/',
-    'https://www.ikea.com/us/en/cat/table-lamps-desk-lamps-10732/',
-    'https://www.ikea.com/us/en/cat/rugs-10653/',
-    'https://www.ikea.com/us/en/cat/kitchen-islands-carts-24264/',
-    'https://www.ikea.com/us/en/cat/nightstands-20656/',
-    'https://www.ikea.com/us/en/cat/bathroom-vanities-20724/',
-]
-
-# Mapping: extract a catalog_id from product name
-CATEGORY_MAP = {
-    'sofa': 'living', 'armchair': 'living', 'coffee': 'living', 'side-table': 'living',
-    'tv': 'living', 'bookcase': 'living', 'shelf': 'living', 'bed': 'bedroom',
-    'wardrobe': 'bedroom', 'drawer': 'bedroom', 'nightstand': 'bedroom',
-    'desk': 'office', 'dining': 'kitchen', 'chair': 'kitchen', 'office-chair': 'office',
-    'lamp': 'living', 'rug': 'living', 'kitchen': 'kitchen', 'vanit': 'bathroom',
-}
-
-
-def get_driver():
+PRODUCT_LINK_SELECTOR = 'a[href*="/p/"]'
+
+# Resource blocking (courtyard_assets.browser.BLOCK_PROFILES). Category pages
+# keep CSS for scroll-to-load; product pages are only read, so drop it there.
+CATEGORY_BLOCK_PROFILE = 'light'
+BLOCK_PROFILE = 'full'
+
+
+def get_driver(block=BLOCK_PROFILE):
+    from selenium import webdriver
     options = webdriver.ChromeOptions()
     options.add_argument('--headless=new')
     options.add_argument('--disable-gpu')
@@ -63,32 +80,37 @@ def get_driver():
     options.add_argument('--disable-dev-shm-usage')
     options.add_argument('--log-level=3')
     options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    # Return from driver.get() at DOMContentLoaded; readiness is event-driven
+    options.page_load_strategy = 'eager'
+    browser.configure_options(options, block)
 
     original_stderr = sys.stderr
     sys.stderr = open(os.devnull, 'w')
-    try:
-        service = Service(ChromeDriverManager(log_level=0).install())
-    except TypeError:
-        service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
+    # chromedriver path is cached across runs (see courtyard_assets/browser.py)
+    driver = browser.launch_chrome(options)
     sys.stderr = original_stderr
+    browser.apply_blocking(driver, block)
+    browser.install_glb_watch(driver)
     return driver
 
 
-def get_product_links(driver, category_url, max_products=30):
-    """Get product links from an IKEA category page."""
+def get_product_links(session, category_url, max_products=None):
+    """Get product links from a rendered IKEA category page (first few screens only)."""
     try:
-        driver.get(category_url)
-        time.sleep(3)
+        driver = session.open(category_url)
+        count = browser.wait_for_count(driver, PRODUCT_LINK_SELECTOR, 1, timeout=10)
 
-        # Scroll down to load more products
+        # Scroll down to load more products; each wait ends when new tiles arrive
         for _ in range(3):
             driver.execute_script("window.scrollBy(0, 2000)")
-            time.sleep(1)
+            new_count = browser.wait_for_count(driver, PRODUCT_LINK_SELECTOR, count + 1, timeout=2)
+            if new_count <= count:
+                break
+            count = new_count
 
+        from selenium.webdriver.common.by import By
         links = set()
-        for el in driver.find_elements(By.CSS_SELECTOR, 'a[href*="/p/"]'):
+        for el in driver.find_elements(By.CSS_SELECTOR, PRODUCT_LINK_SELECTOR):
             href = el.get_attribute('href')
             if href and '/p/' in href and href.endswith('/'):
                 links.add(href)
@@ -99,189 +121,323 @@ def get_product_links(driver, category_url, max_products=30):
         return []
 
 
-def check_for_3d_model(driver, product_url):
-    """Quick check if a product page has a 3D model. Returns GLB URL or None."""
-    try:
-        driver.get(product_url)
-        time.sleep(2)
-
-        # Check page source for dimma/GLB URLs
-        src = driver.page_source
-
-        # Method 1: dimma API pattern
-        matches = re.findall(
-            r'https://web-api\.ikea\.com/dimma/assets/[^"\'\s<>]+\.glb[^"\'\s<>]*',
-            src
-        )
-
-        # Method 2: Any GLB URL
-        if not matches:
-            matches = re.findall(r'https://[^"\'\s<>]*\.glb(?:\?[^"\'\s<>]*)?', src)
-
-        # Method 3: Check #pip-xr-viewer-model
-        if not matches:
-            try:
-                script_el = driver.find_element(By.ID, 'pip-xr-viewer-model')
-                data = json.loads(script_el.get_attribute('innerHTML'))
-                if data.get('url'):
-                    matches = [data['url']]
-            except:
-                pass
-
-        # Method 4: model-viewer element
-        if not matches:
-            try:
-                mvs = driver.find_elements(By.CSS_SELECTOR, 'model-viewer')
-                for mv in mvs:
-                    s = mv.get_attribute('src')
-                    if s and '.glb' in s.lower():
-                        matches.append(s)
-            except:
-                pass
-
-        if matches:
-            # Clean and deduplicate
-            clean = []
-            for m in matches:
-                m = m.split('"')[0].split("'")[0].split('<')[0].split(' ')[0]
-                if '.glb' in m.lower() and m not in clean:
-                    clean.append(m)
-
-            # Prefer highest quality
-            for q in ['iqp3', 'rqp3', 'iqp2', 'rqp2', 'iqp1']:
-                for u in clean:
-                    if q in u:
-                        return u
-            return clean[0] if clean else None
-
-    except Exception as e:
-        pass
-
-    return None
+def iter_category_links(category_url, session, max_products=None):
+    """
+    Stream a category's product URLs from its listing data (the whole
+    category, no browser). The rendered page is only scrolled when the
+    listing data yields nothing.
+    """
+    found = 0
+    for purl in ikea.iter_category_products(category_url):
+        yield purl
+        found += 1
+        if found == max_products:
+            return
+    if not found:
+        print("  Listing data unavailable, scrolling the category page")
+        yield from get_product_links(session, category_url, max_products)
+
+
+def staging_name(product_url):
+    """
+    Staging filename for a product's download. Catalog ids are cut to 40
+    characters and only deduped within one discovery pass, so two products
+    resumed from the frontier can share one; the URL is unique per row.
+    """
+    return hashlib.sha256(product_url.encode()).hexdigest()[:24] + '.glb'
+
+
+def check_for_3d_model(session, product_url):
+    """
+    Quick check if a product page has a 3D model, loaded in the session's
+    browser (a browser.DriverSession). Returns GLB URL or None once the page
+    has loaded; launch and browser errors propagate, and a page still
+    throttled or failing server-side raises PageLoadError, so they aren't
+    taken for a product without a model.
+    """
+    driver = session.open(product_url)
+    browser.raise_for_status(session.status)
+
+    # Method 1: GLB declared or requested while the page loads (returns at
+    # the first GLB or the load event, whichever comes first)
+    matches = extract.clean(browser.wait_for_glb(driver, timeout=8, until_load=True))
+
+    # Method 2: one pass over the rendered page source (XR viewer JSON,
+    # dimma URLs, <model-viewer src>, any other GLB URL)
+    if not matches:
+        matches = extract.glb_urls(driver.page_source)
+
+    # Prefer highest quality
+    return extract.pick_best(matches)
+
+
+def scan_worker(db, crawl_done, results, store, resolver, block=BLOCK_PROFILE):
+    """
+    Worker thread: claims products from the frontier, launching Chrome on
+    demand. A browser that crashes is relaunched; a product whose page
+    couldn't be loaded (or Chrome launched) is marked failed, and the next
+    product tries again.
+    """
+    session = browser.DriverSession(lambda: get_driver(block))
 
-
-def extract_product_name(url):
-    """Extract a clean product name from IKEA URL."""
-    # e.g. https://www.ikea.com/us/en/p/kallax-shelf-unit-white-80275887/
-    parts = url.rstrip('/').split('/')
-    slug = parts[-1] if parts else 'unknown'
-    # Remove article number at the end
-    slug = re.sub(r'-[a-z]?\d{7,}$', '', slug)
-    return slug
-
-
-def make_catalog_id(product_name):
-    """Create a filesystem-safe catalog ID."""
-    # Convert slug to underscore format
-    cid = product_name.replace('-', '_')
-    # Limit length
-    return cid[:40]
-
-
-def download_file(url, path):
     try:
-        resp = requests.get(url, stream=True, timeout=30, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        resp.raise_for_status()
-        total = int(resp.headers.get('content-length', 0))
-        with open(path, 'wb') as f, tqdm(total=total, unit='B', unit_scale=True,
-                                          desc=os.path.basename(path)) as bar:
-            for chunk in resp.iter_content(8192):
-                f.write(chunk)
-                bar.update(len(chunk))
-        return True
-    except Exception as e:
-        print(f"    Download error: {e}")
-        return False
+        while True:
+            # Read the flag before claiming so work added just before it was set isn't missed
+            done = crawl_done.is_set()
+            claimed = db.claim()
+            if not claimed:
+                if done:
+                    break
+                time.sleep(0.5)
+                metrics.count('idle_seconds', 0.5)
+                continue
+            with metrics.span('product') as span:
+                purl = claimed[0]
+                pname = ikea.product_slug(purl)
+                catalog_id = ikea.catalog_id(pname)
+
+                glb_url = ikea.find_glb_url(purl)
+                error = None
+                if not glb_url:
+                    try:
+                        glb_url = check_for_3d_model(session, purl)
+                    except Exception as e:
+                        error = f'page load failed: {e}'.splitlines()[0]
+
+                if not glb_url:
+                    status = 'failed' if error else 'no3d'
+                    span['result'] = status
+                    results.put((status, pname, catalog_id, purl, None, 0, None, error))
+                    continue
+
+                choice = resolver.resolve(glb_url, ikea.category_of(pname))
+                if choice.exhausted:
+                    # Left for a later run (failures are retried at startup)
+                    span['result'] = 'failed'
+                    results.put(('failed', pname, catalog_id, purl, glb_url, 0, None,
+                                 'category budget used up'))
+                    continue
+                if choice.over_budget:
+                    print(f"    {pname[:40]}: smallest tier {choice.tier} ({choice.size // 1024}KB) is over budget")
+                glb_url = choice.url
+                r = download.fetch(glb_url, store.staging_path(staging_name(purl)), min_size=1000)
+                span.update(result='downloaded' if r.ok else 'failed', bytes=r.size, tier=choice.tier)
+                if r.ok:
+                    resolver.commit(choice)
+                    results.put(('downloaded', pname, catalog_id, purl, glb_url, r.size, r.sha256, None))
+                else:
+                    resolver.release(choice)
+                    results.put(('failed', pname, catalog_id, purl, glb_url, 0, None, 'download failed'))
+    finally:
+        session.close()
+
+
+def record_result(result, manifest, manifest_path, store, db, stats):
+    """Apply one worker result to the manifest, the blob store and the frontier."""
+    status, pname, catalog_id, purl, glb_url, sz, sha, error = result
+    filename = f"{catalog_id}.glb"
+    stats['checked'] += 1
+    n = stats['checked']
+
+    if status in ('skip', 'adopt'):
+        if status == 'adopt':
+            # File written by a run from before the blob store
+            manifest[catalog_id] = store.adopt(filename)
+        stats['skipped'] += 1
+        db.finish(purl, crawldb.DONE, catalog_id=catalog_id)
+        print(f"  [skip] {pname} ({sz // 1024}KB)")
+        return
+
+    if status == 'downloaded':
+        with metrics.span('ingest'):
+            manifest[catalog_id] = store.ingest(store.staging_path(staging_name(purl)), filename, sha,
+                                                url=glb_url, tier=tiers.tier_of(glb_url))
+        stats['found'].append((pname, purl, glb_url))
+        stats['downloaded'] += 1
+        print(f"  [{n}] {pname[:40]}... 3D FOUND!")
+        print(f"    GLB: {glb_url[:100]}")
+        if manifest[catalog_id]['tier']:
+            print(f"    Tier: {manifest[catalog_id]['tier']}")
+        print(f"    Saved: {catalog_id}.glb ({sz // 1024}KB)")
+        save_manifest(manifest, manifest_path)
+        db.finish(purl, crawldb.DONE, glb_url=glb_url, catalog_id=catalog_id)
+    elif status == 'failed':
+        stats['failed'] += 1
+        print(f"  [{n}] {pname[:40]}... failed ({error})")
+        db.finish(purl, crawldb.FAILED, glb_url=glb_url, error=error)
+    else:
+        # Only reached for a page that loaded without a model
+        print(f"  [{n}] {pname[:40]}... no 3D")
+        db.finish(purl, crawldb.NO3D)
+
+
+def manifest_writer(results, manifest, manifest_path, store, db, stats):
+    """Single writer thread: the only place manifest.json, the blob store and frontier results are updated."""
+    while True:
+        result = results.get()
+        if result is None:
+            break
+        try:
+            record_result(result, manifest, manifest_path, store, db, stats)
+        except Exception as e:
+            # One product that can't be stored fails alone; the writer keeps
+            # draining, or every later result would be lost
+            error = f'store failed: {e or type(e).__name__}'.splitlines()[0]
+            stats['failed'] += 1
+            print(f"  {result[1][:40]}... failed ({error})")
+            db.finish(result[3], crawldb.FAILED, glb_url=result[4], error=error)
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Bulk scan IKEA categories for 3D models')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4,
+                        help='number of headless Chrome workers (default: CPU count)')
+    parser.add_argument('--max-per-category', type=int, default=0,
+                        help='product links to take from each category (default: all)')
+    parser.add_argument('--no3d-ttl', type=float, default=crawldb.NO3D_TTL / 86400,
+                        help='days a "no 3D model" result is trusted before rechecking')
+    parser.add_argument('--recheck-rate', type=float, default=crawldb.RECHECK_RATE,
+                        help='fraction of cached "no 3D" products rechecked anyway')
+    parser.add_argument('--block', choices=sorted(browser.BLOCK_PROFILES), default=BLOCK_PROFILE,
+                        help=f'resource blocking profile for product pages (default: {BLOCK_PROFILE})')
+    parser.add_argument('--sitemap', nargs='?', const=ikea.SITEMAP_INDEX, metavar='SOURCE',
+                        help='discover products from a sitemap or sitemap index (URL or local '
+                             '.xml/.xml.gz path; default: IKEA\'s) instead of the category list')
+    parser.add_argument('--locale', default=ikea.DEFAULT_LOCALE,
+                        help=f'sitemap locale as country/lang (default: {ikea.DEFAULT_LOCALE})')
+    parser.add_argument('--types', nargs='+', metavar='PATTERN',
+                        help='only sitemap products whose URL slug matches one of these regexes')
+    parser.add_argument('--discover-only', action='store_true',
+                        help='only feed the crawl frontier; products are scanned by a later run')
+    parser.add_argument('--model-budget', type=float, default=tiers.DEFAULT_MODEL_BUDGET / tiers.MB,
+                        metavar='MB', help='largest quality tier to download per model, in MB')
+    parser.add_argument('--category-budget', action='append', metavar='CAT=MB',
+                        help='total MB to download for a category this run (repeatable)')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.setup(args, 'ikea-bulk-scan')
+    workers = 0 if args.discover_only else max(1, args.workers)
+
     print("IKEA Bulk 3D Model Scanner")
-    print(f"Categories to scan: {len(CATEGORY_URLS)}")
+    if args.sitemap:
+        print(f"Sitemap: {args.sitemap} ({args.locale})")
+    else:
+        print(f"Categories to scan: {len(ikea.CATEGORY_URLS)}")
+    print(f"Workers: {workers}")
     print(f"Output: {OUT_DIR}\n")
 
-    driver = get_driver()
-
-    # Load existing manifest
+    # Load existing manifest, hashing entries recorded before the blob store
+    store = BlobStore(OUT_DIR)
     manifest_path = os.path.join(OUT_DIR, 'manifest.json')
-    manifest = {}
-    if os.path.exists(manifest_path):
-        with open(manifest_path) as f:
-            manifest = json.load(f)
-
-    found_3d = []  # (product_name, url, glb_url)
-    all_checked = 0
-    downloaded = 0
-    skipped = 0
-
-    try:
-        for cat_url in CATEGORY_URLS:
+    manifest = store.index_manifest(load_manifest(manifest_path))
+
+    # Resume: requeue work a crashed run left in flight, and retry its failures
+    db = crawldb.CrawlDB(no3d_ttl=args.no3d_ttl * 86400, recheck_rate=args.recheck_rate)
+    recovered = db.recover() + db.requeue(crawldb.FAILED)
+    pending = db.counts().get(crawldb.PENDING, 0)
+    if pending:
+        print(f"Resuming {pending} pending products ({recovered} recovered)\n")
+
+    stats = {'checked': 0, 'downloaded': 0, 'skipped': 0, 'failed': 0, 'cached_no3d': 0,
+             'found': []}
+    crawl_done = threading.Event()
+    results = queue.Queue()
+
+    resolver = tiers.TierResolver(int(args.model_budget * tiers.MB),
+                                  category_budgets=tiers.parse_budgets(args.category_budget))
+    writer = threading.Thread(target=manifest_writer,
+                              args=(results, manifest, manifest_path, store, db, stats))
+    writer.start()
+    pool = [threading.Thread(target=scan_worker, args=(db, crawl_done, results, store, resolver, args.block), daemon=True)
+            for _ in range(workers)]
+    for t in pool:
+        t.start()
+
+    # Only launched if a category's listing data can't be read
+    category_session = browser.DriverSession(lambda: get_driver(CATEGORY_BLOCK_PROFILE))
+    queued = set()
+
+    def enqueue(links, cat_name):
+        # Finished products are ignored by the frontier; expired negatives are revisited
+        db.add(links, source=cat_name, catalog_ids=links)
+        db.revisit(links)
+        links.clear()
+
+    def discovery_sources():
+        """(source name, product URL stream) pairs: the sitemap, or each category."""
+        if args.sitemap:
+            yield 'sitemap', ikea.iter_sitemap_products(args.locale, args.types, args.sitemap)
+            return
+        for cat_url in ikea.CATEGORY_URLS:
             cat_name = cat_url.rstrip('/').split('/')[-1]
             print(f"\n{'='*50}")
             print(f"Category: {cat_name}")
+            yield cat_name, iter_category_links(cat_url, category_session,
+                                                args.max_per_category or None)
 
-            product_links = get_product_links(driver, cat_url, max_products=20)
-            print(f"  Found {len(product_links)} product links")
-
-            for purl in product_links:
-                pname = extract_product_name(purl)
-                catalog_id = make_catalog_id(pname)
-                filename = f"{catalog_id}.glb"
-                filepath = os.path.join(OUT_DIR, filename)
-
-                # Skip if already downloaded
+    try:
+        for source_name, links in discovery_sources():
+            # Streamed: workers start on the first batch while the rest is fetched
+            found = 0
+            new_links = {}
+            for purl in metrics.timed_iter(links, 'discover', source=source_name):
+                found += 1
+                if len(new_links) >= ikea.PAGE_SIZE:
+                    enqueue(new_links, source_name)
+                pname = ikea.product_slug(purl)
+                catalog_id = ikea.catalog_id(pname)
+                if catalog_id in queued:
+                    metrics.count('skipped', reason='duplicate')
+                    continue
+                queued.add(catalog_id)
+
+                # Skip if already in the blob store (manifest is only read here;
+                # the writer thread owns all updates)
+                entry = manifest.get(catalog_id)
+                if store.has_entry(entry):
+                    metrics.count('skipped', reason='stored')
+                    results.put(('skip', pname, catalog_id, purl, None, entry['size'], None, None))
+                    continue
+                filepath = os.path.join(OUT_DIR, f"{catalog_id}.glb")
                 if os.path.exists(filepath) and os.path.getsize(filepath) > 5000:
-                    sz = os.path.getsize(filepath) // 1024
-                    print(f"  [skip] {pname} ({sz}KB)")
-                    manifest[catalog_id] = filename
-                    skipped += 1
-                    all_checked += 1
+                    metrics.count('skipped', reason='adopted')
+                    results.put(('adopt', pname, catalog_id, purl, None, os.path.getsize(filepath), None, None))
                     continue
 
-                all_checked += 1
-                sys.stdout.write(f"  [{all_checked}] {pname[:40]}...")
-                sys.stdout.flush()
-
-                glb_url = check_for_3d_model(driver, purl)
-
-                if glb_url:
-                    print(f" 3D FOUND!")
-                    print(f"    GLB: {glb_url[:100]}")
-
-                    if download_file(glb_url, filepath):
-                        sz = os.path.getsize(filepath)
-                        if sz > 1000:
-                            manifest[catalog_id] = filename
-                            found_3d.append((pname, purl, glb_url))
-                            downloaded += 1
-                            print(f"    Saved: {filename} ({sz // 1024}KB)")
-                        else:
-                            os.remove(filepath)
-                            print(f"    Too small, removed")
-                    else:
-                        print(f"    Download failed")
-                else:
-                    print(f" no 3D")
+                # Negative cache: no page load for products known to have no 3D model
+                if db.known_no3d(purl):
+                    stats['cached_no3d'] += 1
+                    metrics.count('skipped', reason='no3d_cached')
+                    continue
+
+                new_links[purl] = catalog_id
+
+            enqueue(new_links, source_name)
+            print(f"  Found {found} product links")
 
     finally:
-        driver.quit()
+        category_session.close()
+        crawl_done.set()
+        for t in pool:
+            t.join()
+        results.put(None)
+        writer.join()
+        resolver.close()
+        db.close()
 
-    # Save manifest
-    with open(manifest_path, 'w') as f:
-        json.dump(manifest, f, indent=2)
+    save_manifest(manifest, manifest_path)
 
     print(f"\n{'='*60}")
     print(f"RESULTS")
-    print(f"Products checked: {all_checked}")
-    print(f"3D models found & downloaded: {downloaded}")
-    print(f"Previously downloaded: {skipped}")
+    print(f"Products checked: {stats['checked']}")
+    print(f"3D models found & downloaded: {stats['downloaded']}")
+    print(f"Previously downloaded: {stats['skipped']}")
+    print(f"Failed (retried next run): {stats['failed']}")
+    print(f"Known without 3D (cached): {stats['cached_no3d']}")
     print(f"Total in manifest: {len(manifest)}")
     print(f"\nAll models:")
-    for cid, fname in sorted(manifest.items()):
-        fpath = os.path.join(OUT_DIR, fname)
-        sz = os.path.getsize(fpath) // 1024 if os.path.exists(fpath) else 0
-        print(f"  {cid}: {fname} ({sz}KB)")
+    for cid, entry in sorted(manifest.items()):
+        print(f"  {cid}: {entry['file']} ({entry['size'] // 1024}KB)")
 
 
 if __name__ == '__main__':
@@ -1,16 +1,24 @@
 """
 Download IKEA 3D furniture models (GLB) from US IKEA site.
-Finds GLB URLs in page source via the dimma API pattern.
+Finds GLB URLs in page source via the dimma API pattern, over plain HTTP
+first and through a headless browser only when that finds nothing.
+Every quality tier is probed with HEAD requests and the best one under the
+default byte budget (courtyard_assets/tiers.py) is downloaded.
+
+Usage: python scripts/ikea-download.py [--metrics DIR] [--profile]
 """
-import os, sys, json, re, time, requests
-from tqdm import tqdm
+import os, sys, argparse
 from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 import logging
 logging.getLogger('WDM').setLevel(logging.NOTSET)
 
+from courtyard_assets import browser, crawldb, download, extract, ikea, metrics, tiers
+from courtyard_assets.manifest import load_manifest, save_manifest
+from courtyard_assets.store import BlobStore
+
 OUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'public', 'models', 'ikea')
+# Resource blocking (courtyard_assets.browser.BLOCK_PROFILES); pages are only read from page_source
+BLOCK_PROFILE = 'full'
 os.makedirs(OUT_DIR, exist_ok=True)
 
 # Products — curated list of IKEA US items likely to have 3D models
@@ -62,109 +70,127 @@ PRODUCTS = [
 ]
 
 
-def get_driver():
+def get_driver(block=BLOCK_PROFILE):
     options = webdriver.ChromeOptions()
     options.add_argument('--headless')
     options.add_argument('--disable-gpu')
     options.add_argument('--no-sandbox')
     options.add_argument('--log-level=3')
     options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    options.page_load_strategy = 'eager'
+    browser.configure_options(options, block)
     sys.stderr = open('NUL', 'w')
-    try:
-        service = Service(ChromeDriverManager(log_level=0).install())
-    except TypeError:
-        service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
+    # chromedriver path is cached across runs (see courtyard_assets/browser.py)
+    driver = browser.launch_chrome(options)
     sys.stderr = sys.__stderr__
+    browser.apply_blocking(driver, block)
+    browser.install_glb_watch(driver)
     return driver
 
 
 def find_glb_urls(driver, url):
-    """Find GLB URLs in page source using the dimma API pattern."""
-    driver.get(url)
-    time.sleep(2)  # Let JS render
-    src = driver.page_source
-    # Pattern: web-api.ikea.com/dimma/assets/...glb_draco/...
-    matches = re.findall(r'https://web-api\.ikea\.com/dimma/assets/[^"\']+\.g[lb]{2,3}', src)
+    """
+    Find GLB URLs in page source using the dimma API pattern. Raises
+    browser.PageLoadError if the page didn't load (throttled or a server
+    error), so it isn't taken for one without a model.
+    """
+    browser.raise_for_status(browser.navigate(driver, url))
+    # Returns at the first GLB the page declares or requests, or at the load event
+    matches = extract.clean(browser.wait_for_glb(driver, timeout=8, until_load=True))
     if not matches:
-        # Also try broader pattern
-        matches = re.findall(r'https://[^"\']*\.glb[^"\']*', src)
-    # Prefer highest quality (iqp3 > iqp2 > iqp1)
-    if matches:
-        for quality in ['iqp3', 'iqp2', 'iqp1']:
-            for m in matches:
-                if quality in m:
-                    return m
-        return matches[0]
-    return None
-
-
-def download_file(url, path):
-    resp = requests.get(url, stream=True, timeout=30)
-    total = int(resp.headers.get('content-length', 0))
-    with open(path, 'wb') as f, tqdm(total=total, unit='B', unit_scale=True, desc=os.path.basename(path)) as bar:
-        for chunk in resp.iter_content(8192):
-            f.write(chunk)
-            bar.update(len(chunk))
+        # Single pass over the page source; only complete .glb URLs match
+        matches = extract.glb_urls(driver.page_source)
+    # Prefer highest quality (iqp3 > rqp3 > iqp2 > ...)
+    return extract.pick_best(matches)
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Download IKEA GLB models')
+    metrics.add_arguments(parser)
+    metrics.setup(parser.parse_args(), 'ikea-download')
+
     print(f"Target: {OUT_DIR}")
     print(f"Products: {len(PRODUCTS)}\n")
 
-    driver = get_driver()
+    driver = None  # launched on first page the HTTP path can't resolve
     downloaded, skipped, failed = 0, 0, 0
-    manifest = {}
-
-    try:
-        for catalog_id, filename, url in PRODUCTS:
-            filepath = os.path.join(OUT_DIR, filename)
-
-            if os.path.exists(filepath) and os.path.getsize(filepath) > 5000:
-                print(f"[skip] {catalog_id} ({os.path.getsize(filepath)//1024}KB)")
-                manifest[catalog_id] = filename
-                skipped += 1
-                continue
-
-            short = url.split('/')[-2][:40]
-            print(f"[fetch] {catalog_id} ({short})")
-            glb_url = find_glb_urls(driver, url)
-
-            if glb_url:
-                # Fix truncated URLs (page source sometimes cuts them)
-                if not glb_url.endswith('.glb'):
-                    glb_url += 'lb'  # fix truncated .g -> .glb
-                print(f"  -> {glb_url[:100]}...")
-                try:
-                    download_file(glb_url, filepath)
-                    if os.path.getsize(filepath) > 1000:
-                        manifest[catalog_id] = filename
-                        downloaded += 1
-                    else:
-                        os.remove(filepath)
-                        print(f"  File too small, removed")
+    store = BlobStore(OUT_DIR)
+    db = crawldb.CrawlDB()
+    product_urls = {p[0]: p[-1] for p in PRODUCTS}
+    manifest_path = os.path.join(OUT_DIR, 'manifest.json')
+    manifest = store.index_manifest(load_manifest(manifest_path))
+    resolver = tiers.TierResolver()  # best quality tier under the default byte budget
+    filenames = {}
+
+    # Downloads run in the background while the next pages are resolved
+    with download.Downloader(min_size=1000) as dl:
+        try:
+            for catalog_id, filename, url in PRODUCTS:
+                entry = store.lookup(manifest, catalog_id, filename, min_size=5000)
+                if entry:
+                    print(f"[skip] {catalog_id} ({entry['size']//1024}KB)")
+                    metrics.count('skipped', reason='stored')
+                    db.finish(url, crawldb.DONE, catalog_id=catalog_id, source='ikea-download')
+                    skipped += 1
+                    continue
+
+                if db.known_no3d(url):
+                    print(f"[no3d] {catalog_id} (cached)")
+                    metrics.count('skipped', reason='no3d_cached')
+                    failed += 1
+                    continue
+
+                short = url.split('/')[-2][:40]
+                print(f"[fetch] {catalog_id} ({short})")
+                glb_url = ikea.find_glb_url(url)
+                if not glb_url:
+                    try:
+                        driver = driver or get_driver()
+                        glb_url = find_glb_urls(driver, url)
+                    except Exception as e:
+                        # Retried next run; keep going so this run's downloads are stored
+                        error = f'page load failed: {e}'.splitlines()[0]
+                        print(f"  {error}")
+                        db.finish(url, crawldb.FAILED, error=error, catalog_id=catalog_id,
+                                  source='ikea-download')
                         failed += 1
-                except Exception as e:
-                    print(f"  Download error: {e}")
+                        continue
+
+                if glb_url:
+                    glb_url = resolver.resolve(glb_url).url
+                    print(f"  -> {glb_url[:100]}...")
+                    filenames[catalog_id] = filename
+                    dl.submit(glb_url, store.staging_path(filename), key=catalog_id)
+                else:
+                    print(f"  No 3D model found")
+                    db.finish(url, crawldb.NO3D, catalog_id=catalog_id, source='ikea-download')
                     failed += 1
+        finally:
+            if driver:
+                driver.quit()
+            resolver.close()
+
+        for r in dl.results():
+            if r.ok:
+                manifest[r.key] = store.ingest(r.path, filenames[r.key], r.sha256, url=r.url,
+                                               tier=tiers.tier_of(r.url))
+                db.finish(product_urls[r.key], crawldb.DONE, glb_url=r.url, catalog_id=r.key, source='ikea-download')
+                downloaded += 1
             else:
-                print(f"  No 3D model found")
+                print(f"  Download error ({r.key}): {r.error}")
+                db.finish(product_urls[r.key], crawldb.FAILED, glb_url=r.url, error=r.error, source='ikea-download')
                 failed += 1
-    finally:
-        driver.quit()
 
-    manifest_path = os.path.join(OUT_DIR, 'manifest.json')
-    with open(manifest_path, 'w') as f:
-        json.dump(manifest, f, indent=2)
+    save_manifest(manifest, manifest_path)
+    db.close()
 
     print(f"\n{'='*50}")
     print(f"Downloaded: {downloaded} | Skipped: {skipped} | No model: {failed}")
     print(f"Manifest: {manifest_path}")
     if manifest:
         print(f"\nSuccessful models:")
-        for cid, fname in manifest.items():
-            sz = os.path.getsize(os.path.join(OUT_DIR, fname)) // 1024
-            print(f"  {cid}: {fname} ({sz}KB)")
+        for cid, entry in manifest.items():
+            print(f"  {cid}: {entry['file']} ({entry['size'] // 1024}KB)")
 
 
 if __name__ == '__main__':
@@ -1,25 +1,37 @@
 """
 Download IKEA 3D furniture models (GLB) by intercepting network requests.
-Uses Selenium CDP to catch GLB URLs loaded when clicking "View in 3D".
-
-Usage: python scripts/ikea-glb-grab.py
+Tries the static product HTML over plain HTTP first, then falls back to
+Selenium, catching the GLB request fired when clicking "View in 3D" as soon
+as it is issued (see courtyard_assets/browser.py).
+
+Usage: python scripts/ikea-glb-grab.py [--refresh] [--block PROFILE] [--model-budget MB]
+                                      [--metrics DIR] [--profile]
+
+--refresh revalidates already-stored models with conditional requests
+(ETag / Last-Modified) and only downloads the ones that changed upstream.
+--block selects the browser resource blocking profile (none, light, full).
+--model-budget caps the size of the quality tier downloaded: every tier is
+probed with HEAD requests and the best one under the budget is taken.
 """
 
-import os, sys, json, re, time, requests
-from tqdm import tqdm
+import os, sys, argparse
 from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
 import logging
 
+from courtyard_assets import browser, crawldb, download, extract, ikea, metrics, tiers
+from courtyard_assets.manifest import load_manifest, save_manifest
+from courtyard_assets.store import BlobStore
+
 logging.getLogger('WDM').setLevel(logging.NOTSET)
 os.environ['WDM_LOG_LEVEL'] = '0'
 
 OUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'public', 'models', 'ikea')
+# Resource blocking (courtyard_assets.browser.BLOCK_PROFILES); keeps CSS so the 3D button can be clicked
+BLOCK_PROFILE = 'light'
 os.makedirs(OUT_DIR, exist_ok=True)
 
 # ── Product list: (catalog_id, filename, ikea_url) ──
@@ -76,8 +88,8 @@ PRODUCTS = [
 ]
 
 
-def get_driver():
-    """Create Chrome driver with CDP network logging enabled."""
+def get_driver(block=BLOCK_PROFILE):
+    """Create Chrome driver with the GLB request watcher installed."""
     options = webdriver.ChromeOptions()
     options.add_argument('--headless=new')
     options.add_argument('--disable-gpu')
@@ -85,233 +97,198 @@ def get_driver():
     options.add_argument('--disable-dev-shm-usage')
     options.add_argument('--log-level=3')
     options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    # Enable performance logging to capture network requests
-    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    # Return from driver.get() at DOMContentLoaded; readiness is event-driven
+    options.page_load_strategy = 'eager'
+    browser.configure_options(options, block)
 
     original_stderr = sys.stderr
     sys.stderr = open(os.devnull, 'w')
-    try:
-        service = Service(ChromeDriverManager(log_level=0).install())
-    except TypeError:
-        service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
+    # chromedriver path is cached across runs (see courtyard_assets/browser.py)
+    driver = browser.launch_chrome(options)
     sys.stderr = original_stderr
+    browser.apply_blocking(driver, block)
+    browser.install_glb_watch(driver)
     return driver
 
 
 def find_glb_from_network(driver, url, timeout=15):
     """
     Navigate to IKEA product page, click 'View in 3D' if available,
-    and capture GLB URLs from network requests via CDP.
+    and capture GLB URLs from the requests the page issues.
+    Each wait returns as soon as a GLB shows up; the timeouts are only caps.
+    Raises browser.PageLoadError if the page didn't load (throttled or a
+    server error), so it isn't taken for one without a model.
     """
-    glb_urls = []
-
-    # Enable CDP Network domain to intercept requests
-    driver.execute_cdp_cmd('Network.enable', {})
-
-    driver.get(url)
-    time.sleep(3)  # Wait for page JS to load
+    browser.raise_for_status(browser.navigate(driver, url))
 
-    # Method 1: Check for <model-viewer> element (some pages embed it directly)
-    try:
-        model_viewers = driver.find_elements(By.CSS_SELECTOR, 'model-viewer')
-        for mv in model_viewers:
-            src = mv.get_attribute('src')
-            if src and '.glb' in src.lower():
-                glb_urls.append(src)
-    except:
-        pass
+    # Method 1: XR viewer JSON / <model-viewer> / GLB requested during page load
+    glb_urls = browser.wait_for_glb(driver, timeout=5, until_load=True)
 
     # Method 2: Look for the "View in 3D" / "View in Room" button and click it
     view3d_clicked = False
-    for selector in [
-        '[data-testid="pip-xr-button"]',
-        'button[aria-label*="3D"]',
-        'button[aria-label*="room"]',
-        'button[aria-label*="View in"]',
-        '#pip-xr-viewer-model',
-        '.pip-media-grid__xr-button',
-        '[class*="xr-button"]',
-        '[class*="3d-button"]',
-    ]:
-        try:
-            btn = driver.find_element(By.CSS_SELECTOR, selector)
-            if btn and btn.is_displayed():
-                btn.click()
-                view3d_clicked = True
-                time.sleep(4)  # Wait for model to load
-                break
-        except:
-            pass
+    if not glb_urls:
+        for selector in [
+            '[data-testid="pip-xr-button"]',
+            'button[aria-label*="3D"]',
+            'button[aria-label*="room"]',
+            'button[aria-label*="View in"]',
+            '#pip-xr-viewer-model',
+            '.pip-media-grid__xr-button',
+            '[class*="xr-button"]',
+            '[class*="3d-button"]',
+        ]:
+            try:
+                btn = driver.find_element(By.CSS_SELECTOR, selector)
+                if btn and btn.is_displayed():
+                    btn.click()
+                    view3d_clicked = True
+                    break
+            except:
+                pass
 
     # Method 3: Also try clicking via JavaScript on any element containing "3D" text
     if not view3d_clicked and not glb_urls:
         try:
-            driver.execute_script("""
+            view3d_clicked = driver.execute_script("""
                 const btns = document.querySelectorAll('button, a, [role="button"]');
                 for (const b of btns) {
                     if (b.textContent.match(/3D|View in room/i)) {
                         b.click();
-                        break;
+                        return true;
                     }
                 }
+                return false;
             """)
-            time.sleep(4)
         except:
             pass
 
-    # Method 4: Check model-viewer again after clicking
-    try:
-        model_viewers = driver.find_elements(By.CSS_SELECTOR, 'model-viewer')
-        for mv in model_viewers:
-            src = mv.get_attribute('src')
-            if src and '.glb' in src.lower():
-                glb_urls.append(src)
-    except:
-        pass
-
-    # Method 5: Check performance logs for network requests containing .glb
-    try:
-        logs = driver.get_log('performance')
-        for entry in logs:
-            try:
-                msg = json.loads(entry['message'])['message']
-                if msg['method'] in ('Network.requestWillBeSent', 'Network.responseReceived'):
-                    req_url = ''
-                    if 'request' in msg.get('params', {}):
-                        req_url = msg['params']['request'].get('url', '')
-                    elif 'response' in msg.get('params', {}):
-                        req_url = msg['params']['response'].get('url', '')
-                    if req_url and ('.glb' in req_url.lower() or 'glb_draco' in req_url.lower()):
-                        glb_urls.append(req_url)
-            except:
-                pass
-    except:
-        pass
-
-    # Method 6: Search page source as fallback
-    try:
-        src = driver.page_source
-        # dimma API pattern
-        matches = re.findall(r'https://web-api\.ikea\.com/dimma/assets/[^"\'\s]+\.glb[^"\'\s]*', src)
-        glb_urls.extend(matches)
-        # Broader pattern
-        matches2 = re.findall(r'https://[^"\'\s]*\.glb(?:\?[^"\'\s]*)?', src)
-        glb_urls.extend(matches2)
-    except:
-        pass
-
-    # Method 7: Check #pip-xr-viewer-model script tag
-    try:
-        script_el = driver.find_element(By.ID, 'pip-xr-viewer-model')
-        data = json.loads(script_el.get_attribute('innerHTML'))
-        if data.get('url'):
-            glb_urls.append(data['url'])
-    except:
-        pass
+    # Method 4: Wait for the model request the click triggers
+    if view3d_clicked:
+        glb_urls = browser.wait_for_glb(driver, timeout=timeout)
+
+    # Method 5: Search page source as fallback
+    if not glb_urls:
+        try:
+            glb_urls = extract.glb_urls(driver.page_source)
+        except:
+            pass
 
     # Deduplicate and pick best quality
-    seen = set()
-    unique = []
-    for u in glb_urls:
-        # Clean up URL
-        u = u.split('"')[0].split("'")[0].split(' ')[0]
-        if u not in seen and '.glb' in u.lower():
-            seen.add(u)
-            unique.append(u)
-
-    if not unique:
-        return None
-
-    # Prefer highest quality (iqp3 > iqp2 > iqp1), prefer draco compressed
-    for quality in ['iqp3', 'iqp2', 'iqp1']:
-        for u in unique:
-            if quality in u:
-                return u
-
-    return unique[0]
-
-
-def download_file(url, path):
-    """Download with progress bar."""
-    try:
-        resp = requests.get(url, stream=True, timeout=30, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        resp.raise_for_status()
-        total = int(resp.headers.get('content-length', 0))
-        with open(path, 'wb') as f, tqdm(total=total, unit='B', unit_scale=True,
-                                          desc=os.path.basename(path)) as bar:
-            for chunk in resp.iter_content(8192):
-                f.write(chunk)
-                bar.update(len(chunk))
-        return True
-    except Exception as e:
-        print(f"  Download error: {e}")
-        return False
+    return extract.pick_best(extract.clean(glb_urls))
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Download IKEA GLB models')
+    parser.add_argument('--refresh', action='store_true',
+                        help='revalidate stored models instead of skipping them')
+    parser.add_argument('--block', choices=sorted(browser.BLOCK_PROFILES), default=BLOCK_PROFILE,
+                        help=f'browser resource blocking profile (default: {BLOCK_PROFILE})')
+    parser.add_argument('--model-budget', type=float, default=tiers.DEFAULT_MODEL_BUDGET / tiers.MB,
+                        metavar='MB', help='largest quality tier to download per model, in MB')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.setup(args, 'ikea-glb-grab')
+
     print(f"IKEA GLB Grabber — Network Interception Method")
     print(f"Target: {OUT_DIR}")
     print(f"Products: {len(PRODUCTS)}\n")
 
-    driver = get_driver()
-    downloaded, skipped, failed = 0, 0, 0
-    manifest = {}
-
-    try:
-        for catalog_id, filename, url in PRODUCTS:
-            filepath = os.path.join(OUT_DIR, filename)
-
-            # Skip if already downloaded and valid size
-            if os.path.exists(filepath) and os.path.getsize(filepath) > 5000:
-                sz = os.path.getsize(filepath) // 1024
-                print(f"[skip] {catalog_id} ({sz}KB)")
-                manifest[catalog_id] = filename
-                skipped += 1
-                continue
-
-            short = url.split('/')[-2][:50]
-            print(f"[fetch] {catalog_id} — {short}")
-
-            glb_url = find_glb_from_network(driver, url)
-
-            if glb_url:
-                print(f"  -> {glb_url[:120]}")
-                if download_file(glb_url, filepath):
-                    sz = os.path.getsize(filepath)
-                    if sz > 1000:
-                        manifest[catalog_id] = filename
-                        downloaded += 1
-                        print(f"  OK ({sz // 1024}KB)")
-                    else:
-                        os.remove(filepath)
-                        print(f"  Too small ({sz}B), removed")
+    driver = None  # launched on first page the HTTP path can't resolve
+    downloaded, skipped, unchanged, failed = 0, 0, 0, 0
+    store = BlobStore(OUT_DIR)
+    db = crawldb.CrawlDB()
+    product_urls = {p[0]: p[-1] for p in PRODUCTS}
+    manifest_path = os.path.join(OUT_DIR, 'manifest.json')
+    manifest = store.index_manifest(load_manifest(manifest_path))
+    filenames = {}
+    resolver = tiers.TierResolver(int(args.model_budget * tiers.MB))
+
+    # Downloads run in the background while the next pages are resolved
+    with download.Downloader(min_size=1000, known=store) as dl:
+        try:
+            for catalog_id, filename, url in PRODUCTS:
+                # Skip if already in the blob store
+                entry = store.lookup(manifest, catalog_id, filename, min_size=5000)
+                if entry and args.refresh and entry.get('url'):
+                    # Conditional GET on the GLB we already have; 304 costs no payload
+                    print(f"[check] {catalog_id}")
+                    filenames[catalog_id] = filename
+                    dl.submit(entry['url'], store.staging_path(filename), key=catalog_id)
+                    continue
+                if entry:
+                    print(f"[skip] {catalog_id} ({entry['size'] // 1024}KB)")
+                    metrics.count('skipped', reason='stored')
+                    db.finish(url, crawldb.DONE, catalog_id=catalog_id, source='ikea-glb-grab')
+                    skipped += 1
+                    continue
+
+                if db.known_no3d(url):
+                    print(f"[no3d] {catalog_id} (cached)")
+                    metrics.count('skipped', reason='no3d_cached')
+                    failed += 1
+                    continue
+
+                short = url.split('/')[-2][:50]
+                print(f"[fetch] {catalog_id} — {short}")
+
+                glb_url = ikea.find_glb_url(url)
+                if not glb_url:
+                    try:
+                        driver = driver or get_driver(args.block)
+                        glb_url = find_glb_from_network(driver, url)
+                    except Exception as e:
+                        # Retried next run; keep going so this run's downloads are stored
+                        error = f'page load failed: {e}'.splitlines()[0]
+                        print(f"  {error}")
+                        db.finish(url, crawldb.FAILED, error=error, catalog_id=catalog_id,
+                                  source='ikea-glb-grab')
                         failed += 1
+                        continue
+
+                if glb_url:
+                    choice = resolver.resolve(glb_url)
+                    glb_url = choice.url
+                    print(f"  -> {glb_url[:120]}")
+                    if choice.size is not None:
+                        note = ' (smallest, over budget)' if choice.over_budget else ''
+                        print(f"     tier {choice.tier}, {choice.size // 1024}KB{note}")
+                    filenames[catalog_id] = filename
+                    dl.submit(glb_url, store.staging_path(filename), key=catalog_id)
                 else:
+                    print(f"  No 3D model found")
+                    db.finish(url, crawldb.NO3D, catalog_id=catalog_id, source='ikea-glb-grab')
                     failed += 1
+
+        finally:
+            if driver:
+                driver.quit()
+            resolver.close()
+
+        for r in dl.results():
+            if r.not_modified:
+                unchanged += 1
+                metrics.count('skipped', reason='unchanged')
+            elif r.ok:
+                manifest[r.key] = store.ingest(r.path, filenames[r.key], r.sha256, url=r.url,
+                                               tier=tiers.tier_of(r.url))
+                db.finish(product_urls[r.key], crawldb.DONE, glb_url=r.url, catalog_id=r.key, source='ikea-glb-grab')
+                downloaded += 1
+                print(f"[done] {r.key} ({r.size // 1024}KB)")
             else:
-                print(f"  No 3D model found")
+                print(f"[fail] {r.key} — {r.error}")
+                db.finish(product_urls[r.key], crawldb.FAILED, glb_url=r.url, error=r.error, source='ikea-glb-grab')
                 failed += 1
 
-    finally:
-        driver.quit()
-
-    # Write manifest
-    manifest_path = os.path.join(OUT_DIR, 'manifest.json')
-    with open(manifest_path, 'w') as f:
-        json.dump(manifest, f, indent=2)
+    save_manifest(manifest, manifest_path)
+    db.close()
 
     print(f"\n{'=' * 60}")
-    print(f"Downloaded: {downloaded} | Skipped: {skipped} | No model: {failed}")
+    print(f"Downloaded: {downloaded} | Skipped: {skipped} | Unchanged: {unchanged} | No model: {failed}")
     print(f"Manifest: {manifest_path}")
     if manifest:
         print(f"\nAll models:")
-        for cid, fname in sorted(manifest.items()):
-            fpath = os.path.join(OUT_DIR, fname)
-            sz = os.path.getsize(fpath) // 1024 if os.path.exists(fpath) else 0
-            print(f"  {cid}: {fname} ({sz}KB)")
+        for cid, entry in sorted(manifest.items()):
+            print(f"  {cid}: {entry['file']} ({entry['size'] // 1024}KB)")
 
 
 if __name__ == '__main__':
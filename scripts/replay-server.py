@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Serve recorded IKEA / Poly Haven responses locally (courtyard_assets/replay.py).
+
+Record once against the live sites, then replay offline:
+
+    python scripts/replay-server.py --record &
+    COURTYARD_BASE_URL=http://127.0.0.1:8800 python scripts/ikea-glb-grab.py
+    COURTYARD_BASE_URL=http://127.0.0.1:8800 python scripts/download-polyhaven.py
+
+    python scripts/replay-server.py --latency 80 --jitter 40 --error-rate 0.02 --throttle 5 &
+    COURTYARD_BASE_URL=http://127.0.0.1:8800 python scripts/ikea-bulk-scan.py ...
+
+Point the scripts at it with COURTYARD_BASE_URL, and give replayed runs
+their own state (a fresh .asset-cache, or the benchmark harness) when
+comparing runs, since the HTTP cache and crawl frontier carry over.
+
+Usage: python scripts/replay-server.py [--archive DIR] [--port N] [--record]
+                                       [--latency MS] [--jitter MS]
+                                       [--error-rate P] [--throttle RPS]
+                                       [--retry-after S] [--seed N] [--verbose]
+"""
+
+import argparse
+import time
+
+from courtyard_assets import replay
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record/replay server for the asset scripts')
+    parser.add_argument('--archive', default=replay.DEFAULT_ARCHIVE,
+                        help=f'archive directory (default: {replay.DEFAULT_ARCHIVE})')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=replay.DEFAULT_PORT)
+    parser.add_argument('--record', action='store_true',
+                        help='fetch URLs missing from the archive from upstream and keep them')
+    parser.add_argument('--latency', type=float, default=0, metavar='MS',
+                        help='delay added to every response')
+    parser.add_argument('--jitter', type=float, default=0, metavar='MS',
+                        help='up to this much more delay, uniformly random')
+    parser.add_argument('--error-rate', type=float, default=0, metavar='P',
+                        help='share of requests answered with a random 500/502/503')
+    parser.add_argument('--throttle', type=float, default=0, metavar='RPS',
+                        help='per-host request rate above which requests get a 429')
+    parser.add_argument('--retry-after', type=int, metavar='S',
+                        help='Retry-After sent with 429s (default: time until the next slot)')
+    parser.add_argument('--seed', type=int, help='seed for jitter and error injection')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    faults = replay.Faults(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                           error_rate=args.error_rate, throttle=args.throttle,
+                           retry_after=args.retry_after, seed=args.seed)
+    server = replay.start(args.archive, args.host, args.port, record=args.record,
+                          faults=faults, verbose=args.verbose)
+    mode = 'Recording' if args.record else 'Replaying'
+    print(f"{mode} {server.archive.count()} responses from {args.archive}")
+    print(f"export COURTYARD_BASE_URL={server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.archive.close()
+        print(f"\n{server.stats}")
+
+
+if __name__ == '__main__':
+    main()